@@ -0,0 +1,275 @@
+"""
+Write-behind answer buffer for the exam platform
+Autosave batches are acknowledged once they land in a per-worker buffer and
+are written to ``attempts`` together as one ``bulk_write`` every
+``flush_interval_ms`` or ``max_ops`` buffered batches, whichever comes first
+
+Modes:
+    sync       - no buffering, every batch is its own conditional update
+    buffer     - acknowledged from memory; a crash loses up to one interval
+    journaled  - group commit: the request waits for the shared flush, which
+                 is written with ``j=True`` - for at most ``ack_timeout_ms``,
+                 then it raises ``asyncio.TimeoutError`` (the changes stay
+                 buffered for the next flush)
+
+A flush merges per question by ``answer_stamps`` (the reconcile rule), so
+flushes from different workers land in any order without losing answers.
+Submit forces a flush of the attempt here but can only wait one interval
+for other workers, and the sweeper flushes only its own worker: with
+several workers, buffer mode can lose saves acknowledged elsewhere just
+before a submit. Use it with a single worker or sticky attempt sessions;
+journaled callers are told when their save missed the attempt
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from cachetools import LRUCache
+from pymongo import UpdateOne
+from pymongo.write_concern import WriteConcern
+
+from grading_service import AttemptState
+
+logger = logging.getLogger(__name__)
+
+SAVE_MODES = ("sync", "buffer", "journaled")
+
+
+class _Pending:
+    """Merged, not yet written changes of one attempt"""
+
+    __slots__ = ("attempt_id", "student_id", "answers", "stamps", "max_seq", "waiters")
+
+    def __init__(self, attempt_id: str, student_id: str, max_seq: int):
+        self.attempt_id = attempt_id
+        self.student_id = student_id
+        self.answers: Dict[str, str] = {}
+        self.stamps: Dict[str, dict] = {}
+        self.max_seq = max_seq
+        self.waiters: List[asyncio.Future] = []
+
+    def to_update(self) -> UpdateOne:
+        return UpdateOne(*self.update_args())
+
+    def update_args(self) -> Tuple[dict, List[dict]]:
+        # Per question, the later (ts, seq) wins over what is stored; last_seq never moves backwards
+        merge = {"last_seq": {"$max": [{"$ifNull": ["$last_seq", 0]}, self.max_seq]}}
+        for question_id, option in self.answers.items():
+            stamp = self.stamps[question_id]
+            newer = newer_than_stored(question_id, stamp)
+            merge[f"answers.{question_id}"] = {"$cond": [newer, {"$literal": option}, f"$answers.{question_id}"]}
+            merge[f"answer_stamps.{question_id}"] = {"$cond": [newer, stamp, f"$answer_stamps.{question_id}"]}
+        return (
+            {"id": self.attempt_id, "student_id": self.student_id, "state": AttemptState.IN_PROGRESS.value},
+            [{"$set": merge}]
+        )
+
+
+def newer_than_stored(question_id: str, stamp: dict) -> dict:
+    """Aggregation test: ``stamp`` beats the stored answer's (ts, seq)"""
+    stored_ts = {"$ifNull": [f"$answer_stamps.{question_id}.ts", -1]}
+    stored_seq = {"$ifNull": [f"$answer_stamps.{question_id}.seq", 0]}
+    return {"$or": [
+        {"$lt": [stored_ts, stamp["ts"]]},
+        {"$and": [{"$eq": [stored_ts, stamp["ts"]]}, {"$lt": [stored_seq, stamp["seq"]]}]}
+    ]}
+
+
+class AnswerBuffer:
+    """Per-worker write-behind buffer for autosave batches"""
+
+    def __init__(self, db, mode: str = "sync", flush_interval_ms: int = 250, max_ops: int = 500,
+                 ack_timeout_ms: int = 5000):
+        if mode not in SAVE_MODES:
+            raise ValueError(f"Unknown answer save mode: {mode}")
+        self.db = db
+        self.mode = mode
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_ops = max_ops
+        self.ack_timeout = ack_timeout_ms / 1000
+        self._pending: Dict[str, _Pending] = {}
+        self._ops = 0  # Batches merged into _pending
+        # attempt id -> (student id, last seq accepted here) for attempts known to be open
+        self._open = LRUCache(maxsize=20000)
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.accepted = 0
+        self.rejected_stale = 0
+        self.flushes = 0
+        self.flushed_ops = 0
+        self.dropped = 0
+        self.flush_errors = 0
+        self.ack_timeouts = 0
+        self.max_depth = 0
+        self.last_flush_size = 0
+        self.flush_time_total = 0.0
+        self.flush_time_max = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "sync"
+
+    async def save(self, attempt_id: str, student_id: str, answers: Dict[str, str],
+                   stamps: Dict[str, dict], min_seq: int, max_seq: int) -> Optional[dict]:
+        """Buffer one batch; None if the attempt is not open for this student"""
+        known = self._open.get(attempt_id)
+        if known is None:
+            attempt = await self.db.attempts.find_one(
+                {"id": attempt_id, "student_id": student_id, "state": AttemptState.IN_PROGRESS.value},
+                {"_id": 0, "last_seq": 1}
+            )
+            if not attempt:
+                return None
+            known = (student_id, attempt.get("last_seq", 0))
+        if known[0] != student_id:
+            return None
+
+        last_seq = known[1]
+        if min_seq <= last_seq:
+            self.rejected_stale += 1
+            return {"applied": False, "saved": 0, "last_seq": last_seq}
+
+        entry = self._pending.get(attempt_id)
+        if entry is None:
+            entry = self._pending[attempt_id] = _Pending(attempt_id, student_id, max_seq)
+        entry.answers.update(answers)
+        entry.stamps.update(stamps)
+        entry.max_seq = max_seq
+        self._open[attempt_id] = (student_id, max_seq)
+        self._ops += 1
+        self.accepted += 1
+        self.max_depth = max(self.max_depth, self._ops)
+        if self._ops >= self.max_ops:
+            self._wake.set()
+
+        if self.mode == "journaled":
+            waiter = asyncio.get_running_loop().create_future()
+            entry.waiters.append(waiter)
+            try:
+                # A stalled flusher (failover, slow journal) must not hold requests open
+                ok = await asyncio.wait_for(waiter, timeout=self.ack_timeout)
+            except asyncio.TimeoutError:
+                self.ack_timeouts += 1
+                raise
+            if not ok:
+                return None  # Submitted before the flush
+        return {"applied": True, "saved": len(answers), "last_seq": max_seq}
+
+    async def flush(self, attempt_id: Optional[str] = None):
+        """Write pending changes now - one attempt, or everything"""
+        async with self._lock:
+            if attempt_id is None:
+                batch, self._pending, self._ops = self._pending, {}, 0
+            else:
+                entry = self._pending.pop(attempt_id, None)
+                batch = {attempt_id: entry} if entry else {}
+            if batch:
+                await self._write(batch)
+
+    async def settle(self, attempt_id: str):
+        """Before grading: flush this attempt here and let other workers' buffers drain"""
+        self._open.pop(attempt_id, None)
+        if not self.enabled:
+            return
+        await self.flush(attempt_id)
+        await asyncio.sleep(self.flush_interval)
+
+    async def _write(self, batch: Dict[str, _Pending]):
+        entries = list(batch.values())
+        ops = [entry.to_update() for entry in entries]
+        collection = self.db.attempts
+        if self.mode == "journaled":
+            collection = collection.with_options(write_concern=WriteConcern(j=True))
+
+        started = time.perf_counter()
+        try:
+            result = await collection.bulk_write(ops, ordered=False)
+            matched = [True] * len(ops)
+            if result.matched_count < len(ops):
+                # Find which missed; replaying the merge is a no-op for those that matched
+                replies = await asyncio.gather(*(collection.update_one(*entry.update_args()) for entry in entries))
+                matched = [reply.matched_count > 0 for reply in replies]
+        except Exception as e:
+            self.flush_errors += 1
+            logger.error(f"Answer buffer flush of {len(ops)} attempts failed: {e}")
+            self._requeue(batch, e)
+            return
+        duration = time.perf_counter() - started
+
+        self.flushes += 1
+        self.flushed_ops += len(ops)
+        self.last_flush_size = len(ops)
+        self.flush_time_total += duration
+        self.flush_time_max = max(self.flush_time_max, duration)
+        for entry, ok in zip(entries, matched):
+            if not ok:
+                # Submitted (or swept) before the flush
+                self.dropped += 1
+                self._open.pop(entry.attempt_id, None)
+            for waiter in entry.waiters:
+                if not waiter.done():
+                    waiter.set_result(ok)
+
+    def _requeue(self, batch: Dict[str, _Pending], error: Exception):
+        for attempt_id, entry in batch.items():
+            for waiter in entry.waiters:
+                if not waiter.done():
+                    waiter.set_exception(error)  # Journaled callers learn the save failed
+            entry.waiters = []
+            newer = self._pending.get(attempt_id)
+            if newer is not None:
+                # Keep the older changes underneath anything buffered since
+                entry.answers.update(newer.answers)
+                entry.stamps.update(newer.stamps)
+                entry.max_seq = newer.max_seq
+                entry.waiters = newer.waiters
+            self._pending[attempt_id] = entry
+            self._ops += 1
+
+    async def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Answer buffer flush loop error: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "flush_interval_ms": int(self.flush_interval * 1000),
+            "max_ops": self.max_ops,
+            "depth_ops": self._ops,
+            "depth_attempts": len(self._pending),
+            "max_depth": self.max_depth,
+            "accepted": self.accepted,
+            "rejected_stale": self.rejected_stale,
+            "flushes": self.flushes,
+            "flushed_ops": self.flushed_ops,
+            "dropped": self.dropped,
+            "flush_errors": self.flush_errors,
+            "ack_timeouts": self.ack_timeouts,
+            "last_flush_size": self.last_flush_size,
+            "avg_flush_ms": round(self.flush_time_total / self.flushes * 1000, 2) if self.flushes else 0.0,
+            "max_flush_ms": round(self.flush_time_max * 1000, 2),
+        }
@@ -0,0 +1,237 @@
+"""
+Compact answer encoding for the exam platform
+A graded attempt's answers can be stored as 3 bits per question - the
+option's position, 0 for unanswered - in question order, instead of a dict
+keyed by question id. The question/option order is an immutable layout in
+``answer_layouts`` (id = hash of its content), so attempts still decode
+after the exam is edited. Answers the layout cannot express (unknown
+question or option) are left as a dict - encoding is always lossless
+
+Usage: python answer_codec_service.py [--batch-size 1000] [--exam EXAM_ID] [--dry-run]
+Converts existing graded attempts in ``_id`` order, in batches
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from cachetools import LRUCache
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+BITS = 3
+MAX_OPTIONS = (1 << BITS) - 1  # Code 0 is "unanswered"
+# Weights turning rows of BITS bits back into codes
+_WEIGHTS = 1 << np.arange(BITS - 1, -1, -1)
+
+ENCODING_MODES = ("dict", "packed")
+
+
+def question_options(question: dict) -> List[str]:
+    """Answer values a question accepts, in display order"""
+    options = question.get("options") or []
+    # New format: option dicts with ids; old format: texts answered by letter
+    return [o["option_id"] if isinstance(o, dict) else chr(ord("A") + i) for i, o in enumerate(options)]
+
+
+class AnswerLayout:
+    """Question and option order that packed answers are positions in"""
+
+    def __init__(self, question_ids: Sequence[str], options: Sequence[Sequence[str]]):
+        self.question_ids = list(question_ids)
+        self.options = [list(values) for values in options]
+        self.id = hashlib.sha1(json.dumps([self.question_ids, self.options]).encode()).hexdigest()[:16]
+        self.packable = all(len(values) <= MAX_OPTIONS for values in self.options)
+        self._positions = {q_id: i for i, q_id in enumerate(self.question_ids)}
+        self._codes = [{value: code for code, value in enumerate(values, 1)} for values in self.options]
+
+    @classmethod
+    def from_exam(cls, exam: dict) -> "AnswerLayout":
+        questions = exam.get("paper1_questions", [])
+        return cls(
+            [q.get("id") or str(q.get("question_number", "")) for q in questions],
+            [question_options(q) for q in questions]
+        )
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "AnswerLayout":
+        return cls(doc["question_ids"], doc["options"])
+
+    def to_doc(self) -> dict:
+        return {"_id": self.id, "question_ids": self.question_ids, "options": self.options}
+
+    def encode(self, answers: Dict[str, str]) -> Optional[bytes]:
+        """``ceil(3n / 8)`` bytes, or None if an answer has no code"""
+        if not self.packable:
+            return None
+        codes = np.zeros(len(self.question_ids), dtype=np.uint8)
+        for q_id, option in answers.items():
+            position = self._positions.get(q_id)
+            code = self._codes[position].get(option) if position is not None else None
+            if code is None:
+                return None
+            codes[position] = code
+        bits = np.unpackbits(codes[:, None], axis=1)[:, 8 - BITS:]
+        return np.packbits(bits.ravel()).tobytes()
+
+    def codes(self, data: bytes) -> np.ndarray:
+        """Option positions (1-based, 0 = unanswered) of packed answers"""
+        n = len(self.question_ids)
+        bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8))[:n * BITS].reshape(n, BITS)
+        return bits @ _WEIGHTS
+
+    def answer_codes(self, answers: Dict[str, str]) -> np.ndarray:
+        """Option positions of an answers dict; answers the layout lacks count as unanswered"""
+        codes = np.zeros(len(self.question_ids), dtype=np.uint8)
+        for q_id, option in answers.items():
+            position = self._positions.get(q_id)
+            if position is not None:
+                codes[position] = self._codes[position].get(option, 0)
+        return codes
+
+    def decode(self, data: bytes) -> Dict[str, str]:
+        codes = self.codes(data).tolist()
+        return {self.question_ids[i]: self.options[i][code - 1] for i, code in enumerate(codes) if code}
+
+
+def with_packed(fields: dict, packed: Optional[dict]) -> dict:
+    """Update document setting ``fields``, swapping the answers dict for ``packed``"""
+    if packed is None:
+        return {"$set": fields}
+    # Per-answer merge stamps only matter while the attempt is open
+    return {"$set": {**fields, **packed}, "$unset": {"answers": "", "answer_stamps": ""}}
+
+
+class AnswerCodec:
+    """Packs answers at grading time (``enabled``) and decodes them on read.
+
+    ``store_layouts=False`` packs without writing layouts (dry runs).
+    """
+
+    def __init__(self, db, enabled: bool = False, maxsize: int = 1024, store_layouts: bool = True):
+        self.db = db
+        self.enabled = enabled
+        self.store_layouts = store_layouts
+        self._layouts = LRUCache(maxsize=maxsize)  # Layouts are immutable - cached here means stored
+
+        self.packed = 0
+        self.unpackable = 0
+        self.decoded = 0
+
+    async def pack(self, layout: AnswerLayout, answers: Dict[str, str]) -> Optional[dict]:
+        """Fields replacing ``answers``, or None to keep the dict"""
+        if not self.enabled:
+            return None
+        data = layout.encode(answers or {})
+        if data is None:
+            self.unpackable += 1
+            return None
+        if self.store_layouts:
+            await self._store(layout)
+        self.packed += 1
+        return {"answers_packed": data, "answers_layout": layout.id}
+
+    async def unpack(self, attempts: List[dict]) -> List[dict]:
+        """Restore ``answers`` in place on attempts read with the packed fields"""
+        for attempt in attempts:
+            data = attempt.pop("answers_packed", None)
+            layout_id = attempt.pop("answers_layout", None)
+            if data is None:
+                continue
+            layout = await self._load(layout_id)
+            attempt["answers"] = layout.decode(bytes(data)) if layout else {}
+            self.decoded += 1
+        return attempts
+
+    async def _store(self, layout: AnswerLayout):
+        if layout.id in self._layouts:
+            return
+        await self.db.answer_layouts.update_one({"_id": layout.id}, {"$setOnInsert": layout.to_doc()}, upsert=True)
+        self._layouts[layout.id] = layout
+
+    async def _load(self, layout_id: str) -> Optional[AnswerLayout]:
+        layout = self._layouts.get(layout_id)
+        if layout is None:
+            doc = await self.db.answer_layouts.find_one({"_id": layout_id})
+            if not doc:
+                return None
+            layout = self._layouts[layout_id] = AnswerLayout.from_doc(doc)
+        return layout
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "layouts_cached": len(self._layouts),
+            "packed": self.packed,
+            "unpackable": self.unpackable,
+            "decoded": self.decoded,
+        }
+
+
+async def convert_attempts(db, batch_size: int = 1000, exam_id: Optional[str] = None,
+                           dry_run: bool = False) -> dict:
+    """Pack the answers of graded attempts still stored as a dict (``dry_run`` writes nothing)"""
+    codec = AnswerCodec(db, enabled=True, store_layouts=not dry_run)
+    layouts: Dict[str, Optional[AnswerLayout]] = {}
+    report = {"scanned": 0, "converted": 0, "skipped": 0, "bytes_before": 0, "bytes_after": 0}
+
+    query = {"state": "graded", "answers": {"$exists": True}}
+    if exam_id:
+        query["exam_id"] = exam_id
+    cursor = None
+    while True:
+        batch_query = dict(query, **({"_id": {"$gt": cursor}} if cursor is not None else {}))
+        attempts = await db.attempts.find(
+            batch_query, {"_id": 1, "exam_id": 1, "answers": 1}
+        ).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not attempts:
+            break
+
+        ops = []
+        for attempt in attempts:
+            if attempt["exam_id"] not in layouts:
+                exam = await db.exams.find_one({"id": attempt["exam_id"]}, {"_id": 0, "paper1_questions": 1})
+                layouts[attempt["exam_id"]] = AnswerLayout.from_exam(exam) if exam else None
+            layout = layouts[attempt["exam_id"]]
+            answers = attempt.get("answers") or {}
+            packed = await codec.pack(layout, answers) if layout else None
+            if packed is None:
+                report["skipped"] += 1
+                continue
+            report["bytes_before"] += len(json.dumps(answers))
+            report["bytes_after"] += len(packed["answers_packed"]) + len(packed["answers_layout"])
+            ops.append(UpdateOne({"_id": attempt["_id"], "state": "graded"}, with_packed({}, packed)))
+
+        if ops and not dry_run:
+            await db.attempts.bulk_write(ops, ordered=False)
+        report["scanned"] += len(attempts)
+        report["converted"] += len(ops)
+        cursor = attempts[-1]["_id"]
+    return report
+
+
+async def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Pack graded attempt answers (3 bits per question)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--exam", default=None, help="Only this exam id")
+    parser.add_argument("--dry-run", action="store_true", help="Report savings without writing")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL'))
+    db = client[os.environ.get('DB_NAME_EXAM', 'exam_bureau_db')]
+
+    print(f"🗜️  Packing attempt answers{' (dry run)' if args.dry_run else ''}")
+    print("=" * 50)
+    report = await convert_attempts(db, args.batch_size, args.exam, args.dry_run)
+    print(f"✅ Converted: {report['converted']} / {report['scanned']} attempts ({report['skipped']} left as dict)")
+    print(f"   Answer bytes: {report['bytes_before']} -> {report['bytes_after']}")
+
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,249 @@
+"""
+Progress report benchmark for the exam platform
+Seeds a scratch database with synthetic students holding months of graded
+Paper 1 attempts (full answer sheets) and marked Paper 2 submissions, then
+times GET /api/students/{id}/progress's ways of building the report:
+
+    loop      - the original three queries joined in Python (baseline)
+    pipeline  - one aggregation with $lookup (PROGRESS_REPORT_MODE=pipeline)
+    summary   - the student_progress read model (default mode)
+
+Reports p50/p95 latency and the bytes MongoDB sends back per report.
+Needs a real MongoDB (5.0+ for indexed $lookup pipelines); the scratch
+database ``<DB_NAME_EXAM>_bench`` is dropped afterwards unless --keep
+
+Usage: python benchmark_progress.py [--students 200] [--months 30] [--reads 50] [--modes loop,pipeline,summary] [--keep]
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+import bson
+import numpy as np
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+from grading_service import AttemptState
+from migration_service import build_student_progress, create_core_indexes, create_id_indexes
+from student_progress_service import StudentProgressStore
+
+SKILLS = ["reading_comprehension", "vocabulary", "grammar", "mathematics", "logical_reasoning", "general_knowledge"]
+QUESTIONS = 60
+MODES = ("loop", "pipeline", "summary")
+
+
+class ReplyBytes(monitoring.CommandListener):
+    """Sums the BSON size of server replies while ``active``"""
+
+    def __init__(self):
+        self.active = False
+        self.total = 0
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        if self.active:
+            self.total += len(bson.encode(event.reply))
+
+    def failed(self, event):
+        pass
+
+
+async def seed(db, students: int, months: int, batch_size: int = 1000) -> List[str]:
+    """One exam per month, one graded attempt per student per exam"""
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    exams = []
+    for m in range(months):
+        month = (start + timedelta(days=31 * m)).strftime("%Y-%m")
+        exams.append({
+            "id": str(uuid.uuid4()),
+            "month": month,
+            "title": f"Benchmark Exam {month}",
+            "paper1_questions": [
+                {"id": str(uuid.uuid4()), "options": ["A", "B", "C", "D"], "correct_answer": "A",
+                 "skill_area": SKILLS[q % len(SKILLS)], "marks": 1}
+                for q in range(QUESTIONS)
+            ]
+        })
+    await db.exams.insert_many(exams)
+
+    rng = random.Random(42)
+    student_ids = [f"bench_student_{i:05d}" for i in range(students)]
+    attempts, submissions = [], []
+
+    async def flush():
+        if attempts:
+            await db.attempts.insert_many(attempts, ordered=False)
+            attempts.clear()
+        if submissions:
+            await db.paper2_submissions.insert_many(submissions, ordered=False)
+            submissions.clear()
+
+    for student_id in student_ids:
+        for m, exam in enumerate(exams):
+            submitted_at = start + timedelta(days=31 * m + 5, minutes=rng.randrange(600))
+            answers = {q["id"]: rng.choice("ABCD") for q in exam["paper1_questions"]}
+            attempts.append({
+                "id": str(uuid.uuid4()),
+                "student_id": student_id,
+                "exam_id": exam["id"],
+                "state": AttemptState.GRADED.value,
+                "is_completed": True,
+                "answers": answers,
+                "score_paper1": sum(a == "A" for a in answers.values()),
+                "skill_percentages": {skill: round(rng.uniform(0, 100), 1) for skill in SKILLS},
+                "started_at": submitted_at - timedelta(minutes=50),
+                "submitted_at": submitted_at
+            })
+            if rng.random() < 0.7:
+                submissions.append({
+                    "id": str(uuid.uuid4()),
+                    "student_id": student_id,
+                    "exam_id": exam["id"],
+                    "total_marks": rng.randrange(41),
+                    "marked_at": submitted_at + timedelta(days=3)
+                })
+            if len(attempts) >= batch_size:
+                await flush()
+    await flush()
+
+    # Production indexes, then the read model as migration v11 builds it
+    await create_core_indexes(db, {})
+    await create_id_indexes(db, {})
+    await build_student_progress(db, {})
+    return student_ids
+
+
+async def loop_report(db, student_id: str) -> dict:
+    """The report as get_student_progress built it before the read model"""
+    attempts = await db.attempts.find(
+        {"student_id": student_id, "is_completed": True},
+        {"_id": 0}
+    ).sort("submitted_at", 1).to_list(100)
+
+    paper2_subs = await db.paper2_submissions.find(
+        {"student_id": student_id, "marked_at": {"$exists": True}},
+        {"_id": 0}
+    ).to_list(100)
+
+    exam_ids = [attempt["exam_id"] for attempt in attempts]
+    exams_map = {
+        exam["id"]: exam for exam in
+        await db.exams.find({"id": {"$in": exam_ids}}, {"_id": 0, "id": 1, "month": 1, "title": 1}).to_list(100)
+    }
+
+    monthly_progress = []
+    skill_trends = {skill: [] for skill in SKILLS}
+    for attempt in attempts:
+        exam = exams_map.get(attempt["exam_id"])
+        if not exam:
+            continue
+        paper2 = next((p for p in paper2_subs if p["exam_id"] == attempt["exam_id"]), None)
+        paper2_score = paper2["total_marks"] if paper2 else 0
+        monthly_progress.append({
+            "month": exam["month"],
+            "exam_title": exam["title"],
+            "paper1_score": attempt["score_paper1"],
+            "paper2_score": paper2_score,
+            "total_score": attempt["score_paper1"] + paper2_score,
+            "total_possible": 100,
+            "skill_percentages": attempt.get("skill_percentages", {}),
+            "submitted_at": attempt["submitted_at"]
+        })
+        for skill, percentage in attempt.get("skill_percentages", {}).items():
+            skill_trends[skill].append({"month": exam["month"], "percentage": percentage})
+
+    if attempts:
+        sorted_skills = sorted(attempts[-1].get("skill_percentages", {}).items(), key=lambda x: x[1], reverse=True)
+        strengths, weaknesses = sorted_skills[:3], sorted_skills[-3:]
+    else:
+        strengths, weaknesses = [], []
+    return {
+        "student_id": student_id,
+        "monthly_progress": monthly_progress,
+        "skill_trends": skill_trends,
+        "strengths": strengths,
+        "weaknesses": weaknesses,
+        "total_exams_taken": len(monthly_progress)
+    }
+
+
+async def run(db, listener: ReplyBytes, student_ids: List[str], reads: int, modes=MODES) -> Dict[str, dict]:
+    builders = {"loop": lambda student_id: loop_report(db, student_id)}
+    for mode in ("pipeline", "summary"):
+        builders[mode] = StudentProgressStore(db, skills=SKILLS, mode=mode).report
+    sample = random.Random(7).sample(student_ids, min(reads, len(student_ids)))
+
+    results = {}
+    for mode in modes:
+        build = builders[mode]
+        await build(sample[0])  # Warm the connection pool and caches
+
+        timings = []
+        for student_id in sample:
+            began = time.perf_counter()
+            await build(student_id)
+            timings.append((time.perf_counter() - began) * 1000)
+
+        # Wire size on a separate pass - encoding replies would skew the timings
+        listener.total, listener.active = 0, True
+        report = None
+        for student_id in sample:
+            report = await build(student_id)
+        listener.active = False
+
+        results[mode] = {
+            "p50_ms": float(np.percentile(timings, 50)),
+            "p95_ms": float(np.percentile(timings, 95)),
+            "bytes": listener.total // len(sample),
+            "exams": report["total_exams_taken"],
+        }
+    return results
+
+
+async def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Benchmark the student progress report modes")
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--months", type=int, default=30, help="Months of history per student")
+    parser.add_argument("--reads", type=int, default=50, help="Reports timed per mode")
+    parser.add_argument("--modes", default=",".join(MODES), help="Comma-separated subset of " + ", ".join(MODES))
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch database")
+    args = parser.parse_args()
+    modes = [mode for mode in args.modes.split(",") if mode]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"Unknown modes: {', '.join(sorted(unknown))}")
+
+    listener = ReplyBytes()
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL'), event_listeners=[listener])
+    db_name = os.environ.get('DB_NAME_EXAM', 'exam_bureau_db') + "_bench"
+    db = client[db_name]
+
+    print(f"⏱️  Progress report benchmark ({args.students} students x {args.months} months)")
+    print("=" * 50)
+    await client.drop_database(db_name)
+    began = time.perf_counter()
+    student_ids = await seed(db, args.students, args.months)
+    print(f"🌱 Seeded {db_name} in {time.perf_counter() - began:.1f}s")
+
+    try:
+        results = await run(db, listener, student_ids, args.reads, modes)
+        print(f"{'mode':<10}{'p50 ms':>10}{'p95 ms':>10}{'bytes/report':>15}{'exams':>8}")
+        for mode, r in results.items():
+            print(f"{mode:<10}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['bytes']:>15}{r['exams']:>8}")
+    finally:
+        if not args.keep:
+            await client.drop_database(db_name)
+            print(f"🗑️  Dropped {db_name}")
+        client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,219 @@
+"""
+Per-worker caches for the exam platform
+Keeps hot lookups (authenticated users, exam lists, branding) out of MongoDB
+during exam peaks
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+from cachetools import LRUCache, TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesces concurrent loads of the same key into one in-flight call.
+
+    The load runs as its own task, so a caller that gives up (client
+    disconnect) does not cancel it for the others still waiting.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def owns(self, key: Hashable, task: Optional[asyncio.Task]) -> bool:
+        """``task`` is still the load later callers of ``key`` would join"""
+        return task is not None and self._inflight.get(key) is task
+
+    def forget(self, key: Optional[Hashable] = None):
+        """Detach in-flight loads (one key, or all): their current waiters
+        still get the result, later callers start a fresh load"""
+        if key is None:
+            self._inflight.clear()
+        else:
+            self._inflight.pop(key, None)
+
+    async def do(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fetch())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # Mark as retrieved even if every waiter left
+
+
+class SWRCache:
+    """TTL cache with single-flight misses and stale-while-revalidate.
+
+    Fresh entries (younger than ``ttl``) are returned directly. Entries in
+    the following ``stale_ttl`` window are still returned, while one
+    background load refreshes them. Older or missing entries make callers
+    await a single shared load. ``invalidate`` detaches loads in flight, so
+    they neither serve later callers nor store what they read.
+    """
+
+    def __init__(self, ttl: float = 300, stale_ttl: float = 60, maxsize: int = 1000, cache_none: bool = True):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.cache_none = cache_none
+        self._entries = LRUCache(maxsize=maxsize)
+        self._flight = SingleFlight()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refresh_errors = 0
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, loaded_at = entry
+            age = time.monotonic() - loaded_at
+            if age < self.ttl:
+                self.hits += 1
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._refresh_in_background(key, fetch)
+                return value
+
+        self.misses += 1
+        return await self._flight.do(key, lambda: self._load(key, fetch))
+
+    def set(self, key: Hashable, value: Any):
+        self._entries[key] = (value, time.monotonic())
+
+    async def _load(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        # Runs as the single-flight task; skip storing if invalidated meanwhile
+        task = asyncio.current_task()
+        value = await fetch()
+        if self._flight.owns(key, task) and (value is not None or self.cache_none):
+            self.set(key, value)
+        return value
+
+    def _refresh_in_background(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]):
+        if self._flight.in_flight(key):
+            return
+
+        async def refresh():
+            try:
+                await self._flight.do(key, lambda: self._load(key, fetch))
+            except Exception as e:
+                self.refresh_errors += 1
+                logger.warning(f"Background refresh of {key!r} failed: {e}")
+
+        asyncio.ensure_future(refresh())
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Drop one key, or everything when ``key`` is None"""
+        self._flight.forget(key)
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._entries),
+            "maxsize": self._entries.maxsize,
+            "ttl_seconds": self.ttl,
+            "stale_ttl_seconds": self.stale_ttl,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "loads": self._flight.calls,
+            "coalesced": self._flight.coalesced,
+            "refresh_errors": self.refresh_errors,
+        }
+
+
+class PrincipalCache:
+    """Authenticated users keyed by user id, with hit/miss counters.
+
+    Entries expire after ``ttl`` seconds so changes made through another
+    worker are picked up eventually; changes made here are applied at once
+    through ``invalidate``.
+    """
+
+    def __init__(self, maxsize: int = 5000, ttl: int = 60):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._flight = SingleFlight()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id: str) -> Optional[Any]:
+        user = self._cache.get(user_id)
+        if user is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return user
+
+    def set(self, user_id: str, user: Any):
+        self._cache[user_id] = user
+
+    async def get_or_load(self, user_id: str, load: Callable[[], Awaitable[Any]]) -> Optional[Any]:
+        """Cached user, or one shared ``load`` for all concurrent misses.
+
+        Principals are never served stale: a deactivation must take effect
+        as soon as the entry expires or is invalidated.
+        """
+        user = self.get(user_id)
+        if user is not None:
+            return user
+
+        async def fill():
+            generation = self._generation
+            loaded = await load()
+            # Skip storing if the user was invalidated while loading
+            if loaded is not None and generation == self._generation:
+                self.set(user_id, loaded)
+            return loaded
+
+        return await self._flight.do(user_id, fill)
+
+    def invalidate(self, user_id: str):
+        """Drop a single user (deactivated, role or grade changed)"""
+        self._generation += 1
+        self._flight.forget(user_id)
+        if self._cache.pop(user_id, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self._generation += 1
+        self._flight.forget()
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "maxsize": self._cache.maxsize,
+            "ttl_seconds": self._cache.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "coalesced": self._flight.coalesced,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
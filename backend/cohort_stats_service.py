@@ -0,0 +1,130 @@
+"""
+Cohort statistics for the exam platform
+Per-exam distribution of graded Paper 1 scores - mean, standard deviation,
+histogram, percentiles and per-skill averages - computed with NumPy from one
+streamed pass over the exam's attempts. The scores are kept sorted, so a
+student's percentile rank is a binary search; results are cached per exam
+and invalidated (coalesced, see ``InvalidationBus.publish_soon``) when
+attempts for that exam are graded
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from cache_service import SWRCache
+from etag_service import as_utc
+from grading_service import AttemptState, GradingPlanStore
+
+PERCENTILES = (10, 25, 50, 75, 90)
+HISTOGRAM_BINS = 10
+# Attempts without a usable submitted_at lose to any dated retake
+NEVER = datetime.min.replace(tzinfo=timezone.utc)
+
+COHORT_FIELDS = {"_id": 0, "student_id": 1, "score_paper1": 1, "skill_percentages": 1, "submitted_at": 1}
+
+
+class ExamCohort:
+    """Graded scores of one exam, one (latest) attempt per student"""
+
+    def __init__(self, exam_id: str, total: int, student_ids: Sequence[str], scores: np.ndarray,
+                 skills: Sequence[str], skill_matrix: np.ndarray):
+        self.exam_id = exam_id
+        self.total = total
+        self.skills = list(skills)
+        self.scores = np.sort(scores)
+        self._score_of = dict(zip(student_ids, scores.tolist()))
+        self.count = len(self.scores)
+        self.mean = float(self.scores.mean()) if self.count else 0.0
+        self.std = float(self.scores.std()) if self.count else 0.0
+        self._summary = self._summarize(skill_matrix)
+
+    def _summarize(self, skill_matrix: np.ndarray) -> dict:
+        if not self.count:
+            return {"exam_id": self.exam_id, "total": self.total, "count": 0}
+        edges = np.linspace(0, self.total or self.scores[-1] or 1, HISTOGRAM_BINS + 1)
+        counts, _ = np.histogram(self.scores, bins=edges)
+        return {
+            "exam_id": self.exam_id,
+            "total": self.total,
+            "count": self.count,
+            "mean": round(self.mean, 2),
+            "std": round(self.std, 2),
+            "min": int(self.scores[0]),
+            "max": int(self.scores[-1]),
+            "percentiles": {f"p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, np.percentile(self.scores, PERCENTILES))},
+            "histogram": {"bin_edges": np.round(edges, 2).tolist(), "counts": counts.tolist()},
+            # Attempts graded before a skill existed count as 0 for it
+            "skill_averages": dict(zip(self.skills, np.round(skill_matrix.mean(axis=0), 1).tolist()))
+        }
+
+    def summary(self) -> dict:
+        return self._summary
+
+    def position(self, score: float) -> dict:
+        """Percentile rank (ties count half) and z-score of ``score``"""
+        below = int(np.searchsorted(self.scores, score, side="left"))
+        at_or_below = int(np.searchsorted(self.scores, score, side="right"))
+        return {
+            "score": score,
+            "percentile": round((below + (at_or_below - below) / 2) / self.count * 100, 1) if self.count else 0.0,
+            "z_score": round((score - self.mean) / self.std, 2) if self.std > 0 else 0.0,
+            "scored_below": below,
+            "cohort_size": self.count
+        }
+
+    def student(self, student_id: str) -> Optional[dict]:
+        score = self._score_of.get(student_id)
+        if score is None:
+            return None
+        return {"exam_id": self.exam_id, "student_id": student_id, "total": self.total, **self.position(score)}
+
+
+async def load_cohort(db, exam_id: str, total: int, skills: Sequence[str]) -> ExamCohort:
+    """Stream the exam's graded attempts; a retake replaces the earlier attempt"""
+    latest: Dict[str, dict] = {}
+    submitted: Dict[str, datetime] = {}
+    cursor = db.attempts.find({"exam_id": exam_id, "state": AttemptState.GRADED.value}, COHORT_FIELDS)
+    async for attempt in cursor.batch_size(5000):
+        # Naive, aware and legacy string timestamps all compare as UTC
+        at = as_utc(attempt.get("submitted_at")) or NEVER
+        student_id = attempt["student_id"]
+        if student_id not in latest or at >= submitted[student_id]:
+            latest[student_id] = attempt
+            submitted[student_id] = at
+
+    attempts: List[dict] = list(latest.values())
+    scores = np.fromiter((a.get("score_paper1", 0) for a in attempts), dtype=np.int64, count=len(attempts))
+    skill_matrix = np.array(
+        [[(a.get("skill_percentages") or {}).get(skill, 0) for skill in skills] for a in attempts],
+        dtype=np.float64
+    ).reshape(len(attempts), len(skills))
+    return ExamCohort(exam_id, total, [a["student_id"] for a in attempts], scores, skills, skill_matrix)
+
+
+class CohortStats:
+    """Cohorts cached per exam until its next grading"""
+
+    def __init__(self, db, plans: GradingPlanStore, ttl: int = 600, maxsize: int = 256):
+        self.db = db
+        self.plans = plans
+        self._cache = SWRCache(ttl=ttl, stale_ttl=0, maxsize=maxsize, cache_none=False)
+        self.computed = 0
+
+    async def get(self, exam_id: str) -> Optional[ExamCohort]:
+        """None if the exam does not exist"""
+        return await self._cache.get(exam_id, lambda: self._compute(exam_id))
+
+    async def _compute(self, exam_id: str) -> Optional[ExamCohort]:
+        plan = await self.plans.get(exam_id)
+        if plan is None:
+            return None
+        self.computed += 1
+        return await load_cohort(self.db, exam_id, plan.total, plan.skills)
+
+    def invalidate(self, exam_id: Optional[str] = None):
+        self._cache.invalidate(exam_id)
+
+    def stats(self) -> dict:
+        return {"computed": self.computed, **self._cache.stats()}
@@ -0,0 +1,70 @@
+"""
+Conditional GET helpers for the exam platform
+Responses are serialized once into a snapshot carrying a content-hash ETag
+and Last-Modified; dashboards that re-fetch on every navigation get a 304
+with no body when nothing changed
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Iterable, Optional
+
+from fastapi import Request, Response
+
+from exam_payload_service import dumps
+
+
+def as_utc(value) -> Optional[datetime]:
+    """Mongo returns naive UTC datetimes; some legacy documents store ISO strings"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def latest(values: Iterable[Any]) -> Optional[datetime]:
+    stamps = [stamp for stamp in (as_utc(v) for v in values) if stamp]
+    return max(stamps) if stamps else None
+
+
+class JSONSnapshot:
+    """A serialized response body with its validators"""
+
+    __slots__ = ("body", "etag", "last_modified")
+
+    def __init__(self, value: Any, last_modified: Optional[datetime] = None):
+        self.body = dumps(value)
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest() + '"'
+        self.last_modified = as_utc(last_modified)
+
+
+def _not_modified(request: Request, snapshot: JSONSnapshot) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return snapshot.etag in tags or "*" in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and snapshot.last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return snapshot.last_modified.replace(microsecond=0) <= as_utc(since)
+    return False
+
+
+def conditional_response(request: Request, snapshot: JSONSnapshot) -> Response:
+    """304 when the client's copy is current, otherwise the snapshot body"""
+    headers = {"ETag": snapshot.etag, "Cache-Control": "private, no-cache"}
+    if snapshot.last_modified:
+        headers["Last-Modified"] = format_datetime(snapshot.last_modified, usegmt=True)
+
+    if _not_modified(request, snapshot):
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
@@ -0,0 +1,179 @@
+"""
+Published exam payloads for the exam platform
+Publishing freezes a versioned, answer-key-free student view of the exam,
+serialized once to JSON bytes (and gzip). Exam start/resume serves those
+bytes from an in-process cache, so a 9am start costs one Mongo read per
+worker instead of one exam read per student
+
+Besides the full trilingual view, one projection per medium is stored so a
+Sinhala-medium student downloads only the Sinhala text
+"""
+
+import gzip
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from bson import Binary
+
+from cache_service import SWRCache
+
+logger = logging.getLogger(__name__)
+
+# Fields that must never reach a student's browser
+ANSWER_KEY_FIELDS = ("correct_option_id", "correct_answer")
+
+# English text lives in the plain field (question_text, options);
+# translations in suffixed siblings (question_text_si, options_ta, ...)
+LANGUAGES = ("en", "si", "ta")
+TRANSLATION_SUFFIXES = {"si": "_si", "ta": "_ta"}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+
+def dumps(value) -> bytes:
+    """Compact UTF-8 JSON used for every pre-serialized payload"""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode("utf-8")
+
+
+def strip_answer_keys(question: dict) -> dict:
+    student_question = {k: v for k, v in question.items() if k not in ANSWER_KEY_FIELDS}
+    options = student_question.get("options")
+    if options and isinstance(options[0], dict):
+        student_question["options"] = [
+            {k: v for k, v in option.items() if k != "is_correct"} for option in options
+        ]
+    return student_question
+
+
+def project_language(question: dict, lang: str) -> dict:
+    """Keep one language: translated values move into the plain field names"""
+    suffixes = tuple(TRANSLATION_SUFFIXES.values())
+    projected = {k: v for k, v in question.items() if not k.endswith(suffixes)}
+    suffix = TRANSLATION_SUFFIXES.get(lang)
+    if suffix:
+        for key, value in question.items():
+            base = key[:-len(suffix)]
+            if key.endswith(suffix) and base in projected and value:
+                projected[base] = value
+    return projected
+
+
+def build_student_view(exam: dict, lang: Optional[str] = None) -> dict:
+    """What a student receives when starting/resuming Paper 1 (all languages when ``lang`` is None)"""
+    questions = [strip_answer_keys(q) for q in exam.get("paper1_questions", [])]
+    view = {
+        "id": exam["id"],
+        "title": exam["title"],
+        "duration_minutes": exam["duration_minutes"],
+        "questions": questions if lang is None else [project_language(q, lang) for q in questions]
+    }
+    if lang is not None:
+        view["language"] = lang
+    return view
+
+
+class ExamPayload:
+    """Immutable serialized student views of one exam version.
+
+    ``bodies``/``bodies_gzip`` are keyed by language code, with "all" for
+    the full trilingual view.
+    """
+
+    __slots__ = ("exam_id", "version", "bodies", "bodies_gzip", "duration_minutes")
+
+    def __init__(self, exam_id: str, version: int, bodies: Dict[str, bytes], bodies_gzip: Optional[Dict[str, bytes]] = None,
+                 duration_minutes: Optional[int] = None):
+        self.exam_id = exam_id
+        self.version = version
+        self.bodies = bodies
+        self.bodies_gzip = bodies_gzip or {}
+        if duration_minutes is None:
+            # Payloads frozen before the field was stored
+            duration_minutes = json.loads(bodies["all"])["duration_minutes"]
+        self.duration_minutes = duration_minutes
+
+    def body(self, lang: Optional[str] = None) -> bytes:
+        return self.bodies[lang or "all"]
+
+    def body_gzip(self, lang: Optional[str] = None) -> Optional[bytes]:
+        return self.bodies_gzip.get(lang or "all")
+
+
+class ExamPayloadStore:
+    """Versioned payloads persisted in ``exam_payloads`` with a per-worker cache"""
+
+    def __init__(self, db, maxsize: int = 256, ttl: int = 300, compress: bool = True):
+        self.db = db
+        self.compress = compress
+        # Single-flight: the 9am herd of first starts on a worker shares one read;
+        # unpublished exams (None) are not cached
+        self._cache = SWRCache(ttl=ttl, stale_ttl=60, maxsize=maxsize, cache_none=False)
+
+    def _build(self, exam: dict, version: int) -> ExamPayload:
+        bodies = {"all": dumps(build_student_view(exam))}
+        for lang in LANGUAGES:
+            bodies[lang] = dumps(build_student_view(exam, lang))
+        bodies_gzip = {}
+        if self.compress:
+            bodies_gzip = {key: gzip.compress(body, compresslevel=6) for key, body in bodies.items()}
+        return ExamPayload(exam["id"], version, bodies, bodies_gzip, exam["duration_minutes"])
+
+    async def publish(self, exam: dict) -> ExamPayload:
+        """Freeze the current exam document as payload ``exam['payload_version']``
+
+        Only persists: the caller invalidates ``exam:<id>`` (which evicts this
+        worker's entry too) and then ``prime``s the cache with the result.
+        """
+        version = exam.get("payload_version", 1)
+        payload = self._build(exam, version)
+        await self.db.exam_payloads.update_one(
+            {"_id": f"{exam['id']}:{version}"},
+            {"$set": {
+                "exam_id": exam["id"],
+                "version": version,
+                "grade": exam.get("grade"),
+                "duration_minutes": payload.duration_minutes,
+                "bodies": {key: Binary(body) for key, body in payload.bodies.items()},
+                "bodies_gzip": {key: Binary(body) for key, body in payload.bodies_gzip.items()},
+                "created_at": datetime.now(timezone.utc)
+            }},
+            upsert=True
+        )
+        return payload
+
+    def prime(self, payload: ExamPayload):
+        """Serve ``payload`` from this worker's cache without a reload"""
+        self._cache.set(payload.exam_id, payload)
+
+    async def get(self, exam_id: str) -> Optional[ExamPayload]:
+        """Latest payload for a published exam, or None if not published"""
+        return await self._cache.get(exam_id, lambda: self._load(exam_id))
+
+    async def _load(self, exam_id: str) -> Optional[ExamPayload]:
+        doc = await self.db.exam_payloads.find_one({"exam_id": exam_id, "bodies": {"$exists": True}}, sort=[("version", -1)])
+        if doc:
+            payload = ExamPayload(
+                exam_id, doc["version"],
+                {key: bytes(body) for key, body in doc["bodies"].items()},
+                {key: bytes(body) for key, body in doc.get("bodies_gzip", {}).items()},
+                doc.get("duration_minutes")
+            )
+        else:
+            # Published before (per-language) payloads existed - freeze it now
+            exam = await self.db.exams.find_one({"id": exam_id, "status": "published"}, {"_id": 0})
+            if not exam:
+                return None
+            payload = await self.publish(exam)
+        return payload
+
+    def invalidate(self, exam_id: Optional[str] = None):
+        self._cache.invalidate(exam_id)
+
+    def stats(self) -> dict:
+        return self._cache.stats()
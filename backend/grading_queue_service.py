@@ -0,0 +1,285 @@
+"""
+Submission grading queue for the exam platform
+In queued submit mode a submit only closes the attempt and records a job in
+``grading_jobs``; a small pool of tasks on every worker claims jobs in
+batches and grades them with the compiled grading plans. Submit latency
+stays flat however many students finish in the same minute
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from answer_codec_service import with_packed
+from etag_service import as_utc
+from grading_service import AttemptState
+
+logger = logging.getLogger(__name__)
+
+
+class GradingQueue:
+    """Mongo-backed job queue drained by ``concurrency`` tasks per worker.
+
+    A job's ``_id`` is its attempt id, so enqueueing is idempotent. Claimed
+    jobs carry a lease; jobs whose claimer died are picked up again once it
+    expires. A job is given up (attempt ``failed``) after ``max_tries``
+    claims, whether grading raised or the claimer died mid-batch.
+    ``on_graded`` receives the attempts each batch graded.
+
+    With ``drain=False`` (synchronous submit mode, where nothing is queued)
+    no tasks poll for jobs; one task scans for orphaned submissions every
+    ``orphan_interval`` seconds and grades whatever that enqueued.
+    """
+
+    def __init__(self, db, plans, codec=None, concurrency: int = 2, batch_size: int = 200,
+                 poll_interval: float = 0.5, claim_ttl: int = 60, max_tries: int = 5,
+                 drain: bool = True, orphan_interval: float = 30,
+                 on_graded: Optional[Callable[[List[dict]], Awaitable[None]]] = None):
+        self.db = db
+        self.plans = plans
+        self.codec = codec
+        self.on_graded = on_graded
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.claim_ttl = claim_ttl
+        self.max_tries = max_tries
+        self.drain = drain
+        self.orphan_interval = orphan_interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._wake = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._last_orphan_scan = 0.0
+
+        self.enqueued = 0
+        self.graded = 0
+        self.failed = 0
+        self.batches = 0
+        self.latency_total = 0.0  # Submit to graded, seconds
+        self.latency_max = 0.0
+
+    async def enqueue(self, attempt_id: str, exam_id: str):
+        try:
+            await self.db.grading_jobs.insert_one({
+                "_id": attempt_id,
+                "exam_id": exam_id,
+                "status": "pending",
+                "tries": 0,
+                "created_at": datetime.now(timezone.utc)
+            })
+            self.enqueued += 1
+        except DuplicateKeyError:
+            pass  # Already queued
+        self._wake.set()
+
+    async def start(self):
+        if self._tasks:
+            return
+        if self.drain:
+            self._tasks = [asyncio.ensure_future(self._drain()) for _ in range(self.concurrency)]
+        else:
+            self._tasks = [asyncio.ensure_future(self._rescue())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def _drain(self):
+        while True:
+            try:
+                if await self.process_batch():
+                    continue  # More may be waiting
+                if time.monotonic() - self._last_orphan_scan > self.orphan_interval:
+                    self._last_orphan_scan = time.monotonic()
+                    await self.requeue_orphans()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Grading queue error: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _rescue(self):
+        while True:
+            try:
+                await self.requeue_orphans()
+                while await self.process_batch():
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Grading queue error: {e}")
+            await asyncio.sleep(self.orphan_interval)
+
+    async def _claim(self) -> List[dict]:
+        """Claim up to ``batch_size`` pending (or abandoned) jobs for this task"""
+        now = datetime.now(timezone.utc)
+        claimable = {"$or": [
+            {"status": "pending"},
+            {"status": "running", "claim_expires_at": {"$lt": now}}
+        ]}
+        ids = [job["_id"] async for job in self.db.grading_jobs.find(claimable, {"_id": 1}).limit(self.batch_size)]
+        if not ids:
+            return []
+        token = uuid.uuid4().hex
+        await self.db.grading_jobs.update_many(
+            {"_id": {"$in": ids}, **claimable},
+            {
+                "$set": {
+                    "status": "running",
+                    "claim": token,
+                    "claimed_by": self.owner,
+                    "claim_expires_at": now + timedelta(seconds=self.claim_ttl)
+                },
+                "$inc": {"tries": 1}
+            }
+        )
+        # Only what this task won - another task may have claimed some ids first
+        return await self.db.grading_jobs.find(
+            {"claim": token}, {"_id": 1, "exam_id": 1, "tries": 1, "error": 1}
+        ).to_list(self.batch_size)
+
+    async def process_batch(self) -> int:
+        jobs = await self._claim()
+        if not jobs:
+            return 0
+
+        # Claimed max_tries times without finishing - the claimer kept dying on it
+        exhausted = {job["_id"]: job.get("error") or "max_tries_exceeded" for job in jobs if job.get("tries", 1) > self.max_tries}
+        if exhausted:
+            await self._fail(jobs, exhausted)
+            jobs = [job for job in jobs if job["_id"] not in exhausted]
+            if not jobs:
+                return len(exhausted)
+
+        try:
+            graded, failures = await self._grade(jobs)
+        except Exception as e:
+            # Retry now (tries counted) instead of waiting for the claim to expire
+            logger.error(f"Grading batch of {len(jobs)} jobs failed: {e}")
+            await self._fail(jobs, {job["_id"]: f"{type(e).__name__}: {e}" for job in jobs})
+            return len(jobs) + len(exhausted)
+
+        # Jobs whose attempt was already graded (or vanished) are simply done
+        done_ids = [job["_id"] for job in jobs if job["_id"] not in failures]
+        await self.db.grading_jobs.update_many(
+            {"_id": {"$in": done_ids}},
+            {"$set": {"status": "done", "completed_at": datetime.now(timezone.utc)}, "$unset": {"claim": ""}}
+        )
+        if failures:
+            await self._fail(jobs, failures)
+
+        self.batches += 1
+        self.graded += len(graded)
+        return len(jobs) + len(exhausted)
+
+    async def _grade(self, jobs: List[dict]):
+        """Grade the jobs' attempts; returns (graded attempts, {attempt id: error})"""
+        attempts = {
+            attempt["id"]: attempt
+            async for attempt in self.db.attempts.find(
+                {"id": {"$in": [job["_id"] for job in jobs]}, "state": AttemptState.SUBMITTING.value},
+                {"_id": 0, "id": 1, "student_id": 1, "exam_id": 1, "answers": 1, "started_at": 1, "submitted_at": 1}
+            )
+        }
+        by_exam: Dict[str, List[dict]] = {}
+        for attempt in attempts.values():
+            by_exam.setdefault(attempt["exam_id"], []).append(attempt)
+        plans = await self.plans.get_many(list(by_exam))
+
+        now = datetime.now(timezone.utc)
+        ops = []
+        graded, failures = [], {}
+        for exam_id, exam_attempts in by_exam.items():
+            plan = plans.get(exam_id)
+            if plan is None:
+                failures.update({a["id"]: "exam_not_found" for a in exam_attempts})
+                continue
+            results = plan.grade_isolated([a.get("answers") or {} for a in exam_attempts])
+            for attempt, (result, error) in zip(exam_attempts, results):
+                if result is None:
+                    failures[attempt["id"]] = error
+                    continue
+                submitted_at = as_utc(attempt.get("submitted_at"))
+                started_at = as_utc(attempt.get("started_at")) or submitted_at
+                packed = None
+                if self.codec is not None:
+                    try:
+                        packed = await self.codec.pack(plan.layout, attempt.get("answers"))
+                    except Exception as e:
+                        logger.warning(f"Packing answers of attempt {attempt['id']} failed: {e}")
+                update = {
+                    "score_paper1": result["score"],
+                    "skill_scores": result["skill_scores"],
+                    "skill_percentages": result["skill_percentages"],
+                    "time_taken_seconds": max(0, int((submitted_at - started_at).total_seconds())) if submitted_at else 0,
+                    "state": AttemptState.GRADED.value,
+                    "graded_at": now
+                }
+                # submitting -> graded
+                ops.append(UpdateOne({"id": attempt["id"], "state": AttemptState.SUBMITTING.value}, with_packed(update, packed)))
+                graded.append({**attempt, **update})
+                if submitted_at:
+                    latency = (now - submitted_at).total_seconds()
+                    self.latency_total += latency
+                    self.latency_max = max(self.latency_max, latency)
+        if ops:
+            await self.db.attempts.bulk_write(ops, ordered=False)
+            if self.on_graded is not None:
+                await self.on_graded(graded)
+        return graded, failures
+
+    async def _fail(self, jobs: List[dict], failures: Dict[str, str]):
+        """Retry failed jobs, or give them up (and fail their attempt) after ``max_tries``"""
+        tries = {job["_id"]: job.get("tries", 1) for job in jobs}
+        ops, attempt_ops = [], []
+        for job_id, error in failures.items():
+            if tries.get(job_id, 1) < self.max_tries:
+                ops.append(UpdateOne({"_id": job_id}, {"$set": {"status": "pending", "error": error}, "$unset": {"claim": ""}}))
+                continue
+            self.failed += 1
+            ops.append(UpdateOne({"_id": job_id}, {"$set": {"status": "failed", "error": error}, "$unset": {"claim": ""}}))
+            attempt_ops.append(UpdateOne(
+                {"id": job_id, "state": AttemptState.SUBMITTING.value},
+                {"$set": {"state": AttemptState.FAILED.value, "grading_error": error}}
+            ))
+        if ops:
+            await self.db.grading_jobs.bulk_write(ops, ordered=False)
+        if attempt_ops:
+            await self.db.attempts.bulk_write(attempt_ops, ordered=False)
+
+    async def requeue_orphans(self, older_than: int = 60):
+        """Attempts stuck in ``submitting`` without a job: the job insert was
+        lost, or a synchronous submit died between its two transitions"""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=older_than)
+        async for attempt in self.db.attempts.find(
+            {"state": AttemptState.SUBMITTING.value, "submitted_at": {"$lt": cutoff}},
+            {"_id": 0, "id": 1, "exam_id": 1}
+        ).limit(self.batch_size):
+            if not await self.db.grading_jobs.find_one({"_id": attempt["id"]}, {"_id": 1}):
+                await self.enqueue(attempt["id"], attempt["exam_id"])
+
+    async def stats(self) -> dict:
+        return {
+            "workers": len(self._tasks),
+            "batch_size": self.batch_size,
+            "pending": await self.db.grading_jobs.count_documents({"status": {"$in": ["pending", "running"]}}),
+            "enqueued": self.enqueued,
+            "graded": self.graded,
+            "failed": self.failed,
+            "batches": self.batches,
+            "avg_latency_ms": round(self.latency_total / self.graded * 1000, 1) if self.graded else 0.0,
+            "max_latency_ms": round(self.latency_max * 1000, 1),
+        }
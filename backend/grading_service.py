@@ -0,0 +1,177 @@
+"""
+Paper 1 grading for the exam platform
+Each exam version is compiled once into a grading plan - answer-key, marks
+and skill-index arrays - and attempts are scored with NumPy, one at a time
+(submit) or thousands per call (auto-submit sweeps, regrades)
+"""
+
+import logging
+from enum import Enum
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from answer_codec_service import AnswerLayout
+from cache_service import SWRCache
+
+logger = logging.getLogger(__name__)
+
+# Answer code for unanswered or unknown options - never equal to a key code
+NO_ANSWER = -1
+
+
+class AttemptState(str, Enum):
+    """Attempt lifecycle; every transition is one conditional update.
+
+    in_progress -> submitting (answers frozen) -> graded, or failed when
+    the exam can no longer be graded. ``is_completed`` is set together with
+    ``submitting`` for older readers.
+    """
+    IN_PROGRESS = "in_progress"
+    SUBMITTING = "submitting"
+    GRADED = "graded"
+    FAILED = "failed"
+
+
+class GradingPlan:
+    """Compiled answer key of one exam version.
+
+    Option strings (letters or option ids) are mapped to small integer
+    codes so a batch of attempts becomes one ``(attempts, questions)``
+    integer matrix compared against the key in a single operation.
+    """
+
+    def __init__(self, exam: dict, skills: Sequence[str]):
+        self.exam_id = exam.get("id")
+        self.version = exam.get("version", 0)
+        questions = exam.get("paper1_questions", [])
+
+        # Handle both old and new question formats
+        self.question_ids: List[str] = [q.get("id") or str(q.get("question_number", "")) for q in questions]
+        self._positions = {q_id: i for i, q_id in enumerate(self.question_ids)}
+
+        # Handle both correct_option_id (new) and correct_answer (old) formats
+        keys = [q.get("correct_option_id") or q.get("correct_answer") for q in questions]
+        self._codes: Dict[str, int] = {}
+        for key in keys:
+            if key is not None:
+                self._codes.setdefault(key, len(self._codes))
+        self.key = np.array([self._codes.get(key, NO_ANSWER - 1) for key in keys], dtype=np.int32)
+        self.marks = np.array([q.get("marks", 1) for q in questions], dtype=np.int64)
+
+        # Every SkillArea appears in the result, plus any legacy skill found on the paper
+        self.skills: List[str] = list(skills)
+        for q in questions:
+            if q["skill_area"] not in self.skills:
+                self.skills.append(q["skill_area"])
+        skill_index = {skill: i for i, skill in enumerate(self.skills)}
+        self.skill_of = np.array([skill_index[q["skill_area"]] for q in questions], dtype=np.int64)
+        # questions x skills 0/1 matrix: earned marks @ onehot = marks per skill
+        self._onehot = np.zeros((len(questions), len(self.skills)), dtype=np.int64)
+        self._onehot[np.arange(len(questions)), self.skill_of] = 1
+        self.skill_totals = self.marks @ self._onehot
+
+        # Seeded exams predate total_marks_paper1 - fall back to the marks on the paper
+        self.total = exam.get("total_marks_paper1") or int(self.marks.sum())
+        # Question/option order for packed answer storage
+        self.layout = AnswerLayout.from_exam(exam)
+
+    def encode(self, answers: Dict[str, str]) -> np.ndarray:
+        """One attempt's answers as a row of option codes"""
+        row = np.full(len(self.question_ids), NO_ANSWER, dtype=np.int32)
+        for q_id, option in answers.items():
+            position = self._positions.get(q_id)
+            if position is not None:
+                row[position] = self._codes.get(option, NO_ANSWER)
+        return row
+
+    def score_matrix(self, codes: np.ndarray):
+        """Scores and per-skill marks for an ``(attempts, questions)`` code matrix"""
+        earned = (codes == self.key) * self.marks
+        return earned.sum(axis=1), earned @ self._onehot
+
+    def grade(self, answers: Dict[str, str]) -> dict:
+        return self.grade_many([answers])[0]
+
+    def grade_many(self, answer_sets: Sequence[Dict[str, str]]) -> List[dict]:
+        """Grade many attempts in one vectorized pass"""
+        if not answer_sets:
+            return []
+        codes = np.stack([self.encode(answers or {}) for answers in answer_sets])
+        scores, skill_marks = self.score_matrix(codes)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            percentages = np.where(self.skill_totals > 0, skill_marks / self.skill_totals * 100, 0.0)
+
+        results = []
+        for score, marks_row, pct_row in zip(scores.tolist(), skill_marks.tolist(), percentages.tolist()):
+            results.append({
+                "score": score,
+                "total": self.total,
+                "percentage": round(score / self.total * 100, 1) if self.total else 0.0,
+                "skill_scores": dict(zip(self.skills, marks_row)),
+                "skill_percentages": {
+                    skill: round(pct, 1) if total > 0 else 0
+                    for skill, pct, total in zip(self.skills, pct_row, self.skill_totals.tolist())
+                }
+            })
+        return results
+
+    def grade_isolated(self, answer_sets: Sequence[Dict[str, str]]) -> List[Tuple[Optional[dict], Optional[str]]]:
+        """``(result, error)`` per attempt; a failing batch is regraded one attempt
+        at a time so malformed answers fail only their own attempt"""
+        try:
+            return [(result, None) for result in self.grade_many(answer_sets)]
+        except Exception as e:
+            logger.error(f"Grading {len(answer_sets)} attempts of exam {self.exam_id} failed, isolating: {e}")
+        results = []
+        for answers in answer_sets:
+            try:
+                results.append((self.grade(answers), None))
+            except Exception as e:
+                results.append((None, f"{type(e).__name__}: {e}"))
+        return results
+
+
+class GradingPlanStore:
+    """Grading plans cached per (exam id, version)"""
+
+    def __init__(self, db, skills: Sequence[str], maxsize: int = 256, ttl: int = 3600):
+        self.db = db
+        self.skills = list(skills)
+        self._cache = SWRCache(ttl=ttl, stale_ttl=0, maxsize=maxsize, cache_none=False)
+        self.compiled = 0
+
+    async def get(self, exam_id: str, version: Optional[int] = None) -> Optional[GradingPlan]:
+        """Plan for the exam's current version (pass ``version`` if already known)"""
+        if version is None:
+            meta = await self.db.exams.find_one({"id": exam_id}, {"_id": 0, "id": 1, "version": 1})
+            if not meta:
+                return None
+            version = meta.get("version", 0)
+        return await self._cache.get((exam_id, version), lambda: self._compile(exam_id))
+
+    async def get_many(self, exam_ids: Sequence[str]) -> Dict[str, GradingPlan]:
+        """Plans for several exams with one version lookup"""
+        versions = {
+            exam["id"]: exam.get("version", 0)
+            async for exam in self.db.exams.find({"id": {"$in": list(exam_ids)}}, {"_id": 0, "id": 1, "version": 1})
+        }
+        plans = {}
+        for exam_id, version in versions.items():
+            plan = await self.get(exam_id, version)
+            if plan is not None:
+                plans[exam_id] = plan
+        return plans
+
+    async def _compile(self, exam_id: str) -> Optional[GradingPlan]:
+        exam = await self.db.exams.find_one({"id": exam_id}, {"_id": 0})
+        if not exam:
+            return None
+        self.compiled += 1
+        return GradingPlan(exam, self.skills)
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        self._cache.invalidate(key)
+
+    def stats(self) -> dict:
+        return {"compiled": self.compiled, **self._cache.stats()}
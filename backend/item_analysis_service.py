@@ -0,0 +1,236 @@
+"""
+Item analysis for the exam platform
+Per exam, every graded attempt becomes a row of option positions in an
+``attempts x questions`` response matrix (decoded straight from packed
+answers when the layout still matches). From it, with NumPy:
+
+    difficulty       p-value, the share answering correctly
+    discrimination   point-biserial of the item against the rest score
+    distractors      selection rate of each option, overall and in the
+                     top and bottom 27% of candidates by score
+    reliability      KR-20 of the whole paper
+
+Results are stored per question in ``item_analysis`` and per exam in
+``item_analysis_runs`` for the teacher and typesetter dashboards.
+Retakes count as separate response sheets
+
+Usage: python item_analysis_service.py --exam EXAM_ID
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence
+
+import numpy as np
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReplaceOne
+
+from answer_codec_service import AnswerCodec, AnswerLayout
+from grading_service import AttemptState
+from lease_service import MongoLease
+
+MIN_ATTEMPTS = 2
+# Upper/lower groups for distractor analysis (Kelley's 27%)
+GROUP_FRACTION = 0.27
+
+# Flag thresholds
+TOO_EASY = 0.9
+TOO_HARD = 0.2
+LOW_DISCRIMINATION = 0.2
+UNUSED_DISTRACTOR = 0.05
+
+ANALYSIS_FIELDS = {"_id": 0}
+ITEM_FIELDS = {"_id": 0, "exam_id": 0}
+
+
+class AnalysisInProgress(Exception):
+    """Another worker is analysing this exam"""
+
+
+def _rounded(values: np.ndarray, digits: int = 3) -> List[Optional[float]]:
+    return [None if np.isnan(v) else round(v, digits) for v in values.tolist()]
+
+
+def analyze(responses: np.ndarray, key: np.ndarray, option_counts: Sequence[int]) -> dict:
+    """Item statistics of an ``(attempts, questions)`` matrix of option positions.
+
+    ``key`` holds each question's correct position (1-based). Statistics a
+    constant column cannot support (every candidate right) are NaN.
+    """
+    n, k = responses.shape
+    correct = (responses == key).astype(np.float64)
+    total = correct.sum(axis=1)
+
+    p = correct.mean(axis=0)
+    var_item = p * (1 - p)
+    var_total = total.var()
+    cov_item_total = ((correct - p) * (total - total.mean())[:, None]).mean(axis=0)
+    # Rest score (total without the item) so an item does not correlate with itself
+    cov_rest = cov_item_total - var_item
+    var_rest = var_total + var_item - 2 * cov_item_total
+    with np.errstate(divide="ignore", invalid="ignore"):
+        point_biserial = np.where((var_item > 0) & (var_rest > 0), cov_rest / np.sqrt(var_item * var_rest), np.nan)
+    kr20 = k / (k - 1) * (1 - var_item.sum() / var_total) if k > 1 and var_total > 0 else None
+
+    # (questions, positions) selection counts via one bincount over offset codes
+    width = max(option_counts, default=0) + 1
+    offsets = np.arange(k) * width
+
+    def rates(rows: np.ndarray) -> np.ndarray:
+        counts = np.bincount((rows + offsets).ravel(), minlength=k * width).reshape(k, width)
+        return counts / max(len(rows), 1)
+
+    group = max(1, int(round(n * GROUP_FRACTION)))
+    order = np.argsort(total, kind="stable")
+    overall, lower, upper = rates(responses), rates(responses[order[:group]]), rates(responses[order[-group:]])
+
+    return {
+        "attempts": n,
+        "p_value": p,
+        "point_biserial": point_biserial,
+        "kr20": kr20,
+        "mean_score": float(total.mean()),
+        "std_score": float(total.std()),
+        "rates": overall,
+        "upper_rates": upper,
+        "lower_rates": lower,
+    }
+
+
+def _flags(p_value: float, point_biserial: Optional[float], options: List[dict]) -> List[str]:
+    flags = []
+    if p_value > TOO_EASY:
+        flags.append("too_easy")
+    if p_value < TOO_HARD:
+        flags.append("too_hard")
+    if point_biserial is not None and point_biserial < LOW_DISCRIMINATION:
+        flags.append("negative_discrimination" if point_biserial < 0 else "low_discrimination")
+    distractors = [o for o in options if not o["correct"]]
+    if any(o["upper_rate"] > o["lower_rate"] for o in distractors):
+        flags.append("distractor_attracts_top_scorers")
+    if any(o["rate"] < UNUSED_DISTRACTOR for o in distractors):
+        flags.append("unused_distractor")
+    return flags
+
+
+def item_documents(exam: dict, layout: AnswerLayout, stats: dict, now: datetime) -> List[dict]:
+    questions = exam.get("paper1_questions", [])
+    p_values, discrimination = _rounded(stats["p_value"]), _rounded(stats["point_biserial"])
+    docs = []
+    for j, (question, q_id, values) in enumerate(zip(questions, layout.question_ids, layout.options)):
+        key = question.get("correct_option_id") or question.get("correct_answer")
+        options = [
+            {
+                "option": value,
+                "correct": value == key,
+                "rate": round(float(stats["rates"][j, position]), 3),
+                "upper_rate": round(float(stats["upper_rates"][j, position]), 3),
+                "lower_rate": round(float(stats["lower_rates"][j, position]), 3),
+            }
+            for position, value in enumerate(values, 1)
+        ]
+        docs.append({
+            "_id": f"{exam['id']}:{q_id}",
+            "exam_id": exam["id"],
+            "exam_version": exam.get("version", 0),
+            "question_id": q_id,
+            "question_number": j + 1,
+            "skill_area": question.get("skill_area"),
+            "p_value": p_values[j],
+            "point_biserial": discrimination[j],
+            "omitted": round(float(stats["rates"][j, 0]), 3),
+            "options": options,
+            "flags": _flags(p_values[j], discrimination[j], options),
+            "computed_at": now
+        })
+    return docs
+
+
+async def load_responses(db, codec: AnswerCodec, layout: AnswerLayout, exam_id: str) -> np.ndarray:
+    """Response matrix of the exam's graded attempts, in option positions"""
+    rows = []
+    async for attempt in db.attempts.find(
+        {"exam_id": exam_id, "state": AttemptState.GRADED.value},
+        {"_id": 0, "answers": 1, "answers_packed": 1, "answers_layout": 1}
+    ).batch_size(5000):
+        if attempt.get("answers_layout") == layout.id:
+            rows.append(layout.codes(bytes(attempt["answers_packed"])))
+            continue
+        # Dict answers, or packed against a layout from before an exam edit
+        await codec.unpack([attempt])
+        rows.append(layout.answer_codes(attempt.get("answers") or {}))
+    if not rows:
+        return np.zeros((0, len(layout.question_ids)), dtype=np.uint8)
+    return np.stack(rows).astype(np.int64)
+
+
+async def run_item_analysis(db, exam_id: str, codec: Optional[AnswerCodec] = None,
+                            batch_size: int = 500, lease_ttl: int = 300) -> dict:
+    """Analyse the exam's graded attempts and replace its stored item statistics"""
+    exam = await db.exams.find_one({"id": exam_id}, {"_id": 0})
+    if not exam:
+        raise LookupError(exam_id)
+    lease = MongoLease(db, f"item-analysis:{exam_id}", ttl_seconds=lease_ttl)
+    if not await lease.acquire():
+        raise AnalysisInProgress(exam_id)
+    try:
+        began = time.perf_counter()
+        layout = AnswerLayout.from_exam(exam)
+        responses = await load_responses(db, codec or AnswerCodec(db), layout, exam_id)
+        if len(responses) < MIN_ATTEMPTS:
+            raise ValueError(f"Item analysis needs at least {MIN_ATTEMPTS} graded attempts")
+
+        questions = exam.get("paper1_questions", [])
+        keys = [q.get("correct_option_id") or q.get("correct_answer") for q in questions]
+        key = np.array([values.index(k) + 1 if k in values else -1 for k, values in zip(keys, layout.options)])
+        stats = analyze(responses, key, [len(values) for values in layout.options])
+
+        now = datetime.now(timezone.utc)
+        docs = item_documents(exam, layout, stats, now)
+        for i in range(0, len(docs), batch_size):
+            await db.item_analysis.bulk_write(
+                [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs[i:i + batch_size]], ordered=False
+            )
+        # Questions removed from the paper since the last run
+        await db.item_analysis.delete_many({"exam_id": exam_id, "question_id": {"$nin": layout.question_ids}})
+
+        run = {
+            "exam_id": exam_id,
+            "exam_version": exam.get("version", 0),
+            "attempts": stats["attempts"],
+            "questions": len(docs),
+            "kr20": round(stats["kr20"], 3) if stats["kr20"] is not None else None,
+            "mean_score": round(stats["mean_score"], 2),
+            "std_score": round(stats["std_score"], 2),
+            "flagged": sum(1 for doc in docs if doc["flags"]),
+            "computed_at": now,
+            "duration_ms": round((time.perf_counter() - began) * 1000)
+        }
+        await db.item_analysis_runs.replace_one({"_id": exam_id}, run, upsert=True)
+        return run
+    finally:
+        await lease.release()
+
+
+async def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Compute item statistics for an exam")
+    parser.add_argument("--exam", required=True, help="Exam id")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL'))
+    db = client[os.environ.get('DB_NAME_EXAM', 'exam_bureau_db')]
+
+    print(f"🔬 Item analysis for exam {args.exam}")
+    print("=" * 50)
+    run = await run_item_analysis(db, args.exam)
+    print(f"✅ {run['questions']} questions over {run['attempts']} attempts in {run['duration_ms']} ms")
+    print(f"   KR-20: {run['kr20']}, flagged questions: {run['flagged']}")
+
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
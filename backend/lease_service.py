@@ -0,0 +1,57 @@
+"""
+MongoDB leases for the exam platform
+Lets exactly one gunicorn worker (on any node) own a background duty -
+schema migrations, sweepers - at a time
+"""
+
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+class MongoLease:
+    """Expiring named lock stored in the ``leases`` collection.
+
+    ``acquire`` succeeds when the lease is free, expired or already ours, and
+    also serves as renewal. A holder that dies simply lets it expire.
+    """
+
+    def __init__(self, db, name: str, ttl_seconds: int = 60):
+        self.db = db
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    async def acquire(self) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            await self.db.leases.find_one_and_update(
+                {
+                    "_id": self.name,
+                    "$or": [{"expires_at": {"$lt": now}}, {"owner": self.owner}]
+                },
+                {"$set": {
+                    "owner": self.owner,
+                    "expires_at": now + timedelta(seconds=self.ttl_seconds),
+                    "renewed_at": now
+                }},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # Lease document exists and is held by someone else
+            return False
+
+    renew = acquire
+
+    async def release(self):
+        await self.db.leases.update_one(
+            {"_id": self.name, "owner": self.owner},
+            {"$set": {"expires_at": datetime.now(timezone.utc)}}
+        )
@@ -0,0 +1,366 @@
+"""
+Versioned schema migrations and seed data for the exam platform
+Runs once per deployment instead of once per gunicorn worker: the first
+worker to take the migration lease applies pending steps (renewing the
+lease while they run), the others wait until the recorded schema version
+matches and then start serving - or fail startup after ``wait_timeout``
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, List, NamedTuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from etag_service import as_utc
+from grading_service import AttemptState
+from invalidation_service import ensure_bus_collection
+from lease_service import MongoLease
+from student_progress_service import rebuild_all as rebuild_student_progress
+
+logger = logging.getLogger(__name__)
+
+
+class MigrationTimeout(RuntimeError):
+    """Another process held the migration lease for longer than ``wait_timeout``"""
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[..., Awaitable[None]]  # async (db, ctx) -> None, must be idempotent
+
+
+async def get_schema_version(db) -> int:
+    """Highest applied migration version (0 for a fresh database)"""
+    latest = await db.schema_migrations.find_one({}, sort=[("_id", -1)])
+    return latest["_id"] if latest else 0
+
+
+async def run_migrations(db, migrations: List[Migration], lease_ttl: int = 120,
+                         wait_timeout: int = 300, poll_interval: float = 0.5, **ctx) -> dict:
+    """Bring the database to the latest version; safe to call from every worker"""
+    target = migrations[-1].version if migrations else 0
+    current = await get_schema_version(db)
+    if current >= target:
+        return {"status": "up_to_date", "version": current}
+
+    lease = MongoLease(db, "schema_migrations", ttl_seconds=lease_ttl)
+    waited_since = time.monotonic()
+
+    while True:
+        if await lease.acquire():
+            try:
+                return await _apply_pending(db, migrations, lease, ctx)
+            finally:
+                await lease.release()
+
+        # Another process holds the lease - wait for it to finish
+        await asyncio.sleep(poll_interval)
+        current = await get_schema_version(db)
+        if current >= target:
+            return {"status": "up_to_date", "version": current}
+        if time.monotonic() - waited_since > wait_timeout:
+            raise MigrationTimeout(f"Gave up waiting for migrations (at v{current}, want v{target})")
+
+
+async def _keep_lease(lease: MongoLease):
+    """Renew the lease while a step runs, so a long step is not taken over mid-way"""
+    while True:
+        await asyncio.sleep(lease.ttl_seconds / 3)
+        try:
+            if not await lease.renew():
+                logger.error("Migration lease was taken by another process")
+        except Exception as e:
+            logger.warning(f"Renewing the migration lease failed: {e}")
+
+
+async def _apply_pending(db, migrations: List[Migration], lease: MongoLease, ctx: dict) -> dict:
+    keeper = asyncio.ensure_future(_keep_lease(lease))
+    try:
+        return await _apply_steps(db, migrations, lease, ctx)
+    finally:
+        keeper.cancel()
+
+
+async def _apply_steps(db, migrations: List[Migration], lease: MongoLease, ctx: dict) -> dict:
+    current = await get_schema_version(db)
+    applied = []
+    for migration in migrations:
+        if migration.version <= current:
+            continue
+        await lease.renew()
+        started = time.perf_counter()
+        await migration.apply(db, ctx)
+        duration = time.perf_counter() - started
+        await db.schema_migrations.insert_one({
+            "_id": migration.version,
+            "name": migration.name,
+            "applied_at": datetime.now(timezone.utc),
+            "duration_seconds": round(duration, 3),
+            "applied_by": lease.owner
+        })
+        applied.append(migration.version)
+        logger.info(f"✓ Migration v{migration.version} {migration.name} ({duration:.2f}s)")
+    return {"status": "migrated", "version": migrations[-1].version, "applied": applied}
+
+
+# ============================================================================
+# MIGRATION STEPS
+# ============================================================================
+
+async def create_core_indexes(db, ctx):
+    await db.users.create_index("email", unique=True)
+    await db.exams.create_index([("grade", 1), ("month", 1)])
+    await db.attempts.create_index([("student_id", 1), ("exam_id", 1)])
+    await db.paper2_submissions.create_index([("student_id", 1), ("exam_id", 1)])
+    await db.refresh_tokens.create_index("expires_at", expireAfterSeconds=0)
+    await db.refresh_tokens.create_index("user_id")
+    await db.refresh_tokens.create_index("family_id")
+
+
+async def create_id_indexes(db, ctx):
+    """Every hot lookup is by our string ``id``, not ``_id``"""
+    await db.users.create_index("id")
+    await db.exams.create_index("id")
+    await db.attempts.create_index("id")
+    await db.paper2_submissions.create_index("id")
+
+
+SAMPLE_USERS = [
+    # Grade 5 users
+    {"id": "student_g5_001", "email": "student@test.com", "full_name": "Grade 5 Student", "password": "student123", "role": "student", "grade": "grade_5"},
+    # Grade 4 users
+    {"id": "student_g4_001", "email": "student4@test.com", "full_name": "Grade 4 Student", "password": "student123", "role": "student", "grade": "grade_4"},
+    # Grade 3 users
+    {"id": "student_g3_001", "email": "student3@test.com", "full_name": "Grade 3 Student", "password": "student123", "role": "student", "grade": "grade_3"},
+    # Grade 2 users
+    {"id": "student_g2_001", "email": "student2@test.com", "full_name": "Grade 2 Student", "password": "student123", "role": "student", "grade": "grade_2"},
+    # Staff users
+    {"id": "teacher_001", "email": "teacher@test.com", "full_name": "Sample Teacher", "password": "teacher123", "role": "teacher", "grade": "grade_5"},
+    {"id": "parent_001", "email": "parent@test.com", "full_name": "Sample Parent", "password": "parent123", "role": "parent", "grade": "grade_5", "linked_student_id": "student_g5_001"},
+    {"id": "admin_001", "email": "admin@test.com", "full_name": "Sample Admin", "password": "admin123", "role": "admin", "grade": "grade_5"}
+]
+
+
+async def seed_sample_users(db, ctx):
+    emails = [user["email"] for user in SAMPLE_USERS]
+    existing = {doc["email"] async for doc in db.users.find({"email": {"$in": emails}}, {"email": 1})}
+    missing = [user for user in SAMPLE_USERS if user["email"] not in existing]
+    if not missing:
+        return
+
+    # Hash in parallel through the bounded bcrypt pool
+    hasher = ctx["password_hasher"]
+    hashes = await asyncio.gather(*(hasher.hash(user["password"]) for user in missing))
+
+    now = datetime.now(timezone.utc)
+    docs = []
+    for user, hashed_password in zip(missing, hashes):
+        doc = {k: v for k, v in user.items() if k != "password"}
+        doc.update({"hashed_password": hashed_password, "created_at": now, "is_active": True})
+        docs.append(doc)
+
+    try:
+        await db.users.insert_many(docs, ordered=False)
+    except BulkWriteError:
+        pass  # Created concurrently by a pre-migration deployment
+    for doc in docs:
+        logger.info(f"✓ Created sample user: {doc['email']}")
+
+
+SAMPLE_EXAM_GRADES = [
+    {"grade": "grade_2", "title_prefix": "Grade 2 Model Exam", "questions": 40, "duration": 45},
+    {"grade": "grade_3", "title_prefix": "Grade 3 Model Exam", "questions": 50, "duration": 50},
+    {"grade": "grade_4", "title_prefix": "Grade 4 Model Exam", "questions": 55, "duration": 55},
+    {"grade": "grade_5", "title_prefix": "Grade 5 Scholarship Practice Exam", "questions": 60, "duration": 60}
+]
+
+SAMPLE_SKILL_AREAS = ["mathematical_reasoning", "language_proficiency", "general_knowledge", "comprehension_skills", "problem_solving"]
+
+
+def _sample_exam(config: dict, month: str, title_month: str, question_text, question_text_si, question_text_ta, answer_offset: int) -> dict:
+    grade_label = config["grade"].replace("_", " ")
+    return {
+        "id": str(uuid.uuid4()),
+        "title": f"{title_month} 2025 - {config['title_prefix']}",
+        "grade": config["grade"],
+        "month": month,
+        "paper_number": 1,
+        "duration_minutes": config["duration"],
+        "total_questions": config["questions"],
+        "status": "published",
+        "paper1_questions": [
+            {
+                "question_number": i + 1,
+                "question_text": question_text(i, grade_label),
+                "question_text_si": question_text_si(i, grade_label),
+                "question_text_ta": question_text_ta(i, grade_label),
+                "options": ["Option A", "Option B", "Option C", "Option D"],
+                "options_si": ["විකල්පය A", "විකල්පය B", "විකල්පය C", "විකල්පය D"],
+                "options_ta": ["விருப்பம் A", "விருப்பம் B", "விருப்பம் C", "விருப்பம் D"],
+                "correct_answer": ["A", "B", "C", "D"][(i + answer_offset) % 4],
+                "skill_area": SAMPLE_SKILL_AREAS[i % 5]
+            }
+            for i in range(config["questions"])
+        ],
+        "is_active": True,
+        "created_by": "admin_001",
+        "created_at": datetime.now(timezone.utc)
+    }
+
+
+async def seed_sample_exams(db, ctx):
+    seeded_grades = set(await db.exams.distinct("grade", {"grade": {"$in": [c["grade"] for c in SAMPLE_EXAM_GRADES]}}))
+    for config in SAMPLE_EXAM_GRADES:
+        if config["grade"] in seeded_grades:
+            continue
+        february = _sample_exam(
+            config, "2025-02", "February",
+            lambda i, g: f"Sample question {i+1} for {g}",
+            lambda i, g: f"ප්‍රශ්නය {i+1} - {g}",
+            lambda i, g: f"கேள்வி {i+1} - {g}",
+            answer_offset=0
+        )
+        january = _sample_exam(
+            config, "2025-01", "January",
+            lambda i, g: f"January Q{i+1} for {g}",
+            lambda i, g: f"ජනවාරි ප්‍රශ්නය {i+1}",
+            lambda i, g: f"ஜனவரி கேள்வி {i+1}",
+            answer_offset=1
+        )
+        await db.exams.insert_many([february, january])
+        logger.info(f"✓ Created sample exams for {config['grade']}")
+
+
+async def create_exam_payload_indexes(db, ctx):
+    await db.exam_payloads.create_index([("exam_id", 1), ("version", -1)])
+
+
+async def create_invalidation_bus(db, ctx):
+    await ensure_bus_collection(db)
+
+
+async def add_attempt_deadlines(db, ctx):
+    """Index for the expired-attempt sweeper; open attempts get a deadline"""
+    await db.attempts.create_index([("is_completed", 1), ("deadline", 1)])
+
+    durations = {}
+    ops = []
+    async for attempt in db.attempts.find(
+        {"is_completed": False, "deadline": {"$exists": False}},
+        {"_id": 1, "exam_id": 1, "started_at": 1}
+    ):
+        exam_id = attempt["exam_id"]
+        if exam_id not in durations:
+            exam = await db.exams.find_one({"id": exam_id}, {"_id": 0, "duration_minutes": 1})
+            durations[exam_id] = (exam or {}).get("duration_minutes", 60)
+        started_at = as_utc(attempt.get("started_at")) or datetime.now(timezone.utc)
+        deadline = started_at + timedelta(minutes=durations[exam_id])
+        ops.append(UpdateOne({"_id": attempt["_id"]}, {"$set": {"deadline": deadline}}))
+        if len(ops) >= 1000:
+            await db.attempts.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        await db.attempts.bulk_write(ops, ordered=False)
+
+
+async def create_regrade_indexes(db, ctx):
+    await db.regrade_jobs.create_index("id", unique=True)
+    await db.regrade_jobs.create_index("status")
+    # Regrade streams an exam's completed attempts in _id order
+    await db.attempts.create_index([("exam_id", 1), ("is_completed", 1), ("_id", 1)])
+
+
+async def create_grading_queue_indexes(db, ctx):
+    await db.grading_jobs.create_index([("status", 1), ("claim_expires_at", 1)])
+    await db.grading_jobs.create_index("claim", sparse=True)
+    await db.grading_jobs.create_index("completed_at", expireAfterSeconds=86400)
+    await db.attempts.create_index([("grading_status", 1), ("submitted_at", 1)], sparse=True)
+
+
+async def add_attempt_states(db, ctx):
+    """Explicit attempt state replaces is_completed + grading_status checks"""
+    legacy = {"state": {"$exists": False}}
+    await db.attempts.update_many(
+        {**legacy, "is_completed": {"$ne": True}},
+        {"$set": {"state": AttemptState.IN_PROGRESS.value}}
+    )
+    await db.attempts.update_many(
+        {**legacy, "grading_status": "pending"},
+        {"$set": {"state": AttemptState.SUBMITTING.value}, "$unset": {"grading_status": ""}}
+    )
+    await db.attempts.update_many(
+        {**legacy, "$or": [{"grading_status": "failed"}, {"grading_error": {"$exists": True}}]},
+        {"$set": {"state": AttemptState.FAILED.value}, "$unset": {"grading_status": ""}}
+    )
+    await db.attempts.update_many(
+        legacy,
+        {"$set": {"state": AttemptState.GRADED.value}, "$unset": {"grading_status": ""}}
+    )
+
+    # Sweeper (open attempts by deadline) and orphaned-submission scan
+    await db.attempts.create_index([("state", 1), ("deadline", 1)])
+    await db.attempts.create_index([("state", 1), ("submitted_at", 1)])
+    for name in ("is_completed_1_deadline_1", "grading_status_1_submitted_at_1"):
+        try:
+            await db.attempts.drop_index(name)
+        except OperationFailure:
+            pass  # Never created
+
+
+async def build_student_progress(db, ctx):
+    """Progress summaries for everything graded before the read model existed"""
+    await db.attempts.create_index([("state", 1), ("student_id", 1), ("submitted_at", 1)])
+    report = await rebuild_student_progress(db)
+    logger.info(f"✓ Built progress summaries for {report['students']} students")
+
+
+async def create_ranking_indexes(db, ctx):
+    """Ranking reads (by exam, by student) and the Paper 2 scan of a ranking run"""
+    await db.exam_rankings.create_index([("exam_id", 1), ("rank", 1)])
+    await db.exam_rankings.create_index([("exam_id", 1), ("district", 1), ("district_rank", 1)])
+    await db.exam_rankings.create_index([("student_id", 1), ("exam_id", 1)])
+    await db.paper2_submissions.create_index([("exam_id", 1), ("marked_at", 1)])
+
+
+async def create_item_analysis_indexes(db, ctx):
+    await db.item_analysis.create_index([("exam_id", 1), ("question_number", 1)])
+
+
+async def create_exam_state_indexes(db, ctx):
+    """Per-exam scans of graded attempts: regrade (in _id order), cohort
+    stats, rankings and item analysis all filter on {exam_id, state}"""
+    await db.attempts.create_index([("exam_id", 1), ("state", 1), ("_id", 1)])
+    try:
+        await db.attempts.drop_index("exam_id_1_is_completed_1__id_1")
+    except OperationFailure:
+        pass  # Never created
+
+
+async def create_roster_import_indexes(db, ctx):
+    await db.roster_import_jobs.create_index("id", unique=True)
+    await db.roster_import_jobs.create_index("status")
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "core_indexes", create_core_indexes),
+    Migration(2, "id_lookup_indexes", create_id_indexes),
+    Migration(3, "seed_sample_users", seed_sample_users),
+    Migration(4, "seed_sample_exams", seed_sample_exams),
+    Migration(5, "exam_payload_indexes", create_exam_payload_indexes),
+    Migration(6, "cache_invalidation_bus", create_invalidation_bus),
+    Migration(7, "attempt_deadlines", add_attempt_deadlines),
+    Migration(8, "regrade_indexes", create_regrade_indexes),
+    Migration(9, "grading_queue", create_grading_queue_indexes),
+    Migration(10, "attempt_states", add_attempt_states),
+    Migration(11, "student_progress", build_student_progress),
+    Migration(12, "exam_rankings", create_ranking_indexes),
+    Migration(13, "item_analysis", create_item_analysis_indexes),
+    Migration(14, "attempt_exam_state_index", create_exam_state_indexes),
+    Migration(15, "roster_import_jobs", create_roster_import_indexes),
+]
@@ -0,0 +1,114 @@
+"""
+Password hashing pool for the exam platform
+Runs bcrypt off the event loop with a concurrency cap and a bounded queue,
+so a login storm at exam start cannot stall every other request in a worker
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordPoolSaturated(Exception):
+    """Raised when the hashing queue is full - callers should answer 503"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Password hashing pool saturated")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """Bounded bcrypt executor with admission control and timing metrics.
+
+    At most ``max_workers`` hashes run at once (bcrypt releases the GIL, so
+    threads give real parallelism); up to ``max_queue`` more may wait. Any
+    call beyond that is rejected immediately with ``PasswordPoolSaturated``.
+
+    A slot is freed when the hash itself finishes, not when its caller stops
+    waiting - a cancelled login must not let a new hash in beside the one
+    still running. Counters are shared with the pool threads under ``_lock``.
+    """
+
+    def __init__(self, pwd_context, max_workers: int = 4, max_queue: int = 64, retry_after: int = 2):
+        self.pwd_context = pwd_context
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._pending = 0
+
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.hash_time_total = 0.0
+        self.hash_time_max = 0.0
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.pwd_context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(self.pwd_context.verify, plain_password, hashed_password)
+
+    async def _run(self, func: Callable, *args) -> Any:
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise PasswordPoolSaturated(self.retry_after)
+            self._pending += 1
+        submitted = time.perf_counter()
+
+        def timed_call():
+            started = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                self._record(started - submitted, time.perf_counter() - started)
+
+        try:
+            future = self._executor.submit(timed_call)
+        except Exception:
+            self._release(None)
+            raise
+        # Runs once the job finished, or was cancelled before it started
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, future: Optional[Future]):
+        with self._lock:
+            self._pending -= 1
+
+    def _record(self, queue_wait: float, hash_time: float):
+        with self._lock:
+            self.completed += 1
+            self.queue_wait_total += queue_wait
+            self.queue_wait_max = max(self.queue_wait_max, queue_wait)
+            self.hash_time_total += hash_time
+            self.hash_time_max = max(self.hash_time_max, hash_time)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return self._stats()
+
+    def _stats(self) -> Dict[str, Any]:
+        done = self.completed
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "pending": self._pending,
+            "completed": done,
+            "rejected": self.rejected,
+            "queue_wait_avg_ms": round(self.queue_wait_total / done * 1000, 2) if done else 0.0,
+            "queue_wait_max_ms": round(self.queue_wait_max * 1000, 2),
+            "hash_time_avg_ms": round(self.hash_time_total / done * 1000, 2) if done else 0.0,
+            "hash_time_max_ms": round(self.hash_time_max * 1000, 2),
+        }
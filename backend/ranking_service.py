@@ -0,0 +1,272 @@
+"""
+Scholarship rankings for the exam platform
+Combines each candidate's Paper 1 score (latest graded attempt) and Paper 2
+total (latest marking) for an exam, ranks the whole pool island-wide and
+within each district (``users.district``) with NumPy lexsorts, applies
+district cut-offs and stores the result - one ``exam_rankings`` row per
+candidate, a ``ranking_runs`` summary per exam and the candidate's rank in
+their ``student_progress`` summary - so ranks are read, never recomputed
+
+Tie-breaks: total, then Paper 2, then Paper 1 (all descending); candidates
+equal on all three share a rank (1, 2, 2, 4)
+Cut-offs: a district's fixed mark if given, else the total of the candidate
+at position ``quota`` in the district (ties at the cut-off qualify), else none
+
+Usage: python ranking_service.py --exam EXAM_ID [--quota 50] [--cutoff Colombo=150 ...]
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReplaceOne, UpdateOne
+
+from etag_service import as_utc
+from grading_service import AttemptState
+from lease_service import MongoLease
+
+# What a candidate's progress report shows per ranked exam
+RANK_FIELDS = {"_id": 0, "rank": 1, "candidates": 1, "district": 1, "district_rank": 1,
+               "district_candidates": 1, "qualified": 1}
+
+RUN_FIELDS = {"_id": 0, "run_id": 0}
+# Attempts without a usable submitted_at lose to any dated retake
+NEVER = datetime.min.replace(tzinfo=timezone.utc)
+
+# Candidates without a district are ranked island-wide only
+NO_DISTRICT = ""
+
+
+class RankingInProgress(Exception):
+    """Another worker is ranking this exam"""
+
+
+def _ranks(sorted_keys: np.ndarray, groups: Optional[np.ndarray] = None) -> np.ndarray:
+    """1-based competition ranks of rows sorted by ``(groups, keys)``.
+
+    ``sorted_keys`` is rows x keys; a rank restarts at each new group and
+    rows equal on every key share the rank of the first of them.
+    """
+    n = len(sorted_keys)
+    positions = np.arange(n)
+    new_tie = np.ones(n, dtype=bool)
+    new_group = np.zeros(n, dtype=bool)
+    new_group[0:1] = True
+    if n > 1:
+        new_tie[1:] = np.any(sorted_keys[1:] != sorted_keys[:-1], axis=1)
+        if groups is not None:
+            new_group[1:] = groups[1:] != groups[:-1]
+            new_tie |= new_group
+    tie_start = np.maximum.accumulate(np.where(new_tie, positions, 0))
+    group_start = np.maximum.accumulate(np.where(new_group, positions, 0))
+    return tie_start - group_start + 1
+
+
+def rank_candidates(paper1: np.ndarray, paper2: np.ndarray, districts: np.ndarray,
+                    quota: Optional[int] = None, cutoffs: Optional[Dict[str, int]] = None) -> dict:
+    """Ranks, district ranks and cut-offs for candidates given as parallel arrays"""
+    cutoffs = cutoffs or {}
+    total = paper1 + paper2
+    keys = np.stack([-total, -paper2, -paper1], axis=1)
+    names, codes = np.unique(districts, return_inverse=True)
+
+    # Island-wide: np.lexsort sorts by the last key first
+    order = np.lexsort((-paper1, -paper2, -total))
+    rank = np.empty(len(total), dtype=np.int64)
+    rank[order] = _ranks(keys[order])
+
+    # Within districts: the district code is the primary key
+    order = np.lexsort((-paper1, -paper2, -total, codes))
+    district_rank = np.empty(len(total), dtype=np.int64)
+    district_rank[order] = _ranks(keys[order], codes[order])
+    sizes = np.bincount(codes, minlength=len(names))
+
+    # Sorted by district then total: a district's candidate at ``quota`` is start + quota - 1
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    sorted_total = total[order]
+    district_cutoff = np.full(len(names), np.nan)
+    for i, name in enumerate(names.tolist()):
+        if name == NO_DISTRICT:
+            continue
+        if name in cutoffs:
+            district_cutoff[i] = cutoffs[name]
+        elif quota:
+            district_cutoff[i] = sorted_total[starts[i] + min(quota, sizes[i]) - 1]
+
+    cutoff = district_cutoff[codes]
+    return {
+        "total": total,
+        "rank": rank,
+        "district_rank": district_rank,
+        "district_candidates": sizes[codes],
+        "cutoff": cutoff,
+        "qualified": total >= np.nan_to_num(cutoff, nan=np.inf),
+        "districts": [
+            {"district": name, "candidates": int(size),
+             "cutoff": None if np.isnan(mark) else int(mark),
+             "qualified": int(((codes == i) & (total >= mark)).sum()) if not np.isnan(mark) else None}
+            for i, (name, size, mark) in enumerate(zip(names.tolist(), sizes.tolist(), district_cutoff.tolist()))
+            if name != NO_DISTRICT
+        ]
+    }
+
+
+async def load_candidates(db, exam_id: str, chunk_size: int = 10000) -> dict:
+    """Paper 1 and Paper 2 totals and district of everyone graded on the exam"""
+    paper1: Dict[str, tuple] = {}
+    async for attempt in db.attempts.find(
+        {"exam_id": exam_id, "state": AttemptState.GRADED.value},
+        {"_id": 0, "student_id": 1, "score_paper1": 1, "submitted_at": 1}
+    ).batch_size(5000):
+        at = as_utc(attempt.get("submitted_at")) or NEVER
+        previous = paper1.get(attempt["student_id"])
+        if previous is None or at >= previous[1]:
+            paper1[attempt["student_id"]] = (attempt.get("score_paper1", 0), at)
+
+    # The latest marking wins
+    paper2: Dict[str, int] = {}
+    async for sub in db.paper2_submissions.find(
+        {"exam_id": exam_id, "marked_at": {"$exists": True}},
+        {"_id": 0, "student_id": 1, "total_marks": 1}
+    ).sort("marked_at", 1).batch_size(5000):
+        paper2[sub["student_id"]] = sub.get("total_marks", 0)
+
+    student_ids = list(paper1)
+    districts: Dict[str, str] = {}
+    for i in range(0, len(student_ids), chunk_size):
+        async for user in db.users.find(
+            {"id": {"$in": student_ids[i:i + chunk_size]}, "district": {"$exists": True}},
+            {"_id": 0, "id": 1, "district": 1}
+        ):
+            districts[user["id"]] = user["district"] or NO_DISTRICT
+
+    return {
+        "student_ids": student_ids,
+        "paper1": np.array([paper1[sid][0] for sid in student_ids], dtype=np.int64),
+        "paper2": np.array([paper2.get(sid, 0) for sid in student_ids], dtype=np.int64),
+        "districts": np.array([districts.get(sid, NO_DISTRICT) for sid in student_ids], dtype=object).astype(str),
+    }
+
+
+async def compute_rankings(db, exam_id: str, quota: Optional[int] = None, cutoffs: Optional[Dict[str, int]] = None,
+                           batch_size: int = 1000, lease_ttl: int = 300) -> dict:
+    """Rank the exam's candidates and replace its stored rankings"""
+    exam = await db.exams.find_one({"id": exam_id}, {"_id": 0, "id": 1, "month": 1, "grade": 1})
+    if not exam:
+        raise LookupError(exam_id)
+    lease = MongoLease(db, f"ranking:{exam_id}", ttl_seconds=lease_ttl)
+    if not await lease.acquire():
+        raise RankingInProgress(exam_id)
+    try:
+        began = time.perf_counter()
+        candidates = await load_candidates(db, exam_id)
+        ranked = rank_candidates(candidates["paper1"], candidates["paper2"], candidates["districts"], quota, cutoffs)
+        run_id = str(uuid.uuid4())
+        now = datetime.now(timezone.utc)
+
+        count = len(candidates["student_ids"])
+        rows = []
+        for i, student_id in enumerate(candidates["student_ids"]):
+            district = candidates["districts"][i] or None
+            cutoff = ranked["cutoff"][i]
+            rows.append({
+                "_id": f"{exam_id}:{student_id}",
+                "exam_id": exam_id,
+                "student_id": student_id,
+                "run_id": run_id,
+                "paper1": int(candidates["paper1"][i]),
+                "paper2": int(candidates["paper2"][i]),
+                "total": int(ranked["total"][i]),
+                "rank": int(ranked["rank"][i]),
+                "candidates": count,
+                "district": district,
+                "district_rank": int(ranked["district_rank"][i]) if district else None,
+                "district_candidates": int(ranked["district_candidates"][i]) if district else None,
+                "qualified": bool(ranked["qualified"][i]) if not np.isnan(cutoff) else None,
+                "computed_at": now
+            })
+
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i + batch_size]
+            await db.exam_rankings.bulk_write([ReplaceOne({"_id": row["_id"]}, row, upsert=True) for row in batch], ordered=False)
+            await db.student_progress.bulk_write([
+                UpdateOne(
+                    {"_id": row["student_id"]},
+                    {"$set": {f"ranks.{exam_id}": {k: row[k] for k in RANK_FIELDS if k != "_id"}}},
+                    upsert=True
+                )
+                for row in batch
+            ], ordered=False)
+            await lease.renew()
+        # Candidates no longer in the pool (attempt removed) - their progress
+        # summary first, so an interrupted cleanup is found again next run
+        stale = {"exam_id": exam_id, "run_id": {"$ne": run_id}}
+        dropped = await db.exam_rankings.distinct("student_id", stale)
+        for i in range(0, len(dropped), batch_size):
+            await db.student_progress.update_many(
+                {"_id": {"$in": dropped[i:i + batch_size]}},
+                {"$unset": {f"ranks.{exam_id}": ""}}
+            )
+        await db.exam_rankings.delete_many(stale)
+
+        run = {
+            "exam_id": exam_id,
+            "run_id": run_id,
+            "month": exam.get("month"),
+            "grade": exam.get("grade"),
+            "candidates": count,
+            "quota": quota,
+            "cutoffs": cutoffs or {},
+            "districts": ranked["districts"],
+            "computed_at": now,
+            "duration_ms": round((time.perf_counter() - began) * 1000)
+        }
+        await db.ranking_runs.replace_one({"_id": exam_id}, run, upsert=True)
+        return {k: v for k, v in run.items() if k != "run_id"}
+    finally:
+        await lease.release()
+
+
+async def student_ranks(db, student_ids: List[str]) -> Dict[str, Dict[str, dict]]:
+    """student id -> exam id -> stored rank (for rebuilding progress summaries)"""
+    ranks: Dict[str, Dict[str, dict]] = {}
+    async for row in db.exam_rankings.find({"student_id": {"$in": student_ids}}, {**RANK_FIELDS, "student_id": 1, "exam_id": 1}):
+        ranks.setdefault(row.pop("student_id"), {})[row.pop("exam_id")] = row
+    return ranks
+
+
+async def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Rank an exam's candidates and store district cut-offs")
+    parser.add_argument("--exam", required=True, help="Exam id")
+    parser.add_argument("--quota", type=int, default=None, help="Qualifying places per district")
+    parser.add_argument("--cutoff", action="append", default=[], metavar="DISTRICT=MARKS",
+                        help="Fixed cut-off mark for a district (repeatable)")
+    args = parser.parse_args()
+    cutoffs = {}
+    for item in args.cutoff:
+        district, _, marks = item.rpartition("=")
+        cutoffs[district] = int(marks)
+
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL'))
+    db = client[os.environ.get('DB_NAME_EXAM', 'exam_bureau_db')]
+
+    print(f"🏆 Ranking candidates for exam {args.exam}")
+    print("=" * 50)
+    run = await compute_rankings(db, args.exam, args.quota, cutoffs)
+    print(f"✅ Ranked {run['candidates']} candidates in {run['duration_ms']} ms")
+    for district in run["districts"]:
+        if district["cutoff"] is not None:
+            print(f"   {district['district']}: cut-off {district['cutoff']}, "
+                  f"{district['qualified']} / {district['candidates']} qualified")
+
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,192 @@
+"""
+Bulk regrade jobs for the exam platform
+After an answer-key correction, every graded attempt of the exam is
+streamed in ``_id`` order, rescored against the exam's current grading plan
+in vectorized batches and written back with ``bulk_write``. Progress (and
+the cursor) is stored on the job after each batch, so an interrupted job
+resumes where it stopped; a dry run only reports how many scores change
+"""
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from grading_service import AttemptState
+from lease_service import MongoLease
+
+logger = logging.getLogger(__name__)
+
+# Changed attempts recorded on the job for review
+MAX_SAMPLE_CHANGES = 50
+
+# The cursor is an ObjectId - internal only
+JOB_FIELDS = {"_id": 0, "cursor": 0}
+
+
+class RegradeJobs:
+    """Creates, runs and resumes jobs stored in ``regrade_jobs``.
+
+    ``on_graded`` receives the attempts whose scores a (non-dry) run changed.
+    """
+
+    def __init__(self, db, plans, codec, batch_size: int = 1000, lease_ttl: int = 120,
+                 on_graded: Optional[Callable[[List[dict]], Awaitable[None]]] = None):
+        self.db = db
+        self.plans = plans
+        self.codec = codec
+        self.on_graded = on_graded
+        self.batch_size = batch_size
+        self.lease_ttl = lease_ttl
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def create(self, exam_id: str, dry_run: bool, created_by: str) -> dict:
+        plan = await self.plans.get(exam_id)
+        if plan is None:
+            raise LookupError(exam_id)
+        total = await self.db.attempts.count_documents({"exam_id": exam_id, "state": AttemptState.GRADED.value})
+        job = {
+            "id": str(uuid.uuid4()),
+            "exam_id": exam_id,
+            "exam_version": plan.version,
+            "dry_run": dry_run,
+            "status": "queued",
+            "total": total,
+            "processed": 0,
+            "changed": 0,
+            "increased": 0,
+            "decreased": 0,
+            "sample_changes": [],
+            "cursor": None,  # _id of the last attempt processed
+            "created_by": created_by,
+            "created_at": datetime.now(timezone.utc),
+            "updated_at": datetime.now(timezone.utc)
+        }
+        await self.db.regrade_jobs.insert_one(job)
+        job.pop("_id", None)
+        job.pop("cursor")
+        self.start(job["id"])
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self.db.regrade_jobs.find_one({"id": job_id}, JOB_FIELDS)
+
+    def start(self, job_id: str):
+        """Run (or resume) a job in the background of this worker"""
+        task = self._tasks.get(job_id)
+        if task is None or task.done():
+            self._tasks[job_id] = asyncio.ensure_future(self.run(job_id))
+
+    async def resume_pending(self):
+        """Pick up jobs interrupted by a restart (the lease keeps them single-run)"""
+        async for job in self.db.regrade_jobs.find({"status": {"$in": ["queued", "running"]}}, {"_id": 0, "id": 1}):
+            self.start(job["id"])
+
+    async def stop(self):
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+
+    async def run(self, job_id: str):
+        lease = MongoLease(self.db, f"regrade:{job_id}", ttl_seconds=self.lease_ttl)
+        if not await lease.acquire():
+            return  # Running on another worker
+        try:
+            await self._run(job_id, lease)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Regrade job {job_id} failed: {e}")
+            await self.db.regrade_jobs.update_one(
+                {"id": job_id},
+                {"$set": {"status": "failed", "error": str(e), "updated_at": datetime.now(timezone.utc)}}
+            )
+        finally:
+            await lease.release()
+
+    async def _run(self, job_id: str, lease: MongoLease):
+        job = await self.db.regrade_jobs.find_one({"id": job_id}, {"_id": 0})
+        if job is None or job["status"] not in ("queued", "running"):
+            return
+        plan = await self.plans.get(job["exam_id"])
+        if plan is None:
+            raise LookupError(f"Exam {job['exam_id']} not found")
+
+        await self.db.regrade_jobs.update_one(
+            {"id": job_id},
+            {"$set": {
+                "status": "running",
+                "exam_version": plan.version,  # The key may have been corrected again before a resume
+                "started_at": job.get("started_at") or datetime.now(timezone.utc)
+            }}
+        )
+        cursor = job.get("cursor")
+        samples = len(job.get("sample_changes", []))
+
+        while True:
+            query = {"exam_id": job["exam_id"], "state": AttemptState.GRADED.value}
+            if cursor is not None:
+                query["_id"] = {"$gt": cursor}
+            attempts = await self.db.attempts.find(
+                query,
+                {"_id": 1, "id": 1, "student_id": 1, "exam_id": 1, "submitted_at": 1,
+                 "answers": 1, "answers_packed": 1, "answers_layout": 1, "score_paper1": 1, "skill_scores": 1}
+            ).sort("_id", 1).limit(self.batch_size).to_list(self.batch_size)
+            if not attempts:
+                break
+            await self.codec.unpack(attempts)
+
+            results = plan.grade_many([attempt.get("answers") or {} for attempt in attempts])
+            ops, regraded = [], []
+            changed = increased = decreased = 0
+            new_samples = []
+            for attempt, result in zip(attempts, results):
+                old_score = attempt.get("score_paper1", 0)
+                if result["score"] == old_score and result["skill_scores"] == attempt.get("skill_scores"):
+                    continue
+                changed += 1
+                increased += result["score"] > old_score
+                decreased += result["score"] < old_score
+                if samples + len(new_samples) < MAX_SAMPLE_CHANGES:
+                    new_samples.append({
+                        "attempt_id": attempt["id"],
+                        "student_id": attempt["student_id"],
+                        "old_score": old_score,
+                        "new_score": result["score"]
+                    })
+                update = {
+                    "score_paper1": result["score"],
+                    "skill_scores": result["skill_scores"],
+                    "skill_percentages": result["skill_percentages"],
+                    "regraded_at": datetime.now(timezone.utc),
+                    "regrade_job_id": job_id
+                }
+                ops.append(UpdateOne({"_id": attempt["_id"]}, {"$set": update}))
+                regraded.append({**attempt, **update})
+
+            if ops and not job["dry_run"]:
+                await self.db.attempts.bulk_write(ops, ordered=False)
+                if self.on_graded is not None:
+                    await self.on_graded(regraded)
+
+            # Checkpoint: a restart continues after this batch
+            cursor = attempts[-1]["_id"]
+            samples += len(new_samples)
+            await self.db.regrade_jobs.update_one(
+                {"id": job_id},
+                {
+                    "$set": {"cursor": cursor, "updated_at": datetime.now(timezone.utc)},
+                    "$inc": {"processed": len(attempts), "changed": changed, "increased": increased, "decreased": decreased},
+                    "$push": {"sample_changes": {"$each": new_samples}}
+                }
+            )
+            await lease.renew()
+
+        await self.db.regrade_jobs.update_one(
+            {"id": job_id},
+            {"$set": {"status": "completed", "completed_at": datetime.now(timezone.utc), "updated_at": datetime.now(timezone.utc)}}
+        )
+        logger.info(f"✓ Regrade job {job_id} completed{' (dry run)' if job['dry_run'] else ''}")
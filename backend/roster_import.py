@@ -0,0 +1,348 @@
+"""
+Bulk Student Roster Import - CSV/XLSX
+Streams a roster file, hashes passwords through a PasswordHasher and writes
+students in batches with insert_many(ordered=False)
+
+From the API an import is a background job in ``roster_import_jobs``: the
+upload is stored on the job, one worker runs it under a lease and records
+its report (and the last imported row) after each batch, so an interrupted
+import resumes where it stopped
+
+Usage: python roster_import.py roster.csv [--workers 8] [--batch-size 1000]
+Columns: email, full_name, password, grade (+ optional parent_email,
+parent_phone, parent_name, preferred_language, district, school)
+"""
+import argparse
+import asyncio
+import csv
+import io
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from bson import Binary
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from passlib.context import CryptContext
+from pymongo.errors import BulkWriteError
+
+from lease_service import MongoLease
+from password_service import PasswordHasher, PasswordPoolSaturated
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ("email", "full_name", "password", "grade")
+OPTIONAL_COLUMNS = ("parent_email", "parent_phone", "parent_name", "preferred_language", "district", "school")
+VALID_GRADES = {"grade_2", "grade_3", "grade_4", "grade_5"}
+DUPLICATE_KEY_ERROR = 11000
+
+# Row errors kept on a job document (``failed`` still counts all of them)
+MAX_JOB_ERRORS = 1000
+
+# The uploaded file is internal only
+JOB_FIELDS = {"_id": 0, "file": 0}
+
+
+def normalize_grade(value) -> str:
+    """Accept 'grade_5', 'Grade 5' or plain '5'"""
+    text = str(value or "").strip().lower().replace(" ", "_")
+    if text.isdigit():
+        text = f"grade_{text}"
+    return text
+
+
+def iter_roster_rows(fileobj, filename: str) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """Yield (row_number, row) from a CSV or XLSX roster without loading it whole"""
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        from openpyxl import load_workbook
+        workbook = load_workbook(fileobj, read_only=True, data_only=True)
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell or "").strip().lower() for cell in next(rows, [])]
+        for row_number, values in enumerate(rows, start=2):
+            if not any(values):
+                continue
+            yield row_number, {
+                column: "" if value is None else str(value).strip()
+                for column, value in zip(header, values)
+            }
+        workbook.close()
+    else:
+        if not isinstance(fileobj, io.TextIOBase):
+            fileobj = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+        reader = csv.DictReader(fileobj)
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+        for row_number, row in enumerate(reader, start=2):
+            yield row_number, {k: (v or "").strip() for k, v in row.items() if k}
+
+
+def next_rows(rows: Iterator[Tuple[int, Dict[str, str]]], count: int) -> List[Tuple[int, Dict[str, str]]]:
+    """Parse the next ``count`` rows (blocking - run it in an executor)"""
+    return list(islice(rows, count))
+
+
+def new_report() -> dict:
+    return {"total_rows": 0, "created": 0, "failed": 0, "errors": []}
+
+
+def _validate(row: Dict[str, str]) -> str:
+    """Return an error message, or '' when the row is importable"""
+    missing = [column for column in REQUIRED_COLUMNS if not row.get(column)]
+    if missing:
+        return f"Missing {', '.join(missing)}"
+    if "@" not in row["email"]:
+        return "Invalid email"
+    if normalize_grade(row["grade"]) not in VALID_GRADES:
+        return f"Invalid grade '{row['grade']}'"
+    return ""
+
+
+class RosterImporter:
+    """Imports student rows in batches; collects a per-row error report.
+
+    Hashing goes through the shared ``hasher`` with at most its
+    ``max_workers`` passwords in flight, backing off while it is saturated,
+    so an import leaves the pool's queue to logins.
+    """
+
+    def __init__(self, db, hasher: PasswordHasher):
+        self.db = db
+        self.hasher = hasher
+        self.seen_emails = set()
+        self.report = new_report()
+
+    def _error(self, row_number: int, email: str, message: str):
+        self.report["failed"] += 1
+        self.report["errors"].append({"row": row_number, "email": email, "error": message})
+
+    async def import_rows(self, rows: List[Tuple[int, Dict[str, str]]]) -> dict:
+        """Import one batch of rows; returns the report of this batch"""
+        self.report = new_report()
+        batch = []
+        for row_number, row in rows:
+            self.report["total_rows"] += 1
+            row["email"] = row.get("email", "").lower()
+            error = _validate(row)
+            if error:
+                self._error(row_number, row.get("email", ""), error)
+                continue
+            if row["email"] in self.seen_emails:
+                self._error(row_number, row["email"], "Duplicate email in roster")
+                continue
+            self.seen_emails.add(row["email"])
+            batch.append((row_number, row))
+        if batch:
+            await self._import_batch(batch)
+        return self.report
+
+    async def _hash(self, password: str, slots: asyncio.Semaphore) -> str:
+        async with slots:
+            while True:
+                try:
+                    return await self.hasher.hash(password)
+                except PasswordPoolSaturated as e:
+                    await asyncio.sleep(e.retry_after)
+
+    async def _hash_all(self, passwords: List[str]) -> List[str]:
+        slots = asyncio.Semaphore(self.hasher.max_workers)
+        return list(await asyncio.gather(*(self._hash(password, slots) for password in passwords)))
+
+    async def _import_batch(self, batch: List[Tuple[int, Dict[str, str]]]):
+        emails = [row["email"] for _, row in batch]
+        existing = {doc["email"] async for doc in self.db.users.find({"email": {"$in": emails}}, {"email": 1})}
+
+        fresh = []
+        for row_number, row in batch:
+            if row["email"] in existing:
+                self._error(row_number, row["email"], "Email already registered")
+            else:
+                fresh.append((row_number, row))
+        if not fresh:
+            return
+
+        hashes = await self._hash_all([row["password"] for _, row in fresh])
+        now = datetime.now(timezone.utc)
+        docs = []
+        for (row_number, row), hashed_password in zip(fresh, hashes):
+            doc = {
+                "id": str(uuid.uuid4()),
+                "email": row["email"],
+                "full_name": row["full_name"],
+                "role": "student",
+                "grade": normalize_grade(row["grade"]),
+                "hashed_password": hashed_password,
+                "created_at": now,
+                "is_active": True
+            }
+            doc.update({column: row[column] for column in OPTIONAL_COLUMNS if row.get(column)})
+            docs.append(doc)
+
+        try:
+            result = await self.db.users.insert_many(docs, ordered=False)
+            self.report["created"] += len(result.inserted_ids)
+        except BulkWriteError as e:
+            # Rows lost a race against the unique email index (or failed otherwise)
+            write_errors = e.details.get("writeErrors", [])
+            self.report["created"] += len(docs) - len(write_errors)
+            for write_error in write_errors:
+                row_number, row = fresh[write_error["index"]]
+                message = ("Email already registered" if write_error.get("code") == DUPLICATE_KEY_ERROR
+                           else write_error.get("errmsg", "Insert failed"))
+                self._error(row_number, row["email"], message)
+
+
+async def import_roster(db, fileobj, filename: str, hasher: PasswordHasher, batch_size: int = 1000) -> dict:
+    """Import a roster file into db.users and return the row report"""
+    loop = asyncio.get_running_loop()
+    importer = RosterImporter(db, hasher)
+    rows = iter_roster_rows(fileobj, filename)
+    report = new_report()
+    while True:
+        batch = await loop.run_in_executor(None, next_rows, rows, batch_size)
+        if not batch:
+            break
+        chunk = await importer.import_rows(batch)
+        for key in ("total_rows", "created", "failed"):
+            report[key] += chunk[key]
+        report["errors"].extend(chunk["errors"])
+    report["errors"].sort(key=lambda error: error["row"])
+    return report
+
+
+class RosterImportJobs:
+    """Creates, runs and resumes jobs stored in ``roster_import_jobs``"""
+
+    def __init__(self, db, hasher: PasswordHasher, batch_size: int = 1000, lease_ttl: int = 120):
+        self.db = db
+        self.hasher = hasher
+        self.batch_size = batch_size
+        self.lease_ttl = lease_ttl
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def create(self, content: bytes, filename: str, created_by: str) -> dict:
+        job = {
+            "id": str(uuid.uuid4()),
+            "filename": filename,
+            "file": Binary(content),
+            "status": "queued",
+            **new_report(),
+            "cursor": 0,  # Last row number imported
+            "created_by": created_by,
+            "created_at": datetime.now(timezone.utc),
+            "updated_at": datetime.now(timezone.utc)
+        }
+        await self.db.roster_import_jobs.insert_one(job)
+        self.start(job["id"])
+        return {k: v for k, v in job.items() if k not in ("_id", "file")}
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self.db.roster_import_jobs.find_one({"id": job_id}, JOB_FIELDS)
+
+    def start(self, job_id: str):
+        """Run (or resume) a job in the background of this worker"""
+        task = self._tasks.get(job_id)
+        if task is None or task.done():
+            self._tasks[job_id] = asyncio.ensure_future(self.run(job_id))
+
+    async def resume_pending(self):
+        """Pick up jobs interrupted by a restart (the lease keeps them single-run)"""
+        async for job in self.db.roster_import_jobs.find({"status": {"$in": ["queued", "running"]}}, {"_id": 0, "id": 1}):
+            self.start(job["id"])
+
+    async def stop(self):
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+
+    async def run(self, job_id: str):
+        lease = MongoLease(self.db, f"roster_import:{job_id}", ttl_seconds=self.lease_ttl)
+        if not await lease.acquire():
+            return  # Running on another worker
+        try:
+            await self._run(job_id, lease)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Roster import job {job_id} failed: {e}")
+            await self.db.roster_import_jobs.update_one(
+                {"id": job_id},
+                {"$set": {"status": "failed", "error": str(e), "updated_at": datetime.now(timezone.utc)}}
+            )
+        finally:
+            await lease.release()
+
+    async def _run(self, job_id: str, lease: MongoLease):
+        job = await self.db.roster_import_jobs.find_one({"id": job_id}, {"_id": 0, "errors": 0})
+        if job is None or job["status"] not in ("queued", "running"):
+            return
+        await self.db.roster_import_jobs.update_one(
+            {"id": job_id},
+            {"$set": {"status": "running", "started_at": job.get("started_at") or datetime.now(timezone.utc)}}
+        )
+
+        loop = asyncio.get_running_loop()
+        importer = RosterImporter(self.db, self.hasher)
+        rows = iter_roster_rows(io.BytesIO(job["file"]), job["filename"])
+        cursor = job.get("cursor", 0)
+        while True:
+            # csv/openpyxl parsing is synchronous - keep it off the event loop
+            batch = await loop.run_in_executor(None, next_rows, rows, self.batch_size)
+            if not batch:
+                break
+            batch = [(row_number, row) for row_number, row in batch if row_number > cursor]
+            if not batch:
+                continue  # Imported before a restart
+            report = await importer.import_rows(batch)
+
+            # Checkpoint: a restart continues after this batch
+            cursor = batch[-1][0]
+            await self.db.roster_import_jobs.update_one(
+                {"id": job_id},
+                {
+                    "$set": {"cursor": cursor, "updated_at": datetime.now(timezone.utc)},
+                    "$inc": {key: report[key] for key in ("total_rows", "created", "failed")},
+                    "$push": {"errors": {"$each": report["errors"], "$slice": MAX_JOB_ERRORS}}
+                }
+            )
+            await lease.renew()
+
+        await self.db.roster_import_jobs.update_one(
+            {"id": job_id},
+            {
+                "$set": {"status": "completed", "completed_at": datetime.now(timezone.utc), "updated_at": datetime.now(timezone.utc)},
+                "$unset": {"file": ""}
+            }
+        )
+        logger.info(f"✓ Roster import job {job_id} completed")
+
+
+async def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Bulk import a student roster (CSV/XLSX)")
+    parser.add_argument("path")
+    parser.add_argument("--workers", type=int, default=None, help="Hashing threads (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL'))
+    db = client[os.environ.get('DB_NAME_EXAM', 'exam_bureau_db')]
+
+    print(f"📥 Importing roster: {args.path}")
+    print("=" * 50)
+    # bcrypt releases the GIL, so hashing threads run in parallel
+    hasher = PasswordHasher(CryptContext(schemes=["bcrypt"], deprecated="auto"), max_workers=args.workers or os.cpu_count() or 1)
+    with open(args.path, "rb") as fileobj:
+        report = await import_roster(db, fileobj, args.path, hasher, args.batch_size)
+    hasher.shutdown()
+
+    for error in report["errors"]:
+        print(f"⚠️  Row {error['row']} ({error['email'] or '-'}): {error['error']}")
+    print("=" * 50)
+    print(f"✅ Created: {report['created']} / {report['total_rows']} rows ({report['failed']} failed)")
+
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -3,13 +3,15 @@ Examination Evaluation Bureau - Grade 5 Scholarship Exam Platform
 Backend API - FastAPI + MongoDB
 """
 
-from fastapi import FastAPI, HTTPException, Depends, status, File, UploadFile
+from fastapi import FastAPI, HTTPException, Depends, status, File, UploadFile, Header, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 from typing import List, Optional, Dict
 from datetime import datetime, timedelta, timezone
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
 import os
 from dotenv import load_dotenv
 import jwt
@@ -19,7 +21,25 @@ from enum import Enum
 import logging
 from functools import lru_cache
 import asyncio
-from cachetools import TTLCache
+from cache_service import PrincipalCache, SWRCache
+from password_service import PasswordHasher, PasswordPoolSaturated
+import token_service
+from migration_service import MIGRATIONS, run_migrations
+from roster_import import RosterImportJobs
+from exam_payload_service import ExamPayloadStore, dumps
+from invalidation_service import InvalidationBus
+from etag_service import JSONSnapshot, as_utc, conditional_response, latest
+from answer_buffer_service import AnswerBuffer, newer_than_stored
+from answer_codec_service import AnswerCodec, question_options, with_packed
+from grading_service import AttemptState, GradingPlanStore
+from sweeper_service import ExpiredAttemptSweeper
+from student_progress_service import StudentProgressStore
+from cohort_stats_service import CohortStats
+from ranking_service import RUN_FIELDS, RankingInProgress, compute_rankings
+from item_analysis_service import ANALYSIS_FIELDS, ITEM_FIELDS, AnalysisInProgress, run_item_analysis
+from regrade_service import RegradeJobs
+from grading_queue_service import GradingQueue
+from token_service import TokenPrincipal, RefreshTokenStore, InvalidRefreshToken
 
 # Load environment variables
 load_dotenv()
@@ -39,32 +59,77 @@ client = AsyncIOMotorClient(
 db = client[os.environ.get('DB_NAME_EXAM', 'exam_bureau_db')]
 
 # In-memory caching for high-traffic optimization (1K concurrent users)
-# TTLCache: maxsize=1000 items, ttl=300 seconds (5 min)
-exam_cache = TTLCache(maxsize=1000, ttl=300)
-user_cache = TTLCache(maxsize=5000, ttl=60)  # Short TTL for user data
+# SWRCache: maxsize=1000 items, ttl=300 seconds (5 min) + 60s served stale while refreshing;
+# concurrent misses on a key share one Mongo query (single-flight)
+exam_cache = SWRCache(ttl=300, stale_ttl=60, maxsize=1000)
+branding_cache = SWRCache(ttl=300, stale_ttl=60, maxsize=1)
+# Serialized exam details keyed by (exam_id, version) - a new version is a new key
+exam_detail_cache = SWRCache(ttl=300, stale_ttl=60, maxsize=256)
+user_cache = PrincipalCache(maxsize=5000, ttl=int(os.environ.get('USER_CACHE_TTL', 60)))  # Short TTL for user data
 
 async def get_cached_exams(grade: str, status: str = None):
     """Get exams with caching for high traffic"""
     cache_key = f"exams_{grade}_{status}"
-    if cache_key in exam_cache:
-        return exam_cache[cache_key]
     
-    query = {"grade": grade, "is_active": True}
-    if status == "published":
-        query["is_active"] = True
-    exams = await db.exams.find(query).to_list(100)
-    exam_cache[cache_key] = exams
-    return exams
+    async def fetch():
+        query = {"grade": grade, "is_active": True}
+        if status == "published":
+            query["is_active"] = True
+        return await db.exams.find(query).to_list(100)
+    
+    return await exam_cache.get(cache_key, fetch)
+
+# Pre-serialized, answer-key-free student views of published exams
+exam_payloads = ExamPayloadStore(db, compress=os.environ.get('EXAM_PAYLOAD_GZIP', '1') == '1')
+
+# Broadcasts cache invalidations to every worker (CACHE_BUS=local for a single process)
+invalidation_bus = InvalidationBus(db, mode=os.environ.get('CACHE_BUS', 'mongo'))
+
+# Autosave durability: sync (default), buffer (write-behind) or journaled (group commit).
+# Buffering is only safe with one worker or sticky attempt sessions - see answer_buffer_service
+answer_buffer = AnswerBuffer(
+    db,
+    mode=os.environ.get('ANSWER_SAVE_MODE', 'sync'),
+    flush_interval_ms=int(os.environ.get('ANSWER_FLUSH_MS', 250)),
+    max_ops=int(os.environ.get('ANSWER_FLUSH_MAX_OPS', 500)),
+    ack_timeout_ms=int(os.environ.get('ANSWER_ACK_TIMEOUT_MS', 5000))
+)
 
-def invalidate_exam_cache():
-    """Clear exam cache when exams are modified"""
-    exam_cache.clear()
+invalidation_bus.subscribe("exams", lambda _: exam_cache.invalidate())
+invalidation_bus.subscribe("exam", lambda exam_id: exam_payloads.invalidate(exam_id))
+invalidation_bus.subscribe("branding", lambda _: branding_cache.invalidate())
+invalidation_bus.subscribe("user", lambda user_id: user_cache.invalidate(user_id))
+
+@invalidation_bus.on_flush
+def flush_local_caches():
+    """Bus connection was interrupted - messages may be lost, so start cold"""
+    exam_cache.invalidate()
+    exam_payloads.invalidate()
+    branding_cache.invalidate()
+    user_cache.clear()
+
+async def invalidate_exam_cache(exam_id: Optional[str] = None):
+    """Clear exam caches on every worker when exams are modified"""
+    await invalidation_bus.publish("exams")
+    if exam_id:
+        await invalidation_bus.publish(f"exam:{exam_id}")
+
+async def invalidate_user_cache(user_id: str):
+    """Drop a cached principal everywhere when the user is deactivated or changes role/grade"""
+    await invalidation_bus.publish(f"user:{user_id}")
 
 # Security
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hasher = PasswordHasher(
+    pwd_context,
+    max_workers=int(os.environ.get('PASSWORD_POOL_WORKERS', min(4, os.cpu_count() or 1))),
+    max_queue=int(os.environ.get('PASSWORD_POOL_MAX_QUEUE', 64)),
+    retry_after=int(os.environ.get('PASSWORD_POOL_RETRY_AFTER', 2))
+)
 SECRET_KEY = os.environ.get('SECRET_KEY', 'exam-bureau-secret-2024')
 ALGORITHM = "HS256"
 security = HTTPBearer()
+refresh_tokens = RefreshTokenStore(db)
 
 # Logging
 logging.basicConfig(level=logging.INFO)
@@ -119,6 +184,78 @@ class SkillArea(str, Enum):
     ANALYTICAL_SKILLS = "analytical_skills"
     CRITICAL_THINKING = "critical_thinking"
 
+SKILL_AREAS = [skill.value for skill in SkillArea]
+
+# Answer keys compiled to arrays once per exam version
+grading_plans = GradingPlanStore(db, skills=SKILL_AREAS)
+
+# ANSWER_ENCODING=packed stores graded answers at 3 bits per question;
+# both encodings are always readable
+answer_codec = AnswerCodec(db, enabled=os.environ.get('ANSWER_ENCODING', 'dict') == 'packed')
+
+# Progress report read model, one document per student
+student_progress = StudentProgressStore(
+    db, skills=SKILL_AREAS,
+    mode=os.environ.get('PROGRESS_REPORT_MODE', 'summary')
+)
+
+# Per-exam score distributions, dropped on every worker at most COHORT_INVALIDATE_SECONDS after grading
+cohort_stats = CohortStats(db, grading_plans, ttl=int(os.environ.get('COHORT_STATS_TTL_SECONDS', 600)))
+COHORT_INVALIDATE_SECONDS = float(os.environ.get('COHORT_INVALIDATE_SECONDS', 5))
+invalidation_bus.subscribe("cohort", lambda exam_id: cohort_stats.invalidate(exam_id))
+
+async def on_paper1_graded(attempts: List[dict]):
+    """Called wherever attempts get (re)graded: submit, queue, sweeper, regrade"""
+    try:
+        await student_progress.record_paper1(attempts)
+    except PyMongoError as e:
+        # The grade itself is stored; student_progress_service.py rebuilds summaries
+        logger.error(f"Progress summary update failed: {e}")
+    # Coalesced: a sitting's worth of submits recomputes each cohort once per interval
+    for exam_id in {attempt["exam_id"] for attempt in attempts}:
+        invalidation_bus.publish_soon(f"cohort:{exam_id}", COHORT_INVALIDATE_SECONDS)
+
+# Grades attempts whose time ran out; one worker at a time holds the lease
+attempt_sweeper = ExpiredAttemptSweeper(
+    db,
+    plans=grading_plans,
+    codec=answer_codec,
+    interval=float(os.environ.get('SWEEP_INTERVAL_SECONDS', 15)),
+    batch_size=int(os.environ.get('SWEEP_BATCH_SIZE', 500)),
+    grace_seconds=int(os.environ.get('SWEEP_GRACE_SECONDS', 30)),
+    before_sweep=answer_buffer.flush,
+    on_graded=on_paper1_graded
+)
+
+# Submit mode: sync grades inside the request, queued returns a receipt and
+# leaves grading to the queue workers. In sync mode the queue only rescues
+# submissions orphaned between their two transitions
+SUBMIT_MODE = os.environ.get('SUBMIT_MODE', 'sync')
+grading_queue = GradingQueue(
+    db, grading_plans,
+    codec=answer_codec,
+    concurrency=int(os.environ.get('GRADING_QUEUE_WORKERS', 2)),
+    batch_size=int(os.environ.get('GRADING_QUEUE_BATCH_SIZE', 200)),
+    drain=SUBMIT_MODE == "queued",
+    on_graded=on_paper1_graded
+)
+
+# Rescoring after answer-key corrections (resumable, one worker per job)
+regrade_jobs = RegradeJobs(
+    db, grading_plans, answer_codec,
+    batch_size=int(os.environ.get('REGRADE_BATCH_SIZE', 1000)),
+    on_graded=on_paper1_graded
+)
+
+# Roster uploads import in the background (resumable, one worker per job);
+# the file is kept on the job document until it completes
+ROSTER_IMPORT_MAX_BYTES = int(os.environ.get('ROSTER_IMPORT_MAX_BYTES', 8 * 1024 * 1024))
+roster_imports = RosterImportJobs(
+    db, password_hasher,
+    batch_size=int(os.environ.get('ROSTER_IMPORT_BATCH_SIZE', 1000))
+)
+
+
 class ExamStatus(str, Enum):
     DRAFT = "draft"
     PUBLISHED = "published"
@@ -139,6 +276,7 @@ class User(BaseModel):
     parent_id: Optional[str] = None  # Link student to parent
     assigned_language: Optional[Language] = None  # For typesetters
     assigned_grades: Optional[List[Grade]] = None  # For typesetters
+    linked_student_id: Optional[str] = None  # For parents
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     is_active: bool = True
 
@@ -153,10 +291,22 @@ class UserLogin(BaseModel):
     email: str
     password: str
 
+class UserUpdate(BaseModel):
+    full_name: Optional[str] = None
+    role: Optional[UserRole] = None
+    grade: Optional[Grade] = None
+    assigned_language: Optional[Language] = None
+    is_active: Optional[bool] = None
+
 class Token(BaseModel):
     access_token: str
     token_type: str
     user: dict
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None  # Access token lifetime in seconds
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class MCQOption(BaseModel):
     option_id: str
@@ -206,8 +356,29 @@ class ExamAttempt(BaseModel):
     time_taken_seconds: int = 0
     score_paper1: int = 0
     skill_scores: Dict[str, int] = {}  # skill -> score
+    state: AttemptState = AttemptState.IN_PROGRESS
     is_completed: bool = False
 
+class AnswerChange(BaseModel):
+    # Used as a field path (answers.<question_id>) in autosave and merge updates
+    question_id: str = Field(min_length=1, max_length=64, pattern=r"^[^$.][^.]*$")
+    selected_option: str
+    seq: int = Field(ge=1)  # Client-side counter, increasing per attempt
+    client_ts: Optional[int] = Field(None, ge=0)  # Client clock, ms since epoch (server time if absent)
+
+    def stamp(self, now_ms: int) -> dict:
+        """Last-writer-wins order of this answer: (client_ts, seq)"""
+        return {"ts": self.client_ts if self.client_ts is not None else now_ms, "seq": self.seq}
+
+class AnswerBatch(BaseModel):
+    changes: List[AnswerChange] = Field(min_length=1, max_length=500)
+
+class AnswerLogEntry(AnswerChange):
+    client_ts: int = Field(ge=0)
+
+class AnswerLog(BaseModel):
+    entries: List[AnswerLogEntry] = Field(min_length=1, max_length=5000)
+
 class Paper2Submission(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     exam_id: str
@@ -222,6 +393,13 @@ class Paper2Submission(BaseModel):
     marked_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class AnswerKeyFix(BaseModel):
+    question_id: str
+    correct_option_id: str
+
+class AnswerKeyUpdate(BaseModel):
+    changes: List[AnswerKeyFix] = Field(min_length=1)
+
 # NEW: PDF Exam Models
 class ExamCreatePDF(BaseModel):
     title: str
@@ -240,17 +418,27 @@ class PDFUploadResponse(BaseModel):
 # AUTH HELPERS
 # ============================================================================
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+def pool_saturated_error(e: PasswordPoolSaturated) -> HTTPException:
+    """Fast 503 for callers arriving while the bcrypt pool is full"""
+    return HTTPException(
+        status_code=503,
+        detail="Server busy, please retry shortly",
+        headers={"Retry-After": str(e.retry_after)}
+    )
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+def create_access_token(user_doc: dict) -> str:
+    """Short-lived access token carrying signed role/grade/language claims"""
+    claims = token_service.build_access_claims(user_doc)
+    return token_service.create_access_token(claims, SECRET_KEY, ALGORITHM)
 
-def create_access_token(data: dict) -> str:
-    to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + timedelta(days=7)
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+async def issue_tokens(user_doc: dict) -> dict:
+    """Access + refresh token pair for a freshly authenticated user"""
+    return {
+        "access_token": create_access_token(user_doc),
+        "refresh_token": await refresh_tokens.issue(user_doc["id"]),
+        "token_type": "bearer",
+        "expires_in": token_service.ACCESS_TOKEN_MINUTES * 60
+    }
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
@@ -261,15 +449,29 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         if not user_id:
             raise HTTPException(status_code=401, detail="Invalid token")
         
-        user_doc = await db.users.find_one({"id": user_id}, {"_id": 0, "hashed_password": 0})
-        if not user_doc:
+        async def load_user():
+            user_doc = await db.users.find_one({"id": user_id}, {"_id": 0, "hashed_password": 0})
+            if not user_doc:
+                return None
+            
+            # Convert datetime string to datetime object if needed
+            if isinstance(user_doc.get('created_at'), str):
+                user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'].replace('Z', '+00:00'))
+            
+            return User(**user_doc)
+        
+        # Per-worker principal cache - avoids a users lookup on every autosave;
+        # concurrent misses for one user share a single lookup
+        user = await user_cache.get_or_load(user_id, load_user)
+        if user is None:
             raise HTTPException(status_code=401, detail="User not found")
         
-        # Convert datetime string to datetime object if needed
-        if isinstance(user_doc.get('created_at'), str):
-            user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'].replace('Z', '+00:00'))
+        if not user.is_active:
+            raise HTTPException(status_code=403, detail="Account inactive")
         
-        return User(**user_doc)
+        return user
+    except HTTPException:
+        raise
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.DecodeError:
@@ -278,6 +480,25 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         logger.error(f"Auth error: {e}")
         raise HTTPException(status_code=401, detail="Invalid authentication")
 
+async def get_token_principal(credentials: HTTPAuthorizationCredentials = Depends(security)) -> TokenPrincipal:
+    """Authorize from access-token claims alone - no users lookup.
+    
+    Legacy tokens without claims fall back to get_current_user.
+    """
+    try:
+        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token expired")
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=401, detail="Invalid token format")
+    
+    principal = token_service.principal_from_claims(payload)
+    if principal is not None:
+        return principal
+    
+    user = await get_current_user(credentials)
+    return token_service.principal_from_user(user.model_dump(mode="json"))
+
 # ============================================================================
 # AUTH ENDPOINTS
 # ============================================================================
@@ -290,8 +511,11 @@ async def register_user(user_data: UserCreate):
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    # Create user
-    hashed_password = get_password_hash(user_data.password)
+    # Create user (bcrypt runs in the bounded hashing pool)
+    try:
+        hashed_password = await password_hasher.hash(user_data.password)
+    except PasswordPoolSaturated as e:
+        raise pool_saturated_error(e)
     
     new_user = {
         "id": str(uuid.uuid4()),
@@ -306,6 +530,7 @@ async def register_user(user_data: UserCreate):
     
     await db.users.insert_one(new_user)
     
+    new_user.pop("_id", None)
     new_user.pop("hashed_password")
     return new_user
 
@@ -313,25 +538,145 @@ async def register_user(user_data: UserCreate):
 async def login(login_data: UserLogin):
     """Login user"""
     user_doc = await db.users.find_one({"email": login_data.email})
+    if not user_doc:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    if not user_doc or not verify_password(login_data.password, user_doc["hashed_password"]):
+    try:
+        password_ok = await password_hasher.verify(login_data.password, user_doc["hashed_password"])
+    except PasswordPoolSaturated as e:
+        raise pool_saturated_error(e)
+    
+    if not password_ok:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     if not user_doc.get("is_active", True):
         raise HTTPException(status_code=403, detail="Account inactive")
     
-    # Create token
-    access_token = create_access_token({"sub": user_doc["id"]})
-    
     user_doc.pop("_id", None)
     user_doc.pop("hashed_password", None)
     
+    # Create tokens
+    tokens = await issue_tokens(user_doc)
+    
+    return {**tokens, "user": user_doc}
+
+@app.post("/api/token/refresh", response_model=Token)
+async def refresh_access_token(request: RefreshRequest):
+    """Exchange a refresh token for a new access token (rotates the refresh token)"""
+    try:
+        user_id, next_refresh = await refresh_tokens.rotate(request.refresh_token)
+    except InvalidRefreshToken:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    
+    user_doc = await db.users.find_one({"id": user_id}, {"_id": 0, "hashed_password": 0})
+    if not user_doc or not user_doc.get("is_active", True):
+        await refresh_tokens.revoke(next_refresh, reason="account_inactive")
+        raise HTTPException(status_code=401, detail="Account inactive")
+    
     return {
-        "access_token": access_token,
+        "access_token": create_access_token(user_doc),
+        "refresh_token": next_refresh,
         "token_type": "bearer",
+        "expires_in": token_service.ACCESS_TOKEN_MINUTES * 60,
         "user": user_doc
     }
 
+@app.post("/api/logout")
+async def logout(request: RefreshRequest):
+    """Revoke a refresh token"""
+    await refresh_tokens.revoke(request.refresh_token)
+    return {"message": "Logged out"}
+
+# ============================================================================
+# USER ADMINISTRATION
+# ============================================================================
+
+@app.put("/api/admin/users/{user_id}")
+async def update_user(
+    user_id: str,
+    update: UserUpdate,
+    current_user: User = Depends(get_current_user)
+):
+    """Update a user's role, grade or active flag (Admin only)"""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    changes = {
+        field: value.value if isinstance(value, Enum) else value
+        for field, value in update.model_dump(exclude_none=True).items()
+    }
+    if not changes:
+        raise HTTPException(status_code=400, detail="No changes supplied")
+    
+    result = await db.users.update_one({"id": user_id}, {"$set": changes})
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    await invalidate_user_cache(user_id)
+    if changes.keys() & {"role", "grade", "assigned_language", "is_active"}:
+        # Access tokens carry these as claims - force a re-login/refresh
+        await refresh_tokens.revoke_user(user_id, reason="user_updated")
+    
+    return {"message": "User updated successfully", "user_id": user_id, "updated": changes}
+
+@app.post("/api/admin/roster/import", status_code=202)
+async def import_student_roster(
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user)
+):
+    """Bulk-create students from a CSV/XLSX roster (Admin only)
+    
+    Starts a background job; poll GET /api/admin/roster/import/{job_id}
+    for its progress and per-row error report.
+    """
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    if not file.filename.lower().endswith(('.csv', '.xlsx', '.xlsm')):
+        raise HTTPException(status_code=400, detail="Only CSV or XLSX rosters are allowed")
+    
+    content = await file.read(ROSTER_IMPORT_MAX_BYTES + 1)
+    if len(content) > ROSTER_IMPORT_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Roster too large - split it or use roster_import.py")
+    
+    job = await roster_imports.create(content, file.filename, created_by=current_user.id)
+    logger.info(f"Roster import {job['id']} queued by {current_user.id}")
+    return job
+
+@app.get("/api/admin/roster/import/{job_id}")
+async def get_roster_import(job_id: str, current_user: User = Depends(get_current_user)):
+    """Progress and row report of a roster import job (Admin only)"""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    job = await roster_imports.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Roster import job not found")
+    return job
+
+@app.get("/api/admin/metrics")
+async def get_metrics(current_user: User = Depends(get_current_user)):
+    """Per-worker cache and pool metrics (Admin only)"""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return {
+        "pid": os.getpid(),
+        "user_cache": user_cache.stats(),
+        "exam_cache": exam_cache.stats(),
+        "branding_cache": branding_cache.stats(),
+        "invalidation_bus": invalidation_bus.stats(),
+        "password_pool": password_hasher.stats(),
+        "answer_buffer": answer_buffer.stats(),
+        "attempt_sweeper": attempt_sweeper.stats(),
+        "grading_plans": grading_plans.stats(),
+        "student_progress": student_progress.stats(),
+        "cohort_stats": cohort_stats.stats(),
+        "answer_codec": answer_codec.stats(),
+        "grading_queue": {"submit_mode": SUBMIT_MODE, **await grading_queue.stats()},
+        "exam_payloads": exam_payloads.stats(),
+        "schema": migration_state
+    }
+
 # ============================================================================
 # EXAM MANAGEMENT (TEACHER/ADMIN)
 # ============================================================================
@@ -355,32 +700,72 @@ async def create_exam(exam_data: dict, current_user: User = Depends(get_current_
         "total_marks_paper2": exam_data.get("total_marks_paper2", 40),
         "status": "draft",
         "created_by": current_user.id,
-        "created_at": datetime.now(timezone.utc)
+        "created_at": datetime.now(timezone.utc),
+        "updated_at": datetime.now(timezone.utc),
+        "version": 1
     }
     
     await db.exams.insert_one(exam)
+    await invalidate_exam_cache()
     exam.pop("_id")
     return exam
 
 @app.get("/api/exams")
-async def list_exams(grade: Optional[str] = None, status: Optional[str] = None):
-    """List exams (filter by grade/status)"""
+async def list_exams(
+    request: Request,
+    grade: Optional[str] = None,
+    status: Optional[str] = None,
+    principal: TokenPrincipal = Depends(get_token_principal)
+):
+    """List exams (filter by grade/status) - supports If-None-Match/If-Modified-Since"""
     query = {}
+    if principal.role == UserRole.STUDENT:
+        # Students only see published exams for their own grade
+        grade = principal.grade
+        status = "published"
     if grade:
         query["grade"] = grade
     if status:
         query["status"] = status
     
-    exams = await db.exams.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
-    return {"exams": exams}
+    async def fetch():
+        exams = await db.exams.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
+        last_modified = latest(e.get("updated_at") or e.get("created_at") for e in exams)
+        return JSONSnapshot({"exams": exams}, last_modified)
+    
+    # Serialized once per cache load; repeat loads are a hash compare
+    snapshot = await exam_cache.get(f"list_{grade}_{status}", fetch)
+    return conditional_response(request, snapshot)
+
+EXAM_VERSION_FIELDS = {"_id": 0, "version": 1, "updated_at": 1, "published_at": 1, "created_at": 1, "status": 1, "grade": 1}
 
 @app.get("/api/exams/{exam_id}")
-async def get_exam(exam_id: str):
-    """Get exam details"""
-    exam = await db.exams.find_one({"id": exam_id}, {"_id": 0})
-    if not exam:
+async def get_exam(
+    exam_id: str,
+    request: Request,
+    principal: TokenPrincipal = Depends(get_token_principal)
+):
+    """Get exam details - supports If-None-Match/If-Modified-Since"""
+    # Tiny indexed lookup first; the full document is only read when the version changed
+    meta = await db.exams.find_one({"id": exam_id}, EXAM_VERSION_FIELDS)
+    if not meta:
         raise HTTPException(status_code=404, detail="Exam not found")
-    return exam
+    if principal.role == UserRole.STUDENT and (
+        meta.get("grade") != principal.grade or meta.get("status") != "published"
+    ):
+        raise HTTPException(status_code=404, detail="Exam not found")
+    
+    async def fetch():
+        exam = await db.exams.find_one({"id": exam_id}, {"_id": 0})
+        if not exam:
+            return None
+        last_modified = latest([exam.get("updated_at"), exam.get("published_at"), exam.get("created_at")])
+        return JSONSnapshot(exam, last_modified)
+    
+    snapshot = await exam_detail_cache.get((exam_id, meta.get("version", 0)), fetch)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    return conditional_response(request, snapshot)
 
 @app.put("/api/exams/{exam_id}/publish")
 async def publish_exam(exam_id: str, current_user: User = Depends(get_current_user)):
@@ -388,82 +773,248 @@ async def publish_exam(exam_id: str, current_user: User = Depends(get_current_us
     if current_user.role not in [UserRole.TEACHER, UserRole.ADMIN]:
         raise HTTPException(status_code=403, detail="Unauthorized")
     
-    result = await db.exams.update_one(
+    exam = await db.exams.find_one_and_update(
         {"id": exam_id},
         {
             "$set": {
                 "status": "published",
-                "published_at": datetime.now(timezone.utc)
-            }
-        }
+                "published_at": datetime.now(timezone.utc),
+                "updated_at": datetime.now(timezone.utc)
+            },
+            "$inc": {"payload_version": 1, "version": 1}
+        },
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
     )
     
-    if result.modified_count == 0:
+    if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
     
-    return {"message": "Exam published successfully"}
+    # Freeze the student view for this version; prime only after the
+    # invalidation, which also evicts this worker's entry
+    payload = await exam_payloads.publish(exam)
+    await invalidate_exam_cache(exam_id)
+    exam_payloads.prime(payload)
+    
+    return {"message": "Exam published successfully", "payload_version": payload.version}
+
+@app.put("/api/exams/{exam_id}/answer-key")
+async def update_answer_key(
+    exam_id: str,
+    update: AnswerKeyUpdate,
+    current_user: User = Depends(get_current_user)
+):
+    """Correct Paper 1 answers; existing attempts keep their scores until regraded"""
+    if current_user.role not in [UserRole.TYPESETTER, UserRole.TEACHER, UserRole.ADMIN]:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    
+    exam = await db.exams.find_one({"id": exam_id}, {"_id": 0, "version": 1, "paper1_questions": 1})
+    if not exam:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    
+    positions = {
+        (q.get("id") or str(q.get("question_number", ""))): i
+        for i, q in enumerate(exam.get("paper1_questions", []))
+    }
+    updates = {}
+    history = []
+    for fix in update.changes:
+        i = positions.get(fix.question_id)
+        if i is None:
+            raise HTTPException(status_code=400, detail=f"Unknown question: {fix.question_id}")
+        question = exam["paper1_questions"][i]
+        # Option ids, or letters for text options - a key outside them can never be graded correct
+        if fix.correct_option_id not in question_options(question):
+            raise HTTPException(status_code=400, detail=f"Unknown option {fix.correct_option_id} for {fix.question_id}")
+        options = question.get("options") or []
+        if options and isinstance(options[0], dict):
+            updates[f"paper1_questions.{i}.options"] = [
+                {**o, "is_correct": o.get("option_id") == fix.correct_option_id} for o in options
+            ]
+        # Handle both correct_option_id (new) and correct_answer (old) formats
+        field = "correct_answer" if "correct_answer" in question and "correct_option_id" not in question else "correct_option_id"
+        updates[f"paper1_questions.{i}.{field}"] = fix.correct_option_id
+        history.append({
+            "question_id": fix.question_id,
+            "old": question.get(field),
+            "new": fix.correct_option_id,
+            "by": current_user.id,
+            "at": datetime.now(timezone.utc)
+        })
+    
+    # Optimistic concurrency: fail rather than merge with a concurrent correction
+    result = await db.exams.update_one(
+        {"id": exam_id, "version": exam.get("version", {"$exists": False})},
+        {
+            "$set": {**updates, "updated_at": datetime.now(timezone.utc)},
+            "$inc": {"version": 1},
+            "$push": {"answer_key_history": {"$each": history}}
+        }
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=409, detail="Exam changed concurrently, reload and retry")
+    await invalidate_exam_cache(exam_id)
+    
+    completed = await db.attempts.count_documents({"exam_id": exam_id, "state": AttemptState.GRADED.value})
+    return {"message": "Answer key updated", "version": exam.get("version", 0) + 1, "updated": len(history), "completed_attempts": completed}
+
+@app.post("/api/exams/{exam_id}/regrade")
+async def start_regrade(
+    exam_id: str,
+    dry_run: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """Rescore all graded attempts against the current key (``dry_run`` only counts changes)"""
+    if current_user.role not in [UserRole.TEACHER, UserRole.ADMIN]:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    try:
+        job = await regrade_jobs.create(exam_id, dry_run=dry_run, created_by=current_user.id)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    return job
+
+class RankingRequest(BaseModel):
+    quota: Optional[int] = Field(None, ge=1)  # Qualifying places per district
+    cutoffs: Dict[str, int] = {}  # Fixed cut-off marks by district (override the quota)
+
+@app.post("/api/exams/{exam_id}/rankings")
+async def rank_exam(exam_id: str, request: RankingRequest, current_user: User = Depends(get_current_user)):
+    """Rank all candidates (Paper 1 + Paper 2) and store ranks and district cut-offs"""
+    if current_user.role not in [UserRole.TEACHER, UserRole.ADMIN]:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    try:
+        return await compute_rankings(db, exam_id, quota=request.quota, cutoffs=request.cutoffs)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    except RankingInProgress:
+        raise HTTPException(status_code=409, detail="Ranking already running for this exam")
+
+@app.get("/api/exams/{exam_id}/rankings")
+async def get_exam_rankings(
+    exam_id: str,
+    district: Optional[str] = None,
+    limit: int = 50,
+    current_user: User = Depends(get_current_user)
+):
+    """Stored ranking run with the top candidates (island-wide or in one district)"""
+    if current_user.role not in [UserRole.TEACHER, UserRole.ADMIN]:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    run = await db.ranking_runs.find_one({"_id": exam_id}, RUN_FIELDS)
+    if not run:
+        raise HTTPException(status_code=404, detail="Exam has not been ranked")
+    query, order = {"exam_id": exam_id}, "rank"
+    if district:
+        query["district"], order = district, "district_rank"
+    rows = await db.exam_rankings.find(query, {"_id": 0, "run_id": 0}).sort(order, 1).limit(max(1, min(limit, 500))).to_list(None)
+    return {**run, "rankings": rows}
+
+@app.post("/api/exams/{exam_id}/item-analysis")
+async def analyze_exam_items(exam_id: str, current_user: User = Depends(get_current_user)):
+    """Recompute difficulty, discrimination, distractor rates and KR-20 from graded attempts"""
+    if current_user.role not in [UserRole.TEACHER, UserRole.ADMIN]:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    try:
+        return await run_item_analysis(db, exam_id, codec=answer_codec)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    except AnalysisInProgress:
+        raise HTTPException(status_code=409, detail="Item analysis already running for this exam")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/api/exams/{exam_id}/item-analysis")
+async def get_item_analysis(exam_id: str, current_user: User = Depends(get_current_user)):
+    """Stored item statistics of the exam, in question order"""
+    if current_user.role not in [UserRole.TEACHER, UserRole.TYPESETTER, UserRole.ADMIN]:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    run = await db.item_analysis_runs.find_one({"_id": exam_id}, ANALYSIS_FIELDS)
+    if not run:
+        raise HTTPException(status_code=404, detail="Exam has not been analysed")
+    items = await db.item_analysis.find(
+        {"exam_id": exam_id}, ITEM_FIELDS
+    ).sort("question_number", 1).to_list(None)
+    return {**run, "items": items}
+
+@app.get("/api/regrade-jobs/{job_id}")
+async def get_regrade_job(job_id: str, current_user: User = Depends(get_current_user)):
+    """Progress and diff summary of a regrade job"""
+    if current_user.role not in [UserRole.TEACHER, UserRole.ADMIN]:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    job = await regrade_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Regrade job not found")
+    return job
 
 # ============================================================================
 # PAPER 1 - MCQ EXAM TAKING
 # ============================================================================
 
 @app.post("/api/exams/{exam_id}/start")
-async def start_exam(exam_id: str, current_user: User = Depends(get_current_user)):
-    """Start Paper 1 MCQ exam"""
+async def start_exam(
+    exam_id: str,
+    lang: Optional[Language] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Start Paper 1 MCQ exam (``lang`` limits questions to one medium)"""
     if current_user.role != UserRole.STUDENT:
         raise HTTPException(status_code=403, detail="Only students can take exams")
     
-    # Get exam
-    exam = await db.exams.find_one({"id": exam_id, "status": "published"}, {"_id": 0})
-    if not exam:
+    # Get the published student view (cached bytes - no exams read)
+    payload = await exam_payloads.get(exam_id)
+    if payload is None:
         raise HTTPException(status_code=404, detail="Exam not found or not published")
     
     # Check if student already has active attempt
-    existing_attempt = await db.attempts.find_one({
+    attempt = await db.attempts.find_one({
         "exam_id": exam_id,
         "student_id": current_user.id,
         "is_completed": False
-    })
-    
-    if existing_attempt:
-        existing_attempt.pop("_id", None)
-        # Return exam data for resume as well
-        return {
-            "attempt": existing_attempt,
-            "exam": {
-                "id": exam["id"],
-                "title": exam["title"],
-                "duration_minutes": exam["duration_minutes"],
-                "questions": exam["paper1_questions"]
-            },
-            "resume": True
+    }, {"_id": 0})
+    resume = attempt is not None
+    
+    if not resume:
+        # Create new attempt
+        started_at = datetime.now(timezone.utc)
+        attempt = {
+            "id": str(uuid.uuid4()),
+            "exam_id": exam_id,
+            "student_id": current_user.id,
+            "started_at": started_at,
+            "deadline": started_at + timedelta(minutes=payload.duration_minutes),  # Auto-submitted after this
+            "answers": {},
+            "last_seq": 0,  # Highest autosave sequence applied
+            "time_taken_seconds": 0,
+            "state": AttemptState.IN_PROGRESS.value,
+            "is_completed": False
         }
+        
+        await db.attempts.insert_one(attempt)
+        attempt.pop("_id")
     
-    # Create new attempt
-    attempt = {
-        "id": str(uuid.uuid4()),
-        "exam_id": exam_id,
-        "student_id": current_user.id,
-        "started_at": datetime.now(timezone.utc),
-        "answers": {},
-        "time_taken_seconds": 0,
-        "is_completed": False
-    }
-    
-    await db.attempts.insert_one(attempt)
-    attempt.pop("_id")
+    # Splice the pre-serialized exam into the response (resume returns exam data as well)
+    lang_code = lang.value if lang else None
+    body = b'{"attempt":' + dumps(attempt) + b',"exam":' + payload.body(lang_code) + b',"resume":' + (b"true" if resume else b"false") + b"}"
+    return Response(content=body, media_type="application/json")
+
+@app.get("/api/exams/{exam_id}/paper")
+async def get_exam_paper(
+    exam_id: str,
+    request: Request,
+    lang: Optional[Language] = None,
+    principal: TokenPrincipal = Depends(get_token_principal)
+):
+    """Student view of a published Paper 1 (answer keys stripped, pre-gzipped, optionally one language)"""
+    payload = await exam_payloads.get(exam_id)
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Exam not found or not published")
     
-    # Return exam questions (shuffled if needed)
-    return {
-        "attempt": attempt,
-        "exam": {
-            "id": exam["id"],
-            "title": exam["title"],
-            "duration_minutes": exam["duration_minutes"],
-            "questions": exam["paper1_questions"]
-        },
-        "resume": False
-    }
+    lang_code = lang.value if lang else None
+    headers = {"X-Exam-Version": str(payload.version), "Vary": "Accept-Encoding"}
+    body_gzip = payload.body_gzip(lang_code)
+    if body_gzip is not None and "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=body_gzip, media_type="application/json", headers=headers)
+    return Response(content=payload.body(lang_code), media_type="application/json", headers=headers)
 
 @app.post("/api/attempts/{attempt_id}/save")
 async def save_answer(
@@ -484,91 +1035,396 @@ async def save_answer(
     question_id = answer_data["question_id"]
     selected_option = answer_data["selected_option"]
     
-    await db.attempts.update_one(
-        {"id": attempt_id},
+    # Conditional on state so a submit between the read and the write wins
+    result = await db.attempts.update_one(
+        {"id": attempt_id, "student_id": current_user.id, "state": AttemptState.IN_PROGRESS.value},
         {"$set": {f"answers.{question_id}": selected_option}}
     )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=400, detail="Exam already submitted")
     
     return {"message": "Answer saved"}
 
-@app.post("/api/attempts/{attempt_id}/submit")
-async def submit_exam(
+@app.post("/api/attempts/{attempt_id}/save-batch")
+async def save_answer_batch(
     attempt_id: str,
+    batch: AnswerBatch,
     current_user: User = Depends(get_current_user)
 ):
-    """Submit Paper 1 and auto-grade"""
-    attempt = await db.attempts.find_one({"id": attempt_id, "student_id": current_user.id})
-    
+    """Apply debounced answer changes in one conditional update.
+    
+    The batch is applied only if every ``seq`` is newer than the attempt's
+    ``last_seq``; stale or replayed batches are ignored and the current
+    ``last_seq`` is returned so the client can drop what was already saved.
+    """
+    return await apply_answer_batch(attempt_id, current_user.id, batch.changes)
+
+async def apply_answer_batch(attempt_id: str, student_id: str, changes: List[AnswerChange]) -> dict:
+    """Shared by the HTTP and WebSocket autosave paths"""
+    changes = sorted(changes, key=lambda c: c.seq)
+    seqs = [c.seq for c in changes]
+    if len(set(seqs)) != len(seqs):
+        raise HTTPException(status_code=400, detail="Duplicate sequence numbers in batch")
+    
+    if answer_buffer.enabled:
+        now_ms = _now_ms()
+        answers = {c.question_id: c.selected_option for c in changes}
+        stamps = {c.question_id: c.stamp(now_ms) for c in changes}
+        try:
+            result = await answer_buffer.save(attempt_id, student_id, answers, stamps, seqs[0], seqs[-1])
+        except (PyMongoError, asyncio.TimeoutError):
+            # Journaled flush failed or stalled; the changes stay buffered for the next flush
+            raise HTTPException(status_code=503, detail="Answers not yet saved, retry shortly")
+        if result is not None:
+            return result
+        updated = None
+    else:
+        updated = await _save_batch_now(attempt_id, student_id, changes)
+    if updated is not None:
+        return {"applied": True, "saved": len({c.question_id for c in changes}), "last_seq": seqs[-1]}
+    
+    # Nothing matched - find out why
+    attempt = await db.attempts.find_one(
+        {"id": attempt_id, "student_id": student_id},
+        {"_id": 0, "is_completed": 1, "last_seq": 1}
+    )
     if not attempt:
         raise HTTPException(status_code=404, detail="Attempt not found")
-    
     if attempt.get("is_completed"):
-        raise HTTPException(status_code=400, detail="Already submitted")
+        raise HTTPException(status_code=400, detail="Exam already submitted")
+    return {"applied": False, "saved": 0, "last_seq": attempt.get("last_seq", 0)}
+
+def _now_ms() -> int:
+    return int(datetime.now(timezone.utc).timestamp() * 1000)
+
+async def _save_batch_now(attempt_id: str, student_id: str, changes: List[AnswerChange]):
+    """Synchronous path: one conditional update per batch"""
+    # Later changes to the same question win
+    now_ms = _now_ms()
+    answers = {f"answers.{c.question_id}": c.selected_option for c in changes}
+    answers.update({f"answer_stamps.{c.question_id}": c.stamp(now_ms) for c in changes})
+    return await db.attempts.find_one_and_update(
+        {
+            "id": attempt_id,
+            "student_id": student_id,
+            "state": AttemptState.IN_PROGRESS.value,
+            "$or": [{"last_seq": {"$lt": changes[0].seq}}, {"last_seq": {"$exists": False}}]
+        },
+        {"$set": {**answers, "last_seq": changes[-1].seq, "last_saved_at": datetime.now(timezone.utc)}},
+        projection={"_id": 0, "last_seq": 1}
+    )
+
+@app.post("/api/attempts/{attempt_id}/reconcile")
+async def reconcile_answer_log(
+    attempt_id: str,
+    log: AnswerLog,
+    current_user: User = Depends(get_current_user)
+):
+    """Merge an answer log recorded offline into the attempt in one write.
+    
+    Every answer is ordered by ``(client_ts, seq)`` and the latest wins,
+    against both the log and what is already stored, so pushing the same
+    log twice (or out of order with autosaves) gives the same answers.
+    Returns the merged answers of the questions in the log.
+    """
+    seqs = [entry.seq for entry in log.entries]
+    if len(set(seqs)) != len(seqs):
+        raise HTTPException(status_code=400, detail="Duplicate sequence numbers in log")
+    
+    # Latest entry per question
+    latest: Dict[str, AnswerLogEntry] = {}
+    for entry in sorted(log.entries, key=lambda e: (e.client_ts, e.seq)):
+        latest[entry.question_id] = entry
+    
+    # Buffered autosaves must land first so they are compared, not overwritten
+    await answer_buffer.settle(attempt_id)
+    
+    merge = {"last_seq": {"$max": [{"$ifNull": ["$last_seq", 0]}, max(seqs)]},
+             "last_saved_at": datetime.now(timezone.utc)}
+    for question_id, entry in latest.items():
+        stamp = entry.stamp(0)
+        newer = newer_than_stored(question_id, stamp)
+        merge[f"answers.{question_id}"] = {"$cond": [newer, {"$literal": entry.selected_option}, f"$answers.{question_id}"]}
+        merge[f"answer_stamps.{question_id}"] = {"$cond": [newer, stamp, f"$answer_stamps.{question_id}"]}
+    
+    attempt = await db.attempts.find_one_and_update(
+        {"id": attempt_id, "student_id": current_user.id, "state": AttemptState.IN_PROGRESS.value},
+        [{"$set": merge}],
+        projection={"_id": 0, "last_seq": 1,
+                    **{f"answers.{q}": 1 for q in latest}, **{f"answer_stamps.{q}": 1 for q in latest}},
+        return_document=ReturnDocument.AFTER
+    )
+    if attempt is None:
+        exists = await db.attempts.find_one({"id": attempt_id, "student_id": current_user.id}, {"_id": 1})
+        if not exists:
+            raise HTTPException(status_code=404, detail="Attempt not found")
+        raise HTTPException(status_code=400, detail="Exam already submitted")
     
-    # Get exam with answers
-    exam = await db.exams.find_one({"id": attempt["exam_id"]}, {"_id": 0})
+    stamps = attempt.get("answer_stamps", {})
+    applied = sum(1 for q, entry in latest.items() if stamps.get(q) == entry.stamp(0))
+    return {
+        "applied": applied,
+        "ignored": len(log.entries) - applied,
+        "last_seq": attempt["last_seq"],
+        "answers": attempt.get("answers", {})
+    }
+
+# ============================================================================
+# PAPER 1 - LIVE SESSION (WEBSOCKET)
+# ============================================================================
+
+# Close codes (4000-4999 are application-defined)
+WS_UNAUTHORIZED = 4401
+WS_FORBIDDEN = 4403
+WS_NOT_FOUND = 4404
+WS_COMPLETED = 4409
+WS_AUTH_TIMEOUT_SECONDS = 10
+
+def _session_clock(attempt: dict, duration_minutes: int) -> dict:
+    now = datetime.now(timezone.utc)
+    ends_at = as_utc(attempt.get("deadline")) or as_utc(attempt.get("started_at")) + timedelta(minutes=duration_minutes)
+    return {
+        "server_time": now.timestamp(),
+        "remaining_seconds": max(0, int((ends_at - now).total_seconds()))
+    }
+
+@app.websocket("/api/attempts/{attempt_id}/ws")
+async def exam_session(websocket: WebSocket, attempt_id: str):
+    """One connection per attempt: answer deltas, heartbeats and timer sync.
+    
+    Authenticates once from the first frame, {"type": "auth", "token": ...}
+    (browsers cannot set headers on a WebSocket, and a ``?token=`` would end
+    up in the access logs). A rejected or expired token closes with 4401 so
+    the client can refresh and reconnect. The ``hello`` frame carries
+    ``last_seq`` so a reconnecting client resends only what was not
+    acknowledged.
+    
+    Client frames:  auth (first), {"type": "answers", "changes": [...]}, {"type": "ping", "t": ...}, {"type": "time"}
+    Server frames:  hello, ack, pong, time, error
+    """
+    await websocket.accept()
+    try:
+        message = await asyncio.wait_for(websocket.receive_json(), timeout=WS_AUTH_TIMEOUT_SECONDS)
+        token = message.get("token") if isinstance(message, dict) and message.get("type") == "auth" else None
+        if not isinstance(token, str) or not token:
+            raise HTTPException(status_code=401, detail="Expected an auth frame")
+        user = await get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+    except HTTPException as e:
+        await websocket.close(code=WS_UNAUTHORIZED, reason=e.detail)
+        return
+    except (asyncio.TimeoutError, ValueError):
+        await websocket.close(code=WS_UNAUTHORIZED, reason="Expected an auth frame")
+        return
+    except WebSocketDisconnect:
+        return
+    if user.role != UserRole.STUDENT:
+        await websocket.close(code=WS_FORBIDDEN, reason="Only students can take exams")
+        return
+    
+    attempt = await db.attempts.find_one(
+        {"id": attempt_id, "student_id": user.id},
+        {"_id": 0, "exam_id": 1, "started_at": 1, "deadline": 1, "is_completed": 1, "last_seq": 1}
+    )
+    if not attempt:
+        await websocket.close(code=WS_NOT_FOUND, reason="Attempt not found")
+        return
+    if attempt.get("is_completed"):
+        await websocket.close(code=WS_COMPLETED, reason="Exam already submitted")
+        return
+    exam = await db.exams.find_one({"id": attempt["exam_id"]}, {"_id": 0, "duration_minutes": 1})
+    duration_minutes = (exam or {}).get("duration_minutes", 60)
+    
+    await websocket.send_json({
+        "type": "hello",
+        "attempt_id": attempt_id,
+        "last_seq": attempt.get("last_seq", 0),
+        **_session_clock(attempt, duration_minutes)
+    })
     
-    # Auto-grade
-    score = 0
-    skill_scores = {skill.value: 0 for skill in SkillArea}
-    skill_totals = {skill.value: 0 for skill in SkillArea}
+    try:
+        while True:
+            message = await websocket.receive_json()
+            kind = message.get("type") if isinstance(message, dict) else None
+            
+            if kind == "answers":
+                try:
+                    batch = AnswerBatch(changes=message.get("changes") or [])
+                    result = await apply_answer_batch(attempt_id, user.id, batch.changes)
+                except ValidationError:
+                    await websocket.send_json({"type": "error", "status": 422, "detail": "Invalid answer batch"})
+                    continue
+                except HTTPException as e:
+                    await websocket.send_json({"type": "error", "status": e.status_code, "detail": e.detail})
+                    if e.status_code in (400, 404):
+                        await websocket.close(code=WS_COMPLETED if e.status_code == 400 else WS_NOT_FOUND)
+                        return
+                    continue
+                await websocket.send_json({"type": "ack", **result})
+            elif kind == "ping":
+                await websocket.send_json({"type": "pong", "t": message.get("t"), "server_time": datetime.now(timezone.utc).timestamp()})
+            elif kind == "time":
+                await websocket.send_json({"type": "time", **_session_clock(attempt, duration_minutes)})
+            else:
+                await websocket.send_json({"type": "error", "status": 400, "detail": f"Unknown message type: {kind}"})
+    except WebSocketDisconnect:
+        pass
+    except ValueError:
+        # Not JSON
+        await websocket.close(code=1003)
+
+async def _graded_result(attempt: dict) -> dict:
+    """Submit response rebuilt from a graded attempt"""
+    plan = await grading_plans.get(attempt["exam_id"])
+    total = plan.total if plan else 0
+    score = attempt["score_paper1"]
+    return {
+        "score": score,
+        "total": total,
+        "percentage": round(score / total * 100, 1) if total else 0.0,
+        "skill_scores": attempt.get("skill_scores", {}),
+        "skill_percentages": attempt.get("skill_percentages", {}),
+        "time_taken_seconds": attempt.get("time_taken_seconds", 0)
+    }
+
+def _grading_receipt(attempt_id: str) -> Response:
+    return Response(
+        content=dumps({
+            "status": "queued",
+            "attempt_id": attempt_id,
+            "result_url": f"/api/attempts/{attempt_id}/result"
+        }),
+        status_code=202,
+        media_type="application/json"
+    )
+
+async def _repeated_submit(attempt_id: str, student_id: str, idempotency_key: Optional[str]):
+    """Answer a submit that found the attempt no longer in progress"""
+    attempt = await db.attempts.find_one(
+        {"id": attempt_id, "student_id": student_id},
+        {"_id": 0, "exam_id": 1, "state": 1, "submit_key": 1, "auto_submitted": 1,
+         "score_paper1": 1, "skill_scores": 1, "skill_percentages": 1, "time_taken_seconds": 1}
+    )
+    if not attempt:
+        raise HTTPException(status_code=404, detail="Attempt not found")
     
-    for question in exam["paper1_questions"]:
-        # Handle both old and new question formats
-        q_id = question.get("id") or str(question.get("question_number", ""))
-        student_answer = attempt["answers"].get(q_id)
-        
-        # Handle both correct_option_id (new) and correct_answer (old) formats
-        correct_answer = question.get("correct_option_id") or question.get("correct_answer")
-        skill = question["skill_area"]
-        marks = question.get("marks", 1)
-        
-        skill_totals[skill] += marks
-        
-        if student_answer == correct_answer:
-            score += marks
-            skill_scores[skill] += marks
-    
-    # Calculate skill percentages
-    skill_percentages = {}
-    for skill, earned in skill_scores.items():
-        total = skill_totals[skill]
-        percentage = (earned / total * 100) if total > 0 else 0
-        skill_percentages[skill] = round(percentage, 1)
-    
-    # Calculate time taken
-    started_at = attempt["started_at"]
-    if isinstance(started_at, str):
-        started_at = datetime.fromisoformat(started_at.replace('Z', '+00:00'))
-    elif started_at.tzinfo is None:
-        started_at = started_at.replace(tzinfo=timezone.utc)
-    
-    time_taken = (datetime.now(timezone.utc) - started_at).total_seconds()
-    
-    # Update attempt
-    await db.attempts.update_one(
-        {"id": attempt_id},
-        {
-            "$set": {
-                "submitted_at": datetime.now(timezone.utc),
-                "time_taken_seconds": int(time_taken),
-                "score_paper1": score,
-                "skill_scores": skill_scores,
-                "skill_percentages": skill_percentages,
-                "is_completed": True
-            }
-        }
+    state = attempt.get("state")
+    if attempt.get("auto_submitted") and state == AttemptState.GRADED:
+        # Closed by the sweeper when time ran out - report that result
+        return {**await _graded_result(attempt), "auto_submitted": True}
+    if idempotency_key is None or attempt.get("submit_key") != idempotency_key:
+        raise HTTPException(status_code=400, detail="Already submitted")
+    # A retry of the submit that closed the attempt: replay, never regrade
+    if state == AttemptState.SUBMITTING:
+        return _grading_receipt(attempt_id)
+    if state == AttemptState.GRADED:
+        return await _graded_result(attempt)
+    raise HTTPException(status_code=500, detail="Grading failed")
+
+@app.post("/api/attempts/{attempt_id}/submit")
+async def submit_exam(
+    attempt_id: str,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=128),
+    current_user: User = Depends(get_current_user)
+):
+    """Submit Paper 1 and auto-grade (SUBMIT_MODE=queued: 202 receipt, grade in the background)
+    
+    Retries carrying the same ``Idempotency-Key`` get the stored result back.
+    """
+    # Buffered autosaves must reach the attempt before it is graded
+    await answer_buffer.settle(attempt_id)
+    
+    # in_progress -> submitting: freezes the answers (autosaves require an open
+    # attempt) and hands back exactly the answers that will be graded
+    submitted_at = datetime.now(timezone.utc)
+    attempt = await db.attempts.find_one_and_update(
+        {"id": attempt_id, "student_id": current_user.id, "state": AttemptState.IN_PROGRESS.value},
+        {"$set": {
+            "state": AttemptState.SUBMITTING.value,
+            "is_completed": True,
+            "submitted_at": submitted_at,
+            "submit_key": idempotency_key
+        }},
+        # Pre-image: none of these fields change in the transition
+        projection={"_id": 0, "exam_id": 1, "answers": 1, "started_at": 1}
     )
+    if attempt is None:
+        return await _repeated_submit(attempt_id, current_user.id, idempotency_key)
+    
+    if SUBMIT_MODE == "queued":
+        # The attempt is durably closed with its final answers; grading happens later
+        await grading_queue.enqueue(attempt_id, attempt["exam_id"])
+        return _grading_receipt(attempt_id)
+    
+    time_taken = max(0, int((submitted_at - as_utc(attempt["started_at"])).total_seconds()))
+    
+    # Auto-grade against the compiled answer key (cached per exam version)
+    plan = await grading_plans.get(attempt["exam_id"])
+    if plan is None:
+        await db.attempts.update_one(
+            {"id": attempt_id, "state": AttemptState.SUBMITTING.value},
+            {"$set": {"state": AttemptState.FAILED.value, "grading_error": "exam_not_found"}}
+        )
+        raise HTTPException(status_code=404, detail="Exam not found")
+    result = plan.grade(attempt["answers"])
+    packed = await answer_codec.pack(plan.layout, attempt["answers"])
+    
+    # submitting -> graded
+    graded = {
+        "time_taken_seconds": time_taken,
+        "score_paper1": result["score"],
+        "skill_scores": result["skill_scores"],
+        "skill_percentages": result["skill_percentages"],
+        "state": AttemptState.GRADED.value,
+        "graded_at": datetime.now(timezone.utc)
+    }
+    closed = await db.attempts.update_one(
+        {"id": attempt_id, "state": AttemptState.SUBMITTING.value},
+        with_packed(graded, packed)
+    )
+    if closed.modified_count:
+        await on_paper1_graded([{
+            **attempt, **graded, "id": attempt_id, "student_id": current_user.id, "submitted_at": submitted_at
+        }])
     
     return {
-        "score": score,
-        "total": exam["total_marks_paper1"],
-        "percentage": round(score / exam["total_marks_paper1"] * 100, 1),
-        "skill_scores": skill_scores,
-        "skill_percentages": skill_percentages,
-        "time_taken_seconds": int(time_taken)
+        "score": result["score"],
+        "total": result["total"],
+        "percentage": result["percentage"],
+        "skill_scores": result["skill_scores"],
+        "skill_percentages": result["skill_percentages"],
+        "time_taken_seconds": time_taken
     }
 
+@app.get("/api/attempts/{attempt_id}/result")
+async def get_attempt_result(
+    attempt_id: str,
+    include_answers: bool = False,
+    principal: TokenPrincipal = Depends(get_token_principal)
+):
+    """Paper 1 result once graded; 202 while the submission is still being graded
+    
+    ``include_answers`` adds the submitted answers (decoded if stored packed).
+    """
+    projection = {"_id": 0, "exam_id": 1, "student_id": 1, "state": 1,
+                  "score_paper1": 1, "skill_scores": 1, "skill_percentages": 1, "time_taken_seconds": 1}
+    if include_answers:
+        projection.update({"answers": 1, "answers_packed": 1, "answers_layout": 1})
+    attempt = await db.attempts.find_one({"id": attempt_id}, projection)
+    if not attempt or not can_view_student(principal, attempt["student_id"]):
+        raise HTTPException(status_code=404, detail="Attempt not found")
+    state = attempt.get("state")
+    if state == AttemptState.IN_PROGRESS:
+        raise HTTPException(status_code=409, detail="Attempt not submitted")
+    if state == AttemptState.SUBMITTING:
+        return _grading_receipt(attempt_id)
+    if state != AttemptState.GRADED or "score_paper1" not in attempt:
+        raise HTTPException(status_code=500, detail="Grading failed")
+    result = await _graded_result(attempt)
+    if include_answers:
+        await answer_codec.unpack([attempt])
+        result["answers"] = attempt.get("answers", {})
+    return result
+
 # ============================================================================
 # PAPER 2 - MANUAL MARKING
 # ============================================================================
@@ -612,7 +1468,7 @@ async def mark_paper2(
     short_answer_marks = marks_data.get("short_answer_marks", [0] * 10)
     total = essay_marks + sum(short_answer_marks)
     
-    await db.paper2_submissions.update_one(
+    submission = await db.paper2_submissions.find_one_and_update(
         {"id": submission_id},
         {
             "$set": {
@@ -623,8 +1479,16 @@ async def mark_paper2(
                 "teacher_comments": marks_data.get("comments", ""),
                 "marked_at": datetime.now(timezone.utc)
             }
-        }
+        },
+        projection={"_id": 0, "student_id": 1, "exam_id": 1}
     )
+    if not submission:
+        raise HTTPException(status_code=404, detail="Submission not found")
+    try:
+        await student_progress.record_paper2(submission["student_id"], submission["exam_id"], total)
+    except PyMongoError as e:
+        # The marks are stored; student_progress_service.py rebuilds summaries
+        logger.error(f"Progress summary update failed: {e}")
     
     return {"message": "Paper 2 marked successfully", "total_marks": total}
 
@@ -632,82 +1496,52 @@ async def mark_paper2(
 # RESULTS & PROGRESS
 # ============================================================================
 
+def can_view_student(principal: TokenPrincipal, student_id: str) -> bool:
+    """Students see their own reports, parents their linked child, staff everyone"""
+    if principal.role in (UserRole.TEACHER, UserRole.ADMIN):
+        return True
+    if principal.role == UserRole.STUDENT:
+        return principal.id == student_id
+    if principal.role == UserRole.PARENT:
+        return principal.linked_student_id == student_id
+    return False
+
 @app.get("/api/students/{student_id}/progress")
-async def get_student_progress(student_id: str, current_user: User = Depends(get_current_user)):
-    """Get student progress across all monthly exams (blood report style)"""
-    
-    # Get all attempts for student
-    attempts = await db.attempts.find(
-        {"student_id": student_id, "is_completed": True},
-        {"_id": 0}
-    ).sort("submitted_at", 1).to_list(100)
-    
-    # Get Paper 2 submissions
-    paper2_subs = await db.paper2_submissions.find(
-        {"student_id": student_id, "marked_at": {"$exists": True}},
-        {"_id": 0}
-    ).to_list(100)
-    
-    # Build monthly progress
-    monthly_progress = []
-    skill_trends = {skill.value: [] for skill in SkillArea}
-    
-    # Batch fetch all exams to avoid N+1 query
-    exam_ids = [attempt["exam_id"] for attempt in attempts]
-    exams_list = await db.exams.find(
-        {"id": {"$in": exam_ids}}, 
-        {"_id": 0, "id": 1, "month": 1, "title": 1}
-    ).to_list(100)
-    exams_map = {exam["id"]: exam for exam in exams_list}
-    
-    for attempt in attempts:
-        exam = exams_map.get(attempt["exam_id"])
-        if not exam:
-            continue  # Skip if exam not found
-        
-        # Find corresponding Paper 2
-        paper2 = next((p for p in paper2_subs if p["exam_id"] == attempt["exam_id"]), None)
-        paper2_score = paper2["total_marks"] if paper2 else 0
-        
-        month_data = {
-            "month": exam["month"],
-            "exam_title": exam["title"],
-            "paper1_score": attempt["score_paper1"],
-            "paper2_score": paper2_score,
-            "total_score": attempt["score_paper1"] + paper2_score,
-            "total_possible": 100,  # 60 + 40
-            "skill_percentages": attempt.get("skill_percentages", {}),
-            "submitted_at": attempt["submitted_at"]
-        }
-        
-        monthly_progress.append(month_data)
-        
-        # Add to trends
-        for skill, percentage in attempt.get("skill_percentages", {}).items():
-            skill_trends[skill].append({
-                "month": exam["month"],
-                "percentage": percentage
-            })
-    
-    # Calculate strengths & weaknesses (latest month)
-    if attempts:
-        latest_skills = attempts[-1].get("skill_percentages", {})
-        sorted_skills = sorted(latest_skills.items(), key=lambda x: x[1], reverse=True)
-        
-        strengths = sorted_skills[:3]  # Top 3
-        weaknesses = sorted_skills[-3:]  # Bottom 3
-    else:
-        strengths = []
-        weaknesses = []
-    
-    return {
-        "student_id": student_id,
-        "monthly_progress": monthly_progress,
-        "skill_trends": skill_trends,
-        "strengths": strengths,
-        "weaknesses": weaknesses,
-        "total_exams_taken": len(attempts)
-    }
+async def get_student_progress(student_id: str, principal: TokenPrincipal = Depends(get_token_principal)):
+    """Get student progress across all monthly exams (blood report style)
+    
+    Read from the ``student_progress`` summary kept current on grading and
+    Paper 2 marking - one primary-key read (PROGRESS_REPORT_MODE=pipeline:
+    one aggregation over the source collections).
+    """
+    if not can_view_student(principal, student_id):
+        raise HTTPException(status_code=403, detail="Access denied")
+    return await student_progress.report(student_id)
+
+@app.get("/api/exams/{exam_id}/stats")
+async def get_exam_stats(exam_id: str, principal: TokenPrincipal = Depends(get_token_principal)):
+    """Paper 1 score distribution of everyone graded on the exam"""
+    cohort = await cohort_stats.get(exam_id)
+    if cohort is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    return cohort.summary()
+
+@app.get("/api/exams/{exam_id}/stats/students/{student_id}")
+async def get_student_exam_position(
+    exam_id: str,
+    student_id: str,
+    principal: TokenPrincipal = Depends(get_token_principal)
+):
+    """Student's percentile rank and z-score within the exam's cohort"""
+    if not can_view_student(principal, student_id):
+        raise HTTPException(status_code=403, detail="Access denied")
+    cohort = await cohort_stats.get(exam_id)
+    if cohort is None:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    position = cohort.student(student_id)
+    if position is None:
+        raise HTTPException(status_code=404, detail="No graded attempt for this exam")
+    return position
 
 # ============================================================================
 # PDF EXAM ENDPOINTS (NEW)
@@ -738,11 +1572,13 @@ async def create_pdf_exam(
         "status": "draft",
         "created_by": current_user.id,
         "created_at": datetime.now(timezone.utc).isoformat(),
+        "updated_at": datetime.now(timezone.utc),
+        "version": 1,
         "is_active": True
     }
     
     await db.exams.insert_one(exam_doc)
-    invalidate_exam_cache()
+    await invalidate_exam_cache()
     
     return {
         "message": "PDF exam created successfully",
@@ -791,9 +1627,12 @@ async def upload_exam_pdf(
     pdf_field = f"pdf_path_{language.value}"
     await db.exams.update_one(
         {"id": exam_id},
-        {"$set": {pdf_field: file_path}}
+        {
+            "$set": {pdf_field: file_path, "updated_at": datetime.now(timezone.utc)},
+            "$inc": {"version": 1}
+        }
     )
-    invalidate_exam_cache()
+    await invalidate_exam_cache(exam_id)
     
     return PDFUploadResponse(
         message=f"PDF uploaded successfully for {language.value}",
@@ -835,117 +1674,45 @@ async def root():
 # STARTUP
 # ============================================================================
 
+migration_state = {"status": "pending", "version": 0}
+
 @app.on_event("startup")
 async def startup_event():
-    """Create indexes and seed sample data"""
+    """Apply pending migrations (indexes, seed data) - once per deployment, not per worker"""
     try:
-        await db.users.create_index("email", unique=True)
-        await db.exams.create_index([("grade", 1), ("month", 1)])
-        await db.attempts.create_index([("student_id", 1), ("exam_id", 1)])
-        await db.paper2_submissions.create_index([("student_id", 1), ("exam_id", 1)])
-        logger.info("✓ Database indexes created")
-        
-        # Seed sample users for all grades
-        sample_users = [
-            # Grade 5 users
-            {"id": "student_g5_001", "email": "student@test.com", "full_name": "Grade 5 Student", "hashed_password": get_password_hash("student123"), "role": "student", "grade": "grade_5", "created_at": datetime.now(timezone.utc), "is_active": True},
-            # Grade 4 users
-            {"id": "student_g4_001", "email": "student4@test.com", "full_name": "Grade 4 Student", "hashed_password": get_password_hash("student123"), "role": "student", "grade": "grade_4", "created_at": datetime.now(timezone.utc), "is_active": True},
-            # Grade 3 users
-            {"id": "student_g3_001", "email": "student3@test.com", "full_name": "Grade 3 Student", "hashed_password": get_password_hash("student123"), "role": "student", "grade": "grade_3", "created_at": datetime.now(timezone.utc), "is_active": True},
-            # Grade 2 users
-            {"id": "student_g2_001", "email": "student2@test.com", "full_name": "Grade 2 Student", "hashed_password": get_password_hash("student123"), "role": "student", "grade": "grade_2", "created_at": datetime.now(timezone.utc), "is_active": True},
-            # Staff users
-            {"id": "teacher_001", "email": "teacher@test.com", "full_name": "Sample Teacher", "hashed_password": get_password_hash("teacher123"), "role": "teacher", "grade": "grade_5", "created_at": datetime.now(timezone.utc), "is_active": True},
-            {"id": "parent_001", "email": "parent@test.com", "full_name": "Sample Parent", "hashed_password": get_password_hash("parent123"), "role": "parent", "grade": "grade_5", "created_at": datetime.now(timezone.utc), "is_active": True, "linked_student_id": "student_g5_001"},
-            {"id": "admin_001", "email": "admin@test.com", "full_name": "Sample Admin", "hashed_password": get_password_hash("admin123"), "role": "admin", "grade": "grade_5", "created_at": datetime.now(timezone.utc), "is_active": True}
-        ]
-        
-        for user in sample_users:
-            existing = await db.users.find_one({"email": user["email"]})
-            if not existing:
-                await db.users.insert_one(user)
-                logger.info(f"✓ Created sample user: {user['email']}")
-            else:
-                logger.info(f"Sample user already exists: {user['email']}")
-                
-        # Seed sample exams for ALL grades
-        grades_config = [
-            {"grade": "grade_2", "title_prefix": "Grade 2 Model Exam", "questions": 40, "duration": 45},
-            {"grade": "grade_3", "title_prefix": "Grade 3 Model Exam", "questions": 50, "duration": 50},
-            {"grade": "grade_4", "title_prefix": "Grade 4 Model Exam", "questions": 55, "duration": 55},
-            {"grade": "grade_5", "title_prefix": "Grade 5 Scholarship Practice Exam", "questions": 60, "duration": 60}
-        ]
-        
-        skill_areas = ["mathematical_reasoning", "language_proficiency", "general_knowledge", "comprehension_skills", "problem_solving"]
-        
-        for config in grades_config:
-            existing_exam = await db.exams.find_one({"grade": config["grade"]})
-            if not existing_exam:
-                # Create February 2025 exam
-                sample_exam = {
-                    "id": str(uuid.uuid4()),
-                    "title": f"February 2025 - {config['title_prefix']}",
-                    "grade": config["grade"],
-                    "month": "2025-02",
-                    "paper_number": 1,
-                    "duration_minutes": config["duration"],
-                    "total_questions": config["questions"],
-                    "status": "published",
-                    "paper1_questions": [
-                        {
-                            "question_number": i+1, 
-                            "question_text": f"Sample question {i+1} for {config['grade'].replace('_', ' ')}", 
-                            "question_text_si": f"ප්‍රශ්නය {i+1} - {config['grade'].replace('_', ' ')}", 
-                            "question_text_ta": f"கேள்வி {i+1} - {config['grade'].replace('_', ' ')}", 
-                            "options": ["Option A", "Option B", "Option C", "Option D"],
-                            "options_si": ["විකල්පය A", "විකල්පය B", "විකල්පය C", "විකල්පය D"],
-                            "options_ta": ["விருப்பம் A", "விருப்பம் B", "விருப்பம் C", "விருப்பம் D"],
-                            "correct_answer": ["A", "B", "C", "D"][i % 4], 
-                            "skill_area": skill_areas[i % 5]
-                        }
-                        for i in range(config["questions"])
-                    ],
-                    "is_active": True,
-                    "created_by": "admin_001",
-                    "created_at": datetime.now(timezone.utc)
-                }
-                await db.exams.insert_one(sample_exam)
-                logger.info(f"✓ Created sample exam for {config['grade']}")
-                
-                # Create January 2025 exam as well
-                sample_exam_jan = {
-                    "id": str(uuid.uuid4()),
-                    "title": f"January 2025 - {config['title_prefix']}",
-                    "grade": config["grade"],
-                    "month": "2025-01",
-                    "paper_number": 1,
-                    "duration_minutes": config["duration"],
-                    "total_questions": config["questions"],
-                    "status": "published",
-                    "paper1_questions": [
-                        {
-                            "question_number": i+1, 
-                            "question_text": f"January Q{i+1} for {config['grade'].replace('_', ' ')}", 
-                            "question_text_si": f"ජනවාරි ප්‍රශ්නය {i+1}", 
-                            "question_text_ta": f"ஜனவரி கேள்வி {i+1}", 
-                            "options": ["Option A", "Option B", "Option C", "Option D"],
-                            "options_si": ["විකල්පය A", "විකල්පය B", "විකල්පය C", "විකල්පය D"],
-                            "options_ta": ["விருப்பம் A", "விருப்பம் B", "விருப்பம் C", "விருப்பம் D"],
-                            "correct_answer": ["A", "B", "C", "D"][(i+1) % 4], 
-                            "skill_area": skill_areas[i % 5]
-                        }
-                        for i in range(config["questions"])
-                    ],
-                    "is_active": True,
-                    "created_by": "admin_001",
-                    "created_at": datetime.now(timezone.utc)
-                }
-                await db.exams.insert_one(sample_exam_jan)
-                logger.info(f"✓ Created January exam for {config['grade']}")
-                
+        result = await run_migrations(db, MIGRATIONS, password_hasher=password_hasher)
     except Exception as e:
-        logger.error(f"Error in startup: {e}")
+        # Never serve against a schema older than the code expects
+        migration_state["status"] = "failed"
+        logger.error(f"Migrations failed, not starting: {e}")
+        raise
+    migration_state.update(result)
+    logger.info(f"✓ Schema at v{result['version']} ({result['status']})")
+    
+    # Background subsystems start independently - one failing does not keep the others down
+    for name, start in (
+        ("invalidation bus", invalidation_bus.start),
+        ("answer buffer", answer_buffer.start),
+        ("attempt sweeper", attempt_sweeper.start),
+        ("regrade jobs", regrade_jobs.resume_pending),
+        ("roster imports", roster_imports.resume_pending),
+        ("grading queue", grading_queue.start),
+    ):
+        try:
+            await start()
+        except Exception as e:
+            logger.error(f"Error starting {name}: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release worker-level resources"""
+    await attempt_sweeper.stop()
+    await regrade_jobs.stop()
+    await roster_imports.stop()
+    await grading_queue.stop()
+    await answer_buffer.stop()  # Flush buffered autosaves
+    await invalidation_bus.stop()
+    password_hasher.shutdown()
 
 if __name__ == "__main__":
     import uvicorn
@@ -1176,7 +1943,7 @@ async def update_branding(
 ):
     """Update platform branding (Admin only)"""
     user = await get_current_user(credentials)
-    if user["role"] != UserRole.ADMIN:
+    if user.role != UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Admin access required")
     
     # Update or create branding document
@@ -1189,23 +1956,30 @@ async def update_branding(
             "primary_color": branding.get("primary_color", "#F97316"),
             "secondary_color": branding.get("secondary_color", "#3B82F6"),
             "updated_at": datetime.now(timezone.utc)
-        }},
+        }, "$inc": {"version": 1}},
         upsert=True
     )
+    await invalidation_bus.publish("branding")
     
     return {"success": True, "message": "Branding updated successfully"}
 
+DEFAULT_BRANDING = {
+    "institution_name": "Education Reforms Bureau",
+    "portal_name": "Grade 5 Scholarship Exam Portal",
+    "tagline": "Building Future Scholars",
+    "primary_color": "#F97316",
+    "secondary_color": "#3B82F6"
+}
+
 @app.get("/api/settings/branding")
-async def get_branding():
-    """Get platform branding (Public)"""
-    branding = await db.branding.find_one({"_id": "main"})
-    if not branding:
-        return {
-            "institution_name": "Education Reforms Bureau",
-            "portal_name": "Grade 5 Scholarship Exam Portal",
-            "tagline": "Building Future Scholars",
-            "primary_color": "#F97316",
-            "secondary_color": "#3B82F6"
-        }
-    return branding
+async def get_branding(request: Request):
+    """Get platform branding (Public) - supports If-None-Match/If-Modified-Since"""
+    async def fetch():
+        branding = await db.branding.find_one({"_id": "main"})
+        if not branding:
+            return JSONSnapshot(DEFAULT_BRANDING)
+        return JSONSnapshot(branding, branding.get("updated_at"))
+    
+    snapshot = await branding_cache.get("main", fetch)
+    return conditional_response(request, snapshot)
 
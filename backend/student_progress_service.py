@@ -0,0 +1,358 @@
+"""
+Student progress read model for the exam platform
+``student_progress`` keeps one document per student (``_id`` = student id)
+with every graded Paper 1 attempt, marked Paper 2 total and stored rank,
+updated when attempts are graded (submit, grading queue, sweeper, regrade),
+when Paper 2 is marked and when an exam is ranked - the progress report is a single primary-key read
+instead of three queries and a join
+
+Report modes (PROGRESS_REPORT_MODE):
+    summary   - read the student_progress document (default)
+    pipeline  - one aggregation over attempts that $lookup-s exams and
+                paper2_submissions, shapes the report server-side and
+                $group-s the skill trends
+
+Usage: python student_progress_service.py [--batch-size 1000]
+Rebuilds every summary from attempts, paper2_submissions, exam_rankings and exams
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from cachetools import TTLCache
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReplaceOne, UpdateOne
+
+from etag_service import as_utc
+from grading_service import AttemptState
+from ranking_service import RANK_FIELDS, student_ranks
+
+# The report has always listed at most this many exams
+MAX_REPORT_EXAMS = 100
+
+EXAM_META_FIELDS = {"_id": 0, "id": 1, "month": 1, "title": 1}
+ATTEMPT_FIELDS = {"_id": 0, "id": 1, "student_id": 1, "exam_id": 1,
+                  "score_paper1": 1, "skill_percentages": 1, "submitted_at": 1}
+# Graded attempts only - submitting/failed ones have no score yet
+GRADED = {"state": AttemptState.GRADED.value}
+
+_EPOCH = datetime.min.replace(tzinfo=timezone.utc)
+
+REPORT_MODES = ("summary", "pipeline")
+
+
+def attempt_entry(attempt: dict, exam: dict) -> dict:
+    """What the report needs of one graded attempt"""
+    return {
+        "exam_id": attempt["exam_id"],
+        "month": exam.get("month"),
+        "exam_title": exam.get("title"),
+        "paper1_score": attempt.get("score_paper1", 0),
+        "skill_percentages": attempt.get("skill_percentages", {}),
+        "submitted_at": attempt.get("submitted_at")
+    }
+
+
+def _finish_report(student_id: str, monthly_progress: List[dict], skill_trends: Dict[str, list],
+                   skills: Sequence[str]) -> dict:
+    trends = {skill: [] for skill in skills}
+    trends.update(skill_trends)
+    # Strengths & weaknesses from the latest month
+    if monthly_progress:
+        sorted_skills = sorted(monthly_progress[-1]["skill_percentages"].items(), key=lambda x: x[1], reverse=True)
+        strengths, weaknesses = sorted_skills[:3], sorted_skills[-3:]
+    else:
+        strengths, weaknesses = [], []
+    return {
+        "student_id": student_id,
+        "monthly_progress": monthly_progress,
+        "skill_trends": trends,
+        "strengths": strengths,
+        "weaknesses": weaknesses,
+        "total_exams_taken": len(monthly_progress)
+    }
+
+
+def build_report(student_id: str, summary: dict, skills: Sequence[str]) -> dict:
+    """The blood-report response, computed from one summary document"""
+    entries = sorted(
+        (summary.get("attempts") or {}).values(),
+        key=lambda entry: as_utc(entry.get("submitted_at")) or _EPOCH
+    )[:MAX_REPORT_EXAMS]
+    paper2 = summary.get("paper2") or {}
+    ranks = summary.get("ranks") or {}
+
+    monthly_progress = []
+    skill_trends: Dict[str, list] = {}
+    for entry in entries:
+        paper2_score = paper2.get(entry["exam_id"], 0)
+        monthly_progress.append({
+            "month": entry["month"],
+            "exam_title": entry["exam_title"],
+            "paper1_score": entry["paper1_score"],
+            "paper2_score": paper2_score,
+            "total_score": entry["paper1_score"] + paper2_score,
+            "total_possible": 100,  # 60 + 40
+            "skill_percentages": entry["skill_percentages"],
+            "submitted_at": entry["submitted_at"],
+            "rank": ranks.get(entry["exam_id"])
+        })
+        for skill, percentage in entry["skill_percentages"].items():
+            skill_trends.setdefault(skill, []).append({"month": entry["month"], "percentage": percentage})
+    return _finish_report(student_id, monthly_progress, skill_trends, skills)
+
+
+def report_pipeline(student_id: str) -> List[dict]:
+    """Aggregation over ``attempts`` producing the report in one document.
+
+    Answers never leave the first stage; exams and Paper 2 marks are joined
+    server-side, attempts are shaped in submit order (one entry each, as in
+    summary mode) and skill trends are grouped per skill.
+    """
+    return [
+        {"$match": {"student_id": student_id, **GRADED}},
+        {"$sort": {"submitted_at": 1}},
+        {"$project": {"_id": 0, "exam_id": 1, "score_paper1": 1, "skill_percentages": 1, "submitted_at": 1}},
+        {"$lookup": {
+            "from": "exams",
+            "let": {"exam_id": "$exam_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$id", "$$exam_id"]}}},
+                {"$project": {"_id": 0, "month": 1, "title": 1}}
+            ],
+            "as": "exam"
+        }},
+        {"$unwind": "$exam"},  # Reports skip deleted exams
+        {"$limit": MAX_REPORT_EXAMS},
+        {"$lookup": {
+            "from": "paper2_submissions",
+            "let": {"exam_id": "$exam_id"},
+            "pipeline": [
+                {"$match": {"student_id": student_id, "marked_at": {"$exists": True},
+                            "$expr": {"$eq": ["$exam_id", "$$exam_id"]}}},
+                {"$sort": {"marked_at": -1}},
+                {"$limit": 1},
+                {"$project": {"_id": 0, "total_marks": 1}}
+            ],
+            "as": "paper2"
+        }},
+        {"$lookup": {
+            "from": "exam_rankings",
+            "let": {"exam_id": "$exam_id"},
+            "pipeline": [
+                {"$match": {"student_id": student_id, "$expr": {"$eq": ["$exam_id", "$$exam_id"]}}},
+                {"$project": RANK_FIELDS}
+            ],
+            "as": "rank"
+        }},
+        *REPORT_SHAPE
+    ]
+
+
+# Everything after the joins: one entry per attempt (already in submit
+# order), then the report document
+REPORT_SHAPE = [
+    {"$addFields": {
+        "paper1_score": {"$ifNull": ["$score_paper1", 0]},
+        "paper2_score": {"$ifNull": [{"$arrayElemAt": ["$paper2.total_marks", 0]}, 0]}
+    }},
+    {"$project": {
+        "month": "$exam.month",
+        "exam_title": "$exam.title",
+        "paper1_score": 1,
+        "paper2_score": 1,
+        "total_score": {"$add": ["$paper1_score", "$paper2_score"]},
+        "total_possible": {"$literal": 100},  # 60 + 40
+        "skill_percentages": {"$ifNull": ["$skill_percentages", {}]},
+        "submitted_at": 1,
+        "rank": {"$ifNull": [{"$arrayElemAt": ["$rank", 0]}, None]}
+    }},
+    {"$facet": {
+        "monthly_progress": [{"$project": {"_id": 0}}],
+        "skill_trends": [
+            {"$project": {"month": 1, "skill": {"$objectToArray": "$skill_percentages"}}},
+            {"$unwind": "$skill"},
+            {"$group": {"_id": "$skill.k", "points": {"$push": {"month": "$month", "percentage": "$skill.v"}}}}
+        ]
+    }},
+    {"$project": {
+        "monthly_progress": 1,
+        "skill_trends": {"$arrayToObject": {
+            "$map": {"input": "$skill_trends", "in": {"k": "$$this._id", "v": "$$this.points"}}
+        }}
+    }}
+]
+
+
+async def load_exam_meta(db, exam_ids: Iterable[str]) -> Dict[str, dict]:
+    return {
+        exam["id"]: exam
+        async for exam in db.exams.find({"id": {"$in": list(exam_ids)}}, EXAM_META_FIELDS)
+    }
+
+
+class StudentProgressStore:
+    """Incremental writes to ``student_progress`` and the report read"""
+
+    def __init__(self, db, skills: Sequence[str], mode: str = "summary", exam_ttl: int = 300):
+        if mode not in REPORT_MODES:
+            raise ValueError(f"Unknown progress report mode: {mode}")
+        self.db = db
+        self.skills = list(skills)
+        self.mode = mode
+        self._exams = TTLCache(maxsize=1024, ttl=exam_ttl)  # exam id -> month/title
+
+        self.paper1_updates = 0
+        self.paper2_updates = 0
+        self.reads = 0
+        self.lazy_builds = 0
+
+    async def _exam_meta(self, exam_ids: Iterable[str]) -> Dict[str, dict]:
+        exam_ids = set(exam_ids)
+        missing = [exam_id for exam_id in exam_ids if exam_id not in self._exams]
+        if missing:
+            self._exams.update(await load_exam_meta(self.db, missing))
+        return {exam_id: self._exams[exam_id] for exam_id in exam_ids if exam_id in self._exams}
+
+    async def record_paper1(self, attempts: List[dict]):
+        """Upsert graded attempts (ATTEMPT_FIELDS) into their students' summaries"""
+        if not attempts:
+            return
+        exams = await self._exam_meta(a["exam_id"] for a in attempts)
+        now = datetime.now(timezone.utc)
+        ops = [
+            UpdateOne(
+                {"_id": attempt["student_id"]},
+                {"$set": {f"attempts.{attempt['id']}": attempt_entry(attempt, exams[attempt["exam_id"]]), "updated_at": now}},
+                upsert=True
+            )
+            for attempt in attempts if attempt["exam_id"] in exams  # Reports skip deleted exams
+        ]
+        if ops:
+            await self.db.student_progress.bulk_write(ops, ordered=False)
+            self.paper1_updates += len(ops)
+
+    async def record_paper2(self, student_id: str, exam_id: str, total_marks: int):
+        await self.db.student_progress.update_one(
+            {"_id": student_id},
+            {"$set": {f"paper2.{exam_id}": total_marks, "updated_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+        self.paper2_updates += 1
+
+    async def report(self, student_id: str) -> dict:
+        self.reads += 1
+        if self.mode == "pipeline":
+            return await self.report_from_pipeline(student_id)
+        summary = await self.db.student_progress.find_one({"_id": student_id})
+        if summary is None:
+            # Graded before the read model existed - build it once from the sources
+            self.lazy_builds += 1
+            summary = await self.rebuild_student(student_id)
+        return build_report(student_id, summary, self.skills)
+
+    async def report_from_pipeline(self, student_id: str) -> dict:
+        shaped = await self.db.attempts.aggregate(report_pipeline(student_id)).to_list(1)
+        result = shaped[0] if shaped else {}
+        return _finish_report(student_id, result.get("monthly_progress", []), result.get("skill_trends", {}), self.skills)
+
+    async def rebuild_student(self, student_id: str) -> dict:
+        attempts = await self.db.attempts.find({"student_id": student_id, **GRADED}, ATTEMPT_FIELDS).to_list(None)
+        exams = await self._exam_meta(a["exam_id"] for a in attempts)
+        paper2 = await _marked_paper2(self.db, [student_id])
+        ranks = await student_ranks(self.db, [student_id])
+        summary = _summary(attempts, exams, paper2.get(student_id, {}), ranks.get(student_id, {}))
+        # $set (not replace): merges with any grading recorded meanwhile
+        await self.db.student_progress.update_one(
+            {"_id": student_id},
+            {"$set": {
+                **{f"attempts.{k}": v for k, v in summary["attempts"].items()},
+                **{f"paper2.{k}": v for k, v in summary["paper2"].items()},
+                **{f"ranks.{k}": v for k, v in summary["ranks"].items()},
+                "updated_at": summary["updated_at"]
+            }},
+            upsert=True
+        )
+        return summary
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "paper1_updates": self.paper1_updates,
+            "paper2_updates": self.paper2_updates,
+            "reads": self.reads,
+            "lazy_builds": self.lazy_builds,
+        }
+
+
+def _summary(attempts: List[dict], exams: Dict[str, dict], paper2: Dict[str, int], ranks: Dict[str, dict]) -> dict:
+    return {
+        "attempts": {a["id"]: attempt_entry(a, exams[a["exam_id"]]) for a in attempts if a["exam_id"] in exams},
+        "paper2": paper2,
+        "ranks": ranks,
+        "updated_at": datetime.now(timezone.utc)
+    }
+
+
+async def _marked_paper2(db, student_ids: List[str]) -> Dict[str, Dict[str, int]]:
+    """student id -> exam id -> Paper 2 total (the latest marking wins)"""
+    marks: Dict[str, Dict[str, int]] = {}
+    async for sub in db.paper2_submissions.find(
+        {"student_id": {"$in": student_ids}, "marked_at": {"$exists": True}},
+        {"_id": 0, "student_id": 1, "exam_id": 1, "total_marks": 1}
+    ).sort("marked_at", 1):
+        marks.setdefault(sub["student_id"], {})[sub["exam_id"]] = sub.get("total_marks", 0)
+    return marks
+
+
+async def rebuild_all(db, batch_size: int = 1000, student_id: Optional[str] = None) -> dict:
+    """Regenerate summaries from the source collections, ``batch_size`` students per write"""
+    exams = {exam["id"]: exam async for exam in db.exams.find({}, EXAM_META_FIELDS)}
+    report = {"students": 0, "attempts": 0}
+    query = dict(GRADED, **({"student_id": student_id} if student_id else {}))
+
+    pending: Dict[str, List[dict]] = {}
+
+    async def write(batch: Dict[str, List[dict]]):
+        paper2 = await _marked_paper2(db, list(batch))
+        ranks = await student_ranks(db, list(batch))
+        await db.student_progress.bulk_write([
+            ReplaceOne({"_id": sid}, _summary(attempts, exams, paper2.get(sid, {}), ranks.get(sid, {})), upsert=True)
+            for sid, attempts in batch.items()
+        ], ordered=False)
+        report["students"] += len(batch)
+
+    # Student order: each student's attempts arrive together
+    async for attempt in db.attempts.find(query, ATTEMPT_FIELDS).sort([("student_id", 1), ("submitted_at", 1)]):
+        report["attempts"] += 1
+        if attempt["student_id"] not in pending and len(pending) >= batch_size:
+            await write(pending)
+            pending = {}
+        pending.setdefault(attempt["student_id"], []).append(attempt)
+    if pending:
+        await write(pending)
+    return report
+
+
+async def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Rebuild student progress summaries")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Students per bulk write")
+    parser.add_argument("--student", default=None, help="Only this student id")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL'))
+    db = client[os.environ.get('DB_NAME_EXAM', 'exam_bureau_db')]
+
+    print("📊 Rebuilding student progress summaries")
+    print("=" * 50)
+    report = await rebuild_all(db, args.batch_size, args.student)
+    print(f"✅ Rebuilt {report['students']} students from {report['attempts']} graded attempts")
+
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
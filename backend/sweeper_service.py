@@ -0,0 +1,186 @@
+"""
+Expired-attempt sweeper for the exam platform
+Attempts whose deadline has passed are graded and closed server-side, in
+batches, by whichever worker holds the sweeper lease - so the end of a
+sitting is a steady background job rather than a spike of client submits,
+and papers abandoned in a closed tab still get a score
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from answer_codec_service import with_packed
+from etag_service import as_utc
+from grading_service import AttemptState
+from lease_service import MongoLease
+
+logger = logging.getLogger(__name__)
+
+
+class ExpiredAttemptSweeper:
+    """Grades open attempts past ``deadline + grace_seconds``.
+
+    ``plans`` is the GradingPlanStore, ``codec`` the AnswerCodec;
+    ``before_sweep`` runs first (flush this worker's buffered autosaves),
+    ``on_graded`` receives the attempts each batch graded.
+    """
+
+    def __init__(self, db, plans, codec=None, interval: float = 15,
+                 batch_size: int = 500, grace_seconds: int = 30, lease_ttl: int = 60,
+                 before_sweep: Optional[Callable[[], Awaitable[None]]] = None,
+                 on_graded: Optional[Callable[[List[dict]], Awaitable[None]]] = None):
+        self.db = db
+        self.plans = plans
+        self.codec = codec
+        self.interval = interval
+        self.batch_size = batch_size
+        self.grace_seconds = grace_seconds
+        self.before_sweep = before_sweep
+        self.on_graded = on_graded
+        self.lease = MongoLease(db, "attempt_sweeper", ttl_seconds=lease_ttl)
+        self._task: Optional[asyncio.Task] = None
+
+        self.is_leader = False
+        self.sweeps = 0
+        self.graded = 0
+        self.failed = 0
+        self.errors = 0
+        self.last_sweep_at: Optional[datetime] = None
+        self.last_sweep_seconds = 0.0
+        self.max_lag_seconds = 0.0  # How late the oldest attempt in a batch was graded
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            if self.is_leader:
+                await self.lease.release()
+                self.is_leader = False
+
+    async def _run(self):
+        while True:
+            try:
+                self.is_leader = await self.lease.acquire()
+                if self.is_leader:
+                    await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Attempt sweeper error: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def sweep(self) -> int:
+        """Grade every expired attempt, one batch at a time"""
+        started = time.perf_counter()
+        if self.before_sweep is not None:
+            await self.before_sweep()
+
+        total = 0
+        while True:
+            graded = await self.sweep_batch()
+            total += graded
+            if graded < self.batch_size:
+                break
+            await self.lease.renew()
+
+        self.sweeps += 1
+        self.last_sweep_at = datetime.now(timezone.utc)
+        self.last_sweep_seconds = time.perf_counter() - started
+        if total:
+            logger.info(f"✓ Auto-submitted {total} expired attempts ({self.last_sweep_seconds:.2f}s)")
+        return total
+
+    async def sweep_batch(self) -> int:
+        now = datetime.now(timezone.utc)
+        cutoff = now - timedelta(seconds=self.grace_seconds)
+        attempts = await self.db.attempts.find(
+            {"state": AttemptState.IN_PROGRESS.value, "deadline": {"$lt": cutoff}},
+            {"_id": 0, "id": 1, "student_id": 1, "exam_id": 1, "answers": 1, "started_at": 1, "deadline": 1}
+        ).sort("deadline", 1).limit(self.batch_size).to_list(self.batch_size)
+        if not attempts:
+            return 0
+
+        # One vectorized grading call per exam in the batch
+        by_exam: Dict[str, List[dict]] = {}
+        for attempt in attempts:
+            by_exam.setdefault(attempt["exam_id"], []).append(attempt)
+        plans = await self.plans.get_many(list(by_exam))
+
+        ops, graded = [], []
+        for exam_id, exam_attempts in by_exam.items():
+            plan = plans.get(exam_id)
+            if plan is None:
+                results = [(None, "exam_not_found")] * len(exam_attempts)
+            else:
+                results = plan.grade_isolated([a.get("answers") or {} for a in exam_attempts])
+            for attempt, (result, error) in zip(exam_attempts, results):
+                deadline = as_utc(attempt["deadline"])
+                started_at = as_utc(attempt.get("started_at")) or deadline
+                update = {
+                    "submitted_at": now,
+                    # Time is capped at the deadline - the student could not answer after it
+                    "time_taken_seconds": max(0, int((deadline - started_at).total_seconds())),
+                    "is_completed": True,
+                    "auto_submitted": True
+                }
+                packed = None
+                if result is None:
+                    # Closed as failed so it leaves the deadline index instead of blocking every sweep
+                    update.update({"state": AttemptState.FAILED.value, "grading_error": error})
+                    self.failed += 1
+                else:
+                    if self.codec is not None:
+                        try:
+                            packed = await self.codec.pack(plan.layout, attempt.get("answers"))
+                        except Exception as e:
+                            logger.warning(f"Packing answers of attempt {attempt['id']} failed: {e}")
+                    update.update({
+                        "state": AttemptState.GRADED.value,
+                        "score_paper1": result["score"],
+                        "skill_scores": result["skill_scores"],
+                        "skill_percentages": result["skill_percentages"]
+                    })
+                    graded.append({**attempt, **update})
+                # in_progress -> graded; a client submit may have won the race - never grade twice
+                ops.append(UpdateOne({"id": attempt["id"], "state": AttemptState.IN_PROGRESS.value}, with_packed(update, packed)))
+
+        result = await self.db.attempts.bulk_write(ops, ordered=False)
+        self.graded += result.modified_count
+        if self.on_graded is not None and graded:
+            if result.modified_count < len(ops):
+                # Some were submitted by the student meanwhile - report only ours
+                ours = {
+                    a["id"] async for a in self.db.attempts.find(
+                        {"id": {"$in": [a["id"] for a in graded]}, "auto_submitted": True, "submitted_at": now},
+                        {"_id": 0, "id": 1}
+                    )
+                }
+                graded = [a for a in graded if a["id"] in ours]
+            await self.on_graded(graded)
+        self.max_lag_seconds = max(self.max_lag_seconds, (now - as_utc(attempts[0]["deadline"])).total_seconds())
+        return len(attempts)
+
+    def stats(self) -> dict:
+        return {
+            "leader": self.is_leader,
+            "interval_seconds": self.interval,
+            "batch_size": self.batch_size,
+            "grace_seconds": self.grace_seconds,
+            "sweeps": self.sweeps,
+            "graded": self.graded,
+            "failed": self.failed,
+            "errors": self.errors,
+            "last_sweep_at": self.last_sweep_at.isoformat() if self.last_sweep_at else None,
+            "last_sweep_ms": round(self.last_sweep_seconds * 1000, 2),
+            "max_lag_seconds": round(self.max_lag_seconds, 1),
+        }
@@ -0,0 +1,156 @@
+"""
+Test suite for batched autosave
+Tests: POST /api/attempts/{attempt_id}/save-batch sequence handling and the
+/api/attempts/{attempt_id}/ws session channel
+"""
+
+import json
+import pytest
+import requests
+import os
+from websockets.sync.client import connect
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+# Seeded credentials
+TEST_STUDENT_EMAIL = "student@test.com"
+TEST_STUDENT_PASSWORD = "student123"
+
+
+class AttemptFixture:
+    """Shared setup: a started attempt for the seeded student"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Login as the seeded Grade 5 student and start a published exam"""
+        response = requests.post(f"{BASE_URL}/api/login", json={
+            "email": TEST_STUDENT_EMAIL,
+            "password": TEST_STUDENT_PASSWORD
+        })
+        if response.status_code != 200:
+            pytest.skip("Authentication failed - skipping autosave tests")
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        exams = requests.get(f"{BASE_URL}/api/exams", headers=self.headers).json().get("exams", [])
+        if not exams:
+            pytest.skip("No published exams for this student")
+        self.exam_id = exams[0]["id"]
+
+        start = requests.post(f"{BASE_URL}/api/exams/{self.exam_id}/start", headers=self.headers)
+        if start.status_code != 200:
+            pytest.skip("Could not start exam")
+        self.attempt = start.json()["attempt"]
+        self.url = f"{BASE_URL}/api/attempts/{self.attempt['id']}/save-batch"
+        self.next_seq = self.attempt.get("last_seq", 0) + 1
+
+
+class TestSaveBatch(AttemptFixture):
+    """Test sequence-numbered answer batches"""
+
+    def save(self, changes):
+        return requests.post(self.url, json={"changes": changes}, headers=self.headers)
+
+    def test_batch_applies_latest_change(self):
+        """Later changes to the same question win within a batch"""
+        seq = self.next_seq
+        response = self.save([
+            {"question_id": "test_q1", "selected_option": "A", "seq": seq},
+            {"question_id": "test_q1", "selected_option": "B", "seq": seq + 1}
+        ])
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["applied"] is True
+        assert data["last_seq"] == seq + 1
+
+        resume = requests.post(f"{BASE_URL}/api/exams/{self.exam_id}/start", headers=self.headers).json()
+        assert resume["attempt"]["answers"]["test_q1"] == "B"
+        assert resume["attempt"]["last_seq"] == seq + 1
+
+    def test_stale_batch_ignored(self):
+        """A replayed or out-of-order batch does not overwrite newer answers"""
+        seq = self.next_seq
+        assert self.save([{"question_id": "test_q2", "selected_option": "C", "seq": seq + 1}]).json()["applied"]
+
+        stale = self.save([{"question_id": "test_q2", "selected_option": "A", "seq": seq}])
+        assert stale.status_code == 200
+        assert stale.json() == {"applied": False, "saved": 0, "last_seq": seq + 1}
+
+        resume = requests.post(f"{BASE_URL}/api/exams/{self.exam_id}/start", headers=self.headers).json()
+        assert resume["attempt"]["answers"]["test_q2"] == "C"
+
+    def test_duplicate_sequence_rejected(self):
+        """Sequence numbers must be unique within a batch"""
+        response = self.save([
+            {"question_id": "test_q3", "selected_option": "A", "seq": self.next_seq},
+            {"question_id": "test_q3", "selected_option": "B", "seq": self.next_seq}
+        ])
+        assert response.status_code == 400
+
+    def test_field_path_question_id_rejected(self):
+        """Question ids are used as answers.<id> paths - dots and $ are refused"""
+        for question_id in ("1.b", "$set"):
+            response = self.save([{"question_id": question_id, "selected_option": "A", "seq": self.next_seq}])
+            assert response.status_code == 422
+
+    def test_unknown_attempt(self):
+        """Saving to another attempt id returns 404"""
+        response = requests.post(
+            f"{BASE_URL}/api/attempts/nonexistent-attempt/save-batch",
+            json={"changes": [{"question_id": "q", "selected_option": "A", "seq": 1}]},
+            headers=self.headers
+        )
+        assert response.status_code == 404
+
+
+class TestSessionSocket(AttemptFixture):
+    """Test answer deltas, heartbeats and resume over the WebSocket"""
+
+    def ws_url(self):
+        base = BASE_URL.replace("https://", "wss://").replace("http://", "ws://")
+        return f"{base}/api/attempts/{self.attempt['id']}/ws"
+
+    def auth(self, ws, token=None):
+        token = token or self.headers["Authorization"].split(" ", 1)[1]
+        ws.send(json.dumps({"type": "auth", "token": token}))
+
+    def test_answers_acked_and_resumed(self):
+        """Acked deltas are reflected in last_seq of the next hello"""
+        seq = self.next_seq
+        with connect(self.ws_url()) as ws:
+            self.auth(ws)
+            hello = json.loads(ws.recv())
+            assert hello["type"] == "hello"
+            assert hello["last_seq"] == seq - 1
+            assert hello["remaining_seconds"] >= 0
+
+            ws.send(json.dumps({"type": "answers", "changes": [
+                {"question_id": "ws_q1", "selected_option": "A", "seq": seq}
+            ]}))
+            ack = json.loads(ws.recv())
+            assert ack["type"] == "ack"
+            assert ack["applied"] is True
+
+            ws.send(json.dumps({"type": "ping", "t": 42}))
+            pong = json.loads(ws.recv())
+            assert pong["type"] == "pong" and pong["t"] == 42
+
+        with connect(self.ws_url()) as ws:
+            self.auth(ws)
+            assert json.loads(ws.recv())["last_seq"] == seq
+
+    def test_invalid_token_closes(self):
+        """A bad token closes the socket with 4401"""
+        with connect(self.ws_url()) as ws:
+            self.auth(ws, token="invalid")
+            with pytest.raises(Exception):
+                ws.recv()
+            assert ws.close_code == 4401
+
+    def test_first_frame_must_authenticate(self):
+        """Any other first frame closes the socket with 4401"""
+        with connect(self.ws_url()) as ws:
+            ws.send(json.dumps({"type": "ping", "t": 1}))
+            with pytest.raises(Exception):
+                ws.recv()
+            assert ws.close_code == 4401
@@ -0,0 +1,80 @@
+"""
+Test suite for exam cohort statistics
+Tests: GET /api/exams/{exam_id}/stats and
+GET /api/exams/{exam_id}/stats/students/{student_id}
+"""
+
+import time
+import uuid
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+# Seeded credentials
+TEST_STUDENT_EMAIL = "student@test.com"
+TEST_STUDENT_PASSWORD = "student123"
+
+
+class TestCohortStats:
+    """Test the score distribution and a student's position in it"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        response = requests.post(f"{BASE_URL}/api/login", json={"email": TEST_STUDENT_EMAIL, "password": TEST_STUDENT_PASSWORD})
+        if response.status_code != 200:
+            pytest.skip("Authentication failed - skipping cohort stats tests")
+        data = response.json()
+        self.headers = {"Authorization": f"Bearer {data['access_token']}"}
+        self.student_id = data["user"]["id"]
+        exams = requests.get(f"{BASE_URL}/api/exams", headers=self.headers).json().get("exams", [])
+        if not exams:
+            pytest.skip("No published exams for this student")
+        self.exam_id = exams[0]["id"]
+
+    def submit_attempt(self):
+        start = requests.post(f"{BASE_URL}/api/exams/{self.exam_id}/start", headers=self.headers)
+        if start.status_code != 200:
+            pytest.skip("Could not start exam")
+        attempt_id = start.json()["attempt"]["id"]
+        response = requests.post(
+            f"{BASE_URL}/api/attempts/{attempt_id}/submit",
+            headers={**self.headers, "Idempotency-Key": str(uuid.uuid4())}
+        )
+        if response.status_code != 200:
+            pytest.skip("Submit not graded synchronously")
+        return response.json()
+
+    def test_stats_include_new_submission(self):
+        """A graded submit invalidates the cached distribution"""
+        self.submit_attempt()
+        stats = requests.get(f"{BASE_URL}/api/exams/{self.exam_id}/stats", headers=self.headers).json()
+        assert stats["count"] >= 1
+        assert sum(stats["histogram"]["counts"]) == stats["count"]
+        assert stats["min"] <= stats["percentiles"]["p50"] <= stats["max"]
+
+        result = self.submit_attempt()
+        # Cohort invalidation is coalesced (COHORT_INVALIDATE_SECONDS) - allow one interval
+        deadline = time.time() + 15
+        while True:
+            position = requests.get(
+                f"{BASE_URL}/api/exams/{self.exam_id}/stats/students/{self.student_id}", headers=self.headers
+            ).json()
+            if position["score"] == result["score"] or time.time() > deadline:
+                break
+            time.sleep(0.5)
+        assert position["score"] == result["score"]
+        assert 0 <= position["percentile"] <= 100
+        assert "z_score" in position
+
+    def test_other_student_forbidden(self):
+        """Students only see their own position"""
+        response = requests.get(
+            f"{BASE_URL}/api/exams/{self.exam_id}/stats/students/someone_else", headers=self.headers
+        )
+        assert response.status_code == 403
+
+    def test_unknown_exam(self):
+        response = requests.get(f"{BASE_URL}/api/exams/{uuid.uuid4()}/stats", headers=self.headers)
+        assert response.status_code == 404
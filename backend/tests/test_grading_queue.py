@@ -0,0 +1,68 @@
+"""
+Test suite for queued grading
+Tests: POST /api/attempts/{attempt_id}/submit answering 202 in queued submit
+mode and GET /api/attempts/{attempt_id}/result once the queue has graded it
+"""
+
+import time
+import uuid
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+# Seeded credentials
+TEST_STUDENT_EMAIL = "student@test.com"
+TEST_STUDENT_PASSWORD = "student123"
+TEST_ADMIN_EMAIL = "admin@test.com"
+TEST_ADMIN_PASSWORD = "admin123"
+
+
+def login(email, password):
+    response = requests.post(f"{BASE_URL}/api/login", json={"email": email, "password": password})
+    if response.status_code != 200:
+        pytest.skip("Authentication failed - skipping grading queue tests")
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+class TestQueuedSubmit:
+    """Test that a queued submit is graded by the queue workers"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        admin = login(TEST_ADMIN_EMAIL, TEST_ADMIN_PASSWORD)
+        metrics = requests.get(f"{BASE_URL}/api/admin/metrics", headers=admin).json()
+        if metrics["grading_queue"]["submit_mode"] != "queued":
+            pytest.skip("Server grades submits synchronously (SUBMIT_MODE=sync)")
+
+        self.headers = login(TEST_STUDENT_EMAIL, TEST_STUDENT_PASSWORD)
+        exams = requests.get(f"{BASE_URL}/api/exams", headers=self.headers).json().get("exams", [])
+        if not exams:
+            pytest.skip("No published exams for this student")
+        start = requests.post(f"{BASE_URL}/api/exams/{exams[0]['id']}/start", headers=self.headers)
+        if start.status_code != 200:
+            pytest.skip("Could not start exam")
+        self.attempt = start.json()["attempt"]
+
+    def test_queued_submit_reaches_graded(self):
+        """Submit answers 202 with a receipt; the result is served once graded"""
+        response = requests.post(
+            f"{BASE_URL}/api/attempts/{self.attempt['id']}/submit",
+            headers={**self.headers, "Idempotency-Key": str(uuid.uuid4())}
+        )
+        assert response.status_code == 202
+        receipt = response.json()
+        assert receipt["status"] == "queued"
+        assert receipt["attempt_id"] == self.attempt["id"]
+
+        deadline = time.time() + 15
+        while time.time() < deadline:
+            response = requests.get(f"{BASE_URL}{receipt['result_url']}", headers=self.headers)
+            if response.status_code != 202:
+                break
+            time.sleep(0.5)
+        assert response.status_code == 200
+        result = response.json()
+        assert 0 <= result["score"] <= result["total"]
+        assert "skill_scores" in result
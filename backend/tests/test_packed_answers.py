@@ -0,0 +1,73 @@
+"""
+Test suite for packed answer storage
+Tests: GET /api/attempts/{attempt_id}/result?include_answers=true after submit
+"""
+
+import time
+import uuid
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+# Seeded credentials
+TEST_STUDENT_EMAIL = "student@test.com"
+TEST_STUDENT_PASSWORD = "student123"
+
+
+class TestPackedAnswers:
+    """Test that graded answers round-trip through their packed form"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Login as the seeded Grade 5 student and start a published exam"""
+        response = requests.post(f"{BASE_URL}/api/login", json={
+            "email": TEST_STUDENT_EMAIL,
+            "password": TEST_STUDENT_PASSWORD
+        })
+        if response.status_code != 200:
+            pytest.skip("Authentication failed - skipping packed answer tests")
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        exams = requests.get(f"{BASE_URL}/api/exams", headers=self.headers).json().get("exams", [])
+        if not exams:
+            pytest.skip("No published exams for this student")
+        self.exam_id = exams[0]["id"]
+
+        start = requests.post(f"{BASE_URL}/api/exams/{self.exam_id}/start", headers=self.headers)
+        if start.status_code != 200:
+            pytest.skip("Could not start exam")
+        self.attempt = start.json()["attempt"]
+        self.next_seq = self.attempt.get("last_seq", 0) + 1
+
+    def submit(self, key=None):
+        headers = dict(self.headers)
+        if key:
+            headers["Idempotency-Key"] = key
+        return requests.post(f"{BASE_URL}/api/attempts/{self.attempt['id']}/submit", headers=headers)
+
+    def graded(self, response):
+        # Queued submit mode answers 202 first
+        deadline = time.time() + 10
+        while response.status_code == 202 and time.time() < deadline:
+            time.sleep(0.5)
+            response = requests.get(f"{BASE_URL}/api/attempts/{self.attempt['id']}/result", headers=self.headers)
+        return response
+
+    def test_submitted_answers_returned(self):
+        """include_answers returns the graded answers, however they are stored"""
+        seq = self.next_seq
+        assert requests.post(f"{BASE_URL}/api/attempts/{self.attempt['id']}/save-batch", json={"changes": [
+            {"question_id": "1", "selected_option": "A", "seq": seq},
+            {"question_id": "2", "selected_option": "C", "seq": seq + 1}
+        ]}, headers=self.headers).status_code == 200
+        assert self.graded(self.submit(str(uuid.uuid4()))).status_code == 200
+
+        response = requests.get(
+            f"{BASE_URL}/api/attempts/{self.attempt['id']}/result",
+            params={"include_answers": "true"}, headers=self.headers
+        )
+        assert response.status_code == 200
+        answers = response.json()["answers"]
+        assert answers["1"] == "A" and answers["2"] == "C"
@@ -0,0 +1,76 @@
+"""
+Test suite for offline answer-log reconciliation
+Tests: POST /api/attempts/{attempt_id}/reconcile
+"""
+
+import time
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+# Seeded credentials
+TEST_STUDENT_EMAIL = "student@test.com"
+TEST_STUDENT_PASSWORD = "student123"
+
+
+class TestReconcile:
+    """Test merging an offline answer log"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Login as the seeded Grade 5 student and start a published exam"""
+        response = requests.post(f"{BASE_URL}/api/login", json={
+            "email": TEST_STUDENT_EMAIL,
+            "password": TEST_STUDENT_PASSWORD
+        })
+        if response.status_code != 200:
+            pytest.skip("Authentication failed - skipping reconcile tests")
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        exams = requests.get(f"{BASE_URL}/api/exams", headers=self.headers).json().get("exams", [])
+        if not exams:
+            pytest.skip("No published exams for this student")
+        self.exam_id = exams[0]["id"]
+
+        start = requests.post(f"{BASE_URL}/api/exams/{self.exam_id}/start", headers=self.headers)
+        if start.status_code != 200:
+            pytest.skip("Could not start exam")
+        self.attempt = start.json()["attempt"]
+        self.next_seq = self.attempt.get("last_seq", 0) + 1
+
+    def reconcile(self, entries):
+        return requests.post(
+            f"{BASE_URL}/api/attempts/{self.attempt['id']}/reconcile",
+            json={"entries": entries}, headers=self.headers
+        )
+
+    def test_last_writer_wins(self):
+        """Latest (client_ts, seq) per question wins; replaying the log changes nothing"""
+        seq = self.next_seq
+        now = int(time.time() * 1000)
+        entries = [
+            {"question_id": "rq1", "selected_option": "A", "client_ts": now, "seq": seq},
+            {"question_id": "rq1", "selected_option": "B", "client_ts": now + 1000, "seq": seq + 1},
+            {"question_id": "rq2", "selected_option": "C", "client_ts": now, "seq": seq + 2}
+        ]
+        response = self.reconcile(list(reversed(entries)))
+        assert response.status_code == 200
+        data = response.json()
+        assert data["answers"] == {"rq1": "B", "rq2": "C"}
+        assert data["last_seq"] >= seq + 2
+
+        # An older write from another device loses
+        stale = self.reconcile([{"question_id": "rq1", "selected_option": "D", "client_ts": now + 500, "seq": seq + 3}])
+        assert stale.json()["answers"] == {"rq1": "B"}
+        assert stale.json()["applied"] == 0
+
+        assert self.reconcile(entries).json()["answers"] == {"rq1": "B", "rq2": "C"}
+        resume = requests.post(f"{BASE_URL}/api/exams/{self.exam_id}/start", headers=self.headers).json()
+        assert resume["attempt"]["answers"]["rq1"] == "B"
+
+    def test_invalid_question_id_rejected(self):
+        """Question ids are used as field paths - no dots or leading $"""
+        response = self.reconcile([{"question_id": "a.b", "selected_option": "A", "client_ts": 1, "seq": self.next_seq}])
+        assert response.status_code == 422
@@ -0,0 +1,77 @@
+"""
+Test suite for saves after submit
+Tests: POST /api/attempts/{attempt_id}/save-batch and /save once the attempt
+has left in_progress
+"""
+
+import time
+import uuid
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+# Seeded credentials
+TEST_STUDENT_EMAIL = "student@test.com"
+TEST_STUDENT_PASSWORD = "student123"
+
+
+class TestSaveAfterSubmit:
+    """Test that answers are frozen once the attempt is submitted"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Login as the seeded Grade 5 student and start a published exam"""
+        response = requests.post(f"{BASE_URL}/api/login", json={
+            "email": TEST_STUDENT_EMAIL,
+            "password": TEST_STUDENT_PASSWORD
+        })
+        if response.status_code != 200:
+            pytest.skip("Authentication failed - skipping save-after-submit tests")
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        exams = requests.get(f"{BASE_URL}/api/exams", headers=self.headers).json().get("exams", [])
+        if not exams:
+            pytest.skip("No published exams for this student")
+        self.exam_id = exams[0]["id"]
+
+        start = requests.post(f"{BASE_URL}/api/exams/{self.exam_id}/start", headers=self.headers)
+        if start.status_code != 200:
+            pytest.skip("Could not start exam")
+        self.attempt = start.json()["attempt"]
+        self.next_seq = self.attempt.get("last_seq", 0) + 1
+
+    def submit(self, key=None):
+        headers = dict(self.headers)
+        if key:
+            headers["Idempotency-Key"] = key
+        return requests.post(f"{BASE_URL}/api/attempts/{self.attempt['id']}/submit", headers=headers)
+
+    def graded(self, response):
+        # Queued submit mode answers 202 first
+        deadline = time.time() + 10
+        while response.status_code == 202 and time.time() < deadline:
+            time.sleep(0.5)
+            response = requests.get(f"{BASE_URL}/api/attempts/{self.attempt['id']}/result", headers=self.headers)
+        return response
+
+    def test_save_after_submit_rejected(self):
+        """Answers are frozen once the attempt leaves in_progress"""
+        assert self.graded(self.submit(str(uuid.uuid4()))).status_code == 200
+        response = requests.post(
+            f"{BASE_URL}/api/attempts/{self.attempt['id']}/save-batch",
+            json={"changes": [{"question_id": "late_q", "selected_option": "A", "seq": self.next_seq}]},
+            headers=self.headers
+        )
+        assert response.status_code == 400
+
+    def test_legacy_save_after_submit_rejected(self):
+        """The single-answer save endpoint is frozen after submit too"""
+        assert self.graded(self.submit(str(uuid.uuid4()))).status_code == 200
+        response = requests.post(
+            f"{BASE_URL}/api/attempts/{self.attempt['id']}/save",
+            json={"question_id": "late_q", "selected_option": "A"},
+            headers=self.headers
+        )
+        assert response.status_code == 400
@@ -0,0 +1,88 @@
+"""
+Test suite for the expired-attempt sweeper
+Tests: an attempt left open past its deadline is graded server-side and a
+late POST /api/attempts/{attempt_id}/submit reports it as auto-submitted
+"""
+
+import time
+import uuid
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+# Seeded credentials
+TEST_TEACHER_EMAIL = "teacher@test.com"
+TEST_TEACHER_PASSWORD = "teacher123"
+TEST_ADMIN_EMAIL = "admin@test.com"
+TEST_ADMIN_PASSWORD = "admin123"
+
+# The longest sweep wait this suite accepts (SWEEP_GRACE_SECONDS + 2 x SWEEP_INTERVAL_SECONDS)
+MAX_WAIT_SECONDS = 90
+
+
+def login(email, password):
+    response = requests.post(f"{BASE_URL}/api/login", json={"email": email, "password": password})
+    if response.status_code != 200:
+        pytest.skip("Authentication failed - skipping sweeper tests")
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+class TestExpiredAttemptSweeper:
+    """Test auto-submission of attempts whose time ran out"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        admin = login(TEST_ADMIN_EMAIL, TEST_ADMIN_PASSWORD)
+        sweeper = requests.get(f"{BASE_URL}/api/admin/metrics", headers=admin).json()["attempt_sweeper"]
+        self.wait = sweeper["grace_seconds"] + 2 * sweeper["interval_seconds"] + 5
+        if self.wait > MAX_WAIT_SECONDS:
+            pytest.skip("Sweeper too slow for this suite - lower SWEEP_INTERVAL_SECONDS/SWEEP_GRACE_SECONDS")
+
+        # A zero-length Grade 4 exam taken by a fresh student, so the seeded
+        # Grade 5 exams other suites pick are left alone
+        teacher = login(TEST_TEACHER_EMAIL, TEST_TEACHER_PASSWORD)
+        exam = requests.post(f"{BASE_URL}/api/exams/create", json={
+            "title": "Sweeper test",
+            "grade": "grade_4",
+            "month": "2099-01",
+            "duration_minutes": 0,
+            "paper1_questions": [{
+                "id": "1", "question_number": 1, "question_text": "1 + 1", "options": ["2", "3"],
+                "correct_answer": "A", "skill_area": "mathematical_reasoning", "marks": 1
+            }]
+        }, headers=teacher).json()
+        assert requests.put(f"{BASE_URL}/api/exams/{exam['id']}/publish", headers=teacher).status_code == 200
+
+        email = f"sweeper_{uuid.uuid4().hex[:8]}@test.com"
+        requests.post(f"{BASE_URL}/api/register", json={
+            "email": email, "password": "sweeper123", "full_name": "Sweeper Test", "role": "student", "grade": "grade_4"
+        })
+        self.headers = login(email, "sweeper123")
+        start = requests.post(f"{BASE_URL}/api/exams/{exam['id']}/start", headers=self.headers)
+        assert start.status_code == 200
+        self.attempt = start.json()["attempt"]
+
+    def test_expired_attempt_auto_submitted(self):
+        """The sweeper grades the saved answers without a client submit"""
+        assert requests.post(
+            f"{BASE_URL}/api/attempts/{self.attempt['id']}/save-batch",
+            json={"changes": [{"question_id": "1", "selected_option": "A", "seq": 1}]},
+            headers=self.headers
+        ).status_code == 200
+
+        deadline = time.time() + self.wait
+        while time.time() < deadline:
+            response = requests.get(f"{BASE_URL}/api/attempts/{self.attempt['id']}/result", headers=self.headers)
+            if response.status_code == 200:
+                break
+            time.sleep(1)
+        assert response.status_code == 200
+        assert response.json()["score"] == 1
+
+        # A submit arriving after the sweep is answered with the sweeper's result
+        late = requests.post(f"{BASE_URL}/api/attempts/{self.attempt['id']}/submit", headers=self.headers)
+        assert late.status_code == 200
+        assert late.json()["auto_submitted"] is True
+        assert late.json()["score"] == 1
@@ -0,0 +1,142 @@
+"""
+Access/refresh token service for the exam platform
+Short-lived access tokens carry signed role/grade claims so read-only
+endpoints can authorize without a users lookup; long-lived refresh tokens
+are opaque, stored hashed in MongoDB and rotated on every use
+"""
+
+import hashlib
+import logging
+import os
+import secrets
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+import jwt
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+ACCESS_TOKEN_MINUTES = int(os.environ.get('ACCESS_TOKEN_MINUTES', 15))
+REFRESH_TOKEN_DAYS = int(os.environ.get('REFRESH_TOKEN_DAYS', 7))
+
+
+class InvalidRefreshToken(Exception):
+    """Refresh token unknown, expired, revoked or replayed"""
+
+
+class TokenPrincipal(BaseModel):
+    """Caller identity rebuilt from access-token claims (no database hit)"""
+    id: str
+    role: str
+    grade: Optional[str] = None
+    assigned_language: Optional[str] = None
+    linked_student_id: Optional[str] = None
+
+
+def build_access_claims(user: dict) -> dict:
+    """Claims embedded in an access token for the given user document"""
+    claims = {
+        "sub": user["id"],
+        "role": user["role"],
+        "grade": user.get("grade"),
+        "lang": user.get("assigned_language"),
+    }
+    if user.get("linked_student_id"):
+        claims["lsid"] = user["linked_student_id"]
+    return claims
+
+
+def create_access_token(claims: dict, secret_key: str, algorithm: str) -> str:
+    now = datetime.now(timezone.utc)
+    to_encode = dict(claims)
+    to_encode.update({
+        "typ": "access",
+        "iat": now,
+        "exp": now + timedelta(minutes=ACCESS_TOKEN_MINUTES),
+    })
+    return jwt.encode(to_encode, secret_key, algorithm=algorithm)
+
+
+def principal_from_claims(payload: dict) -> Optional[TokenPrincipal]:
+    """Build a principal from a decoded token, or None for legacy tokens without claims"""
+    if payload.get("typ") != "access" or not payload.get("role"):
+        return None
+    return TokenPrincipal(
+        id=payload["sub"],
+        role=payload["role"],
+        grade=payload.get("grade"),
+        assigned_language=payload.get("lang"),
+        linked_student_id=payload.get("lsid"),
+    )
+
+
+def principal_from_user(user: dict) -> TokenPrincipal:
+    """Principal of a user document - the same fields an access token would carry"""
+    return principal_from_claims({**build_access_claims(user), "typ": "access"})
+
+
+def _digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class RefreshTokenStore:
+    """Opaque refresh tokens with rotation and a revocation list.
+
+    Each token belongs to a family started at login. Using a token revokes it
+    and issues the next one in the same family; presenting an already-rotated
+    token again is treated as theft and revokes the whole family.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    async def issue(self, user_id: str, family_id: Optional[str] = None) -> str:
+        token = secrets.token_urlsafe(32)
+        now = datetime.now(timezone.utc)
+        await self.db.refresh_tokens.insert_one({
+            "_id": _digest(token),
+            "user_id": user_id,
+            "family_id": family_id or str(uuid.uuid4()),
+            "created_at": now,
+            "expires_at": now + timedelta(days=REFRESH_TOKEN_DAYS),
+            "revoked": False,
+        })
+        return token
+
+    async def rotate(self, token: str) -> Tuple[str, str]:
+        """Consume a refresh token; returns (user_id, next refresh token)"""
+        now = datetime.now(timezone.utc)
+        doc = await self.db.refresh_tokens.find_one_and_update(
+            {"_id": _digest(token), "revoked": False, "expires_at": {"$gt": now}},
+            {"$set": {"revoked": True, "revoked_reason": "rotated", "revoked_at": now}}
+        )
+        if not doc:
+            stale = await self.db.refresh_tokens.find_one({"_id": _digest(token)})
+            if stale and stale.get("revoked_reason") == "rotated":
+                logger.warning(f"Refresh token reuse detected for user {stale['user_id']}, revoking family")
+                await self.revoke_family(stale["family_id"], reason="reuse_detected")
+            raise InvalidRefreshToken()
+
+        next_token = await self.issue(doc["user_id"], family_id=doc["family_id"])
+        return doc["user_id"], next_token
+
+    async def revoke(self, token: str, reason: str = "logout"):
+        await self.db.refresh_tokens.update_one(
+            {"_id": _digest(token), "revoked": False},
+            {"$set": {"revoked": True, "revoked_reason": reason, "revoked_at": datetime.now(timezone.utc)}}
+        )
+
+    async def revoke_family(self, family_id: str, reason: str):
+        await self.db.refresh_tokens.update_many(
+            {"family_id": family_id, "revoked": False},
+            {"$set": {"revoked": True, "revoked_reason": reason, "revoked_at": datetime.now(timezone.utc)}}
+        )
+
+    async def revoke_user(self, user_id: str, reason: str):
+        """Revoke every live refresh token of a user (deactivation, role/grade change)"""
+        await self.db.refresh_tokens.update_many(
+            {"user_id": user_id, "revoked": False},
+            {"$set": {"revoked": True, "revoked_reason": reason, "revoked_at": datetime.now(timezone.utc)}}
+        )
@@ -19,13 +19,52 @@ axios.interceptors.request.use(
   }
 );
 
+// Access tokens are short-lived; exchange the refresh token once for all
+// requests that fail together, then replay them with the new token
+let refreshPromise = null;
+// AuthProvider listens so the context token follows refreshes done here
+const tokenListeners = new Set();
+
+export const refreshAccessToken = () => {
+  if (!refreshPromise) {
+    const refreshToken = localStorage.getItem('exam_refresh_token');
+    refreshPromise = axios
+      .post(`${API}/token/refresh`, { refresh_token: refreshToken })
+      .then((response) => {
+        localStorage.setItem('exam_token', response.data.access_token);
+        localStorage.setItem('exam_refresh_token', response.data.refresh_token);
+        tokenListeners.forEach((listener) => listener(response.data.access_token));
+        return response.data.access_token;
+      })
+      .finally(() => {
+        refreshPromise = null;
+      });
+  }
+  return refreshPromise;
+};
+
 // Add response interceptor for handling 401 errors
 axios.interceptors.response.use(
   (response) => response,
-  (error) => {
+  async (error) => {
+    const original = error.config;
     if (error.response?.status === 401) {
+      const canRefresh = localStorage.getItem('exam_refresh_token')
+        && original && !original._retried
+        && !original.url.includes('/token/refresh');
+      if (canRefresh) {
+        original._retried = true;
+        try {
+          const newToken = await refreshAccessToken();
+          original.headers.Authorization = `Bearer ${newToken}`;
+          return axios(original);
+        } catch (refreshError) {
+          // Fall through to logout
+        }
+      }
       // Token expired or invalid, logout
       localStorage.removeItem('exam_token');
+      localStorage.removeItem('exam_refresh_token');
       localStorage.removeItem('exam_user');
       window.location.href = '/login';
     }
@@ -49,22 +88,33 @@ export const AuthProvider = ({ children }) => {
     setLoading(false);
   }, []);
 
+  useEffect(() => {
+    tokenListeners.add(setToken);
+    return () => tokenListeners.delete(setToken);
+  }, []);
+
   const login = async (email, password) => {
     const response = await axios.post(`${API}/login`, { email, password });
-    const { access_token, user: userData } = response.data;
+    const { access_token, refresh_token, user: userData } = response.data;
     
     setToken(access_token);
     setUser(userData);
     localStorage.setItem('exam_token', access_token);
+    localStorage.setItem('exam_refresh_token', refresh_token);
     localStorage.setItem('exam_user', JSON.stringify(userData));
     
     return userData;
   };
 
   const logout = () => {
+    const refreshToken = localStorage.getItem('exam_refresh_token');
+    if (refreshToken) {
+      axios.post(`${API}/logout`, { refresh_token: refreshToken }).catch(() => {});
+    }
     setToken(null);
     setUser(null);
     localStorage.removeItem('exam_token');
+    localStorage.removeItem('exam_refresh_token');
     localStorage.removeItem('exam_user');
   };
 
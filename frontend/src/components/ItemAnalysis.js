@@ -0,0 +1,177 @@
+import React, { useState, useEffect } from 'react';
+import { useAuth, API } from '../AuthContext';
+import axios from 'axios';
+import { X, RefreshCw, AlertTriangle } from 'lucide-react';
+
+const FLAG_LABELS = {
+  too_easy: 'Too easy',
+  too_hard: 'Too hard',
+  low_discrimination: 'Low discrimination',
+  negative_discrimination: 'Negative discrimination',
+  distractor_attracts_top_scorers: 'Distractor attracts top scorers',
+  unused_distractor: 'Unused distractor'
+};
+
+const percent = (value) => (value === null || value === undefined ? '-' : `${Math.round(value * 100)}%`);
+
+const ItemAnalysis = ({ exam, onClose }) => {
+  const { token } = useAuth();
+  const [analysis, setAnalysis] = useState(null);
+  const [loading, setLoading] = useState(true);
+  const [running, setRunning] = useState(false);
+  const [flaggedOnly, setFlaggedOnly] = useState(false);
+
+  const headers = { Authorization: `Bearer ${token}` };
+
+  useEffect(() => {
+    loadAnalysis();
+  }, []);
+
+  const loadAnalysis = async () => {
+    try {
+      const response = await axios.get(`${API}/exams/${exam.id}/item-analysis`, { headers });
+      setAnalysis(response.data);
+    } catch (error) {
+      if (error.response?.status !== 404) {
+        console.error('Failed to load item analysis:', error);
+      }
+      setAnalysis(null);
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  const runAnalysis = async () => {
+    setRunning(true);
+    try {
+      await axios.post(`${API}/exams/${exam.id}/item-analysis`, {}, { headers });
+      await loadAnalysis();
+    } catch (error) {
+      alert('Error: ' + (error.response?.data?.detail || error.message));
+    } finally {
+      setRunning(false);
+    }
+  };
+
+  const items = (analysis?.items || []).filter(item => !flaggedOnly || item.flags.length > 0);
+
+  return (
+    <div className="fixed inset-0 bg-black bg-opacity-50 flex items-center justify-center z-50 p-4" onClick={onClose}>
+      <div
+        className="bg-white rounded-2xl shadow-2xl w-full max-w-5xl max-h-[90vh] overflow-y-auto"
+        onClick={(e) => e.stopPropagation()}
+      >
+        {/* Header */}
+        <div className="sticky top-0 bg-white border-b-2 border-[#E5E7EB] p-6 flex justify-between items-center z-10">
+          <div>
+            <h2 className="text-2xl font-bold text-[#1F2937]" style={{fontFamily: 'Manrope, sans-serif'}}>
+              Item Analysis
+            </h2>
+            <p className="text-sm text-[#6B7280] mt-1">{exam.title}</p>
+          </div>
+          <div className="flex gap-2">
+            <button
+              onClick={runAnalysis}
+              disabled={running}
+              className="px-4 py-2 bg-blue-600 text-white font-semibold rounded-lg hover:bg-blue-700 text-sm disabled:opacity-50"
+              data-testid="run-item-analysis"
+            >
+              <RefreshCw className={`inline w-4 h-4 mr-1 ${running ? 'animate-spin' : ''}`} />
+              {analysis ? 'Recompute' : 'Run analysis'}
+            </button>
+            <button
+              onClick={onClose}
+              className="p-2 hover:bg-gray-100 rounded-lg transition-colors"
+              data-testid="close-item-analysis"
+            >
+              <X className="w-6 h-6 text-gray-600" />
+            </button>
+          </div>
+        </div>
+
+        <div className="p-6">
+          {loading ? (
+            <div className="text-center py-12">
+              <div className="spinner"></div>
+            </div>
+          ) : !analysis ? (
+            <div className="text-center py-12">
+              <div className="text-6xl mb-4">🔬</div>
+              <p className="text-lg text-[#6B7280] font-semibold">No analysis yet - run it once attempts are graded</p>
+            </div>
+          ) : (
+            <>
+              {/* Summary */}
+              <div className="grid grid-cols-2 md:grid-cols-4 gap-4 mb-6">
+                <div className="p-4 bg-[#FFF7E5] rounded-xl">
+                  <div className="text-2xl font-bold text-[#1F2937]">{analysis.attempts}</div>
+                  <div className="text-xs font-medium text-[#6B7280]">Graded attempts</div>
+                </div>
+                <div className="p-4 bg-[#EFF6FF] rounded-xl">
+                  <div className="text-2xl font-bold text-[#3B82F6]">{analysis.kr20 ?? '-'}</div>
+                  <div className="text-xs font-medium text-[#6B7280]">Reliability (KR-20)</div>
+                </div>
+                <div className="p-4 bg-[#ECFDF5] rounded-xl">
+                  <div className="text-2xl font-bold text-[#10B981]">{analysis.mean_score} ± {analysis.std_score}</div>
+                  <div className="text-xs font-medium text-[#6B7280]">Questions correct (mean ± SD)</div>
+                </div>
+                <div className="p-4 bg-red-50 rounded-xl">
+                  <div className="text-2xl font-bold text-red-600">{analysis.flagged}</div>
+                  <div className="text-xs font-medium text-[#6B7280]">Flagged questions</div>
+                </div>
+              </div>
+
+              <label className="flex items-center gap-2 mb-4 text-sm text-[#374151]">
+                <input type="checkbox" checked={flaggedOnly} onChange={(e) => setFlaggedOnly(e.target.checked)} />
+                Show flagged questions only
+              </label>
+
+              {/* Per question */}
+              <div className="overflow-x-auto">
+                <table className="w-full text-sm" data-testid="item-analysis-table">
+                  <thead>
+                    <tr className="text-left text-[#6B7280] border-b-2 border-[#E5E7EB]">
+                      <th className="py-2 pr-4">Q</th>
+                      <th className="py-2 pr-4">Difficulty (p)</th>
+                      <th className="py-2 pr-4">Discrimination</th>
+                      <th className="py-2 pr-4">Options chosen (top / bottom 27%)</th>
+                      <th className="py-2">Flags</th>
+                    </tr>
+                  </thead>
+                  <tbody>
+                    {items.map(item => (
+                      <tr key={item.question_id} className="border-b border-[#F3F4F6] align-top">
+                        <td className="py-2 pr-4 font-semibold">{item.question_number}</td>
+                        <td className="py-2 pr-4">{item.p_value}</td>
+                        <td className="py-2 pr-4">{item.point_biserial ?? '-'}</td>
+                        <td className="py-2 pr-4">
+                          {item.options.map((option, index) => (
+                            <div key={option.option} className={option.correct ? 'font-semibold text-green-700' : ''}>
+                              {String.fromCharCode(65 + index)}: {percent(option.rate)}
+                              <span className="text-[#9CA3AF]"> ({percent(option.upper_rate)} / {percent(option.lower_rate)})</span>
+                            </div>
+                          ))}
+                          <div className="text-[#9CA3AF]">Omitted: {percent(item.omitted)}</div>
+                        </td>
+                        <td className="py-2">
+                          {item.flags.map(flag => (
+                            <span key={flag} className="inline-flex items-center mr-1 mb-1 px-2 py-0.5 bg-orange-100 text-orange-700 rounded-full text-xs">
+                              <AlertTriangle className="w-3 h-3 mr-1" />
+                              {FLAG_LABELS[flag] || flag}
+                            </span>
+                          ))}
+                        </td>
+                      </tr>
+                    ))}
+                  </tbody>
+                </table>
+              </div>
+            </>
+          )}
+        </div>
+      </div>
+    </div>
+  );
+};
+
+export default ItemAnalysis;
@@ -1,13 +1,13 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { useTranslation } from 'react-i18next';
-import { useAuth, API } from '../AuthContext';
+import { useAuth, API, refreshAccessToken } from '../AuthContext';
 import axios from 'axios';
 import { Clock, Flag, CheckCircle, AlertCircle, BookOpen, ArrowLeft, ArrowRight, Save } from 'lucide-react';
 import dayjs from 'dayjs';
 
 const ExamInterface = () => {
-  const { t } = useTranslation();
+  const { t, i18n } = useTranslation();
   const { examId } = useParams();
   const { token, user } = useAuth();
   const navigate = useNavigate();
@@ -23,6 +23,16 @@ const ExamInterface = () => {
   const [flagged, setFlagged] = useState(new Set());
   const [saving, setSaving] = useState(false);
   const saveTimerRef = useRef(null);
+  // Unacknowledged answer changes, flushed in debounced batches
+  const pendingRef = useRef([]);
+  const seqRef = useRef(0);
+  const flushingRef = useRef(null);
+  // Set when a save failed without a response: the next flush pushes the whole log
+  const offlineRef = useRef(false);
+  // Live session socket: answers, heartbeats and timer sync over one connection
+  const wsRef = useRef(null);
+  // One key per attempt: a retried submit replays the stored result
+  const submitKeyRef = useRef(null);
 
   useEffect(() => {
     startOrResumeExam();
@@ -51,23 +61,104 @@ const ExamInterface = () => {
     return () => clearInterval(timer);
   }, [exam, result, attempt]);
 
-  // Auto-save answers every 10 seconds
+  // Flush pending answer changes 3 seconds after the last click
   useEffect(() => {
-    if (!attempt || result) return;
+    if (!attempt || result || pendingRef.current.length === 0) return;
     
     saveTimerRef.current = setTimeout(() => {
-      saveCurrentAnswers();
-    }, 10000);
+      flushAnswers();
+    }, 3000);
     
     return () => {
       if (saveTimerRef.current) clearTimeout(saveTimerRef.current);
     };
   }, [answers, attempt, result]);
 
+  // Open the session socket once the attempt is known; reconnect with backoff
+  useEffect(() => {
+    if (!attempt || result) return;
+    
+    let closed = false;
+    let retryDelay = 1000;
+    let retryTimer = null;
+    let heartbeat = null;
+    let refreshed = false;
+    
+    const connect = () => {
+      const url = new URL(`${API}/attempts/${attempt.id}/ws`, window.location.href);
+      url.protocol = url.protocol === 'https:' ? 'wss:' : 'ws:';
+      const ws = new WebSocket(url.toString());
+      wsRef.current = ws;
+      
+      // Authenticate in the first frame (a ?token= would be written to access logs),
+      // always with the latest access token - it is refreshed during the exam
+      ws.onopen = () => {
+        ws.send(JSON.stringify({ type: 'auth', token: localStorage.getItem('exam_token') }));
+      };
+      
+      ws.onmessage = (event) => {
+        const message = JSON.parse(event.data);
+        if (message.type === 'hello') {
+          retryDelay = 1000;
+          refreshed = false;
+          // Resume: resend only what the server has not acknowledged
+          seqRef.current = Math.max(seqRef.current, message.last_seq);
+          pendingRef.current = pendingRef.current.filter((c) => c.seq > message.last_seq);
+          setTimeLeft(message.remaining_seconds);
+          if (offlineRef.current) {
+            flushAnswers(true);
+          } else if (pendingRef.current.length > 0) {
+            ws.send(JSON.stringify({ type: 'answers', changes: pendingRef.current.slice() }));
+          }
+        } else if (message.type === 'ack') {
+          pendingRef.current = pendingRef.current.filter((c) => c.seq > message.last_seq);
+          persistLog();
+        } else if (message.type === 'time') {
+          setTimeLeft(message.remaining_seconds);
+        }
+      };
+      
+      ws.onclose = (event) => {
+        if (wsRef.current === ws) wsRef.current = null;
+        // Not found / forbidden / already submitted: stay on HTTP
+        if (closed || [4403, 4404, 4409].includes(event.code)) return;
+        if (event.code === 4401) {
+          // Access token expired: refresh once and reconnect, else stay on HTTP
+          if (refreshed) return;
+          refreshed = true;
+          refreshAccessToken().then(() => { if (!closed) connect(); }, () => {});
+          return;
+        }
+        retryTimer = setTimeout(connect, retryDelay);
+        retryDelay = Math.min(retryDelay * 2, 10000);
+      };
+    };
+    
+    connect();
+    let beats = 0;
+    heartbeat = setInterval(() => {
+      const ws = wsRef.current;
+      if (!ws || ws.readyState !== WebSocket.OPEN) return;
+      beats += 1;
+      // Ping keeps proxies from idling the connection out; resync the timer every minute
+      ws.send(JSON.stringify(beats % 2 === 0 ? { type: 'time' } : { type: 'ping', t: Date.now() }));
+    }, 30000);
+    
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      clearInterval(heartbeat);
+      if (wsRef.current) wsRef.current.close();
+      wsRef.current = null;
+    };
+  }, [attempt, result]);
+
   const startOrResumeExam = async () => {
     try {
+      // Only download the question text for the student's medium
+      const lang = ['en', 'si', 'ta'].includes(i18n.language) ? i18n.language : 'en';
       const response = await axios.post(
-        `${API}/exams/${examId}/start`,
+        `${API}/exams/${examId}/start?lang=${lang}`,
         {},
         { headers: { Authorization: `Bearer ${token}` } }
       );
@@ -78,7 +169,29 @@ const ExamInterface = () => {
       
       setExam(examData);
       setAttempt(attemptData);
-      setAnswers(attemptData.answers || {});
+      seqRef.current = attemptData.last_seq || 0;
+      
+      // Answers recorded offline before a reload are merged server-side
+      const saved = JSON.parse(localStorage.getItem(`exam_${examId}_log`) || 'null');
+      let attemptAnswers = attemptData.answers || {};
+      if (saved && saved.attemptId === attemptData.id && saved.entries.length > 0) {
+        try {
+          const merged = await axios.post(
+            `${API}/attempts/${attemptData.id}/reconcile`,
+            { entries: saved.entries },
+            { headers: { Authorization: `Bearer ${token}` } }
+          );
+          attemptAnswers = { ...attemptAnswers, ...merged.data.answers };
+          seqRef.current = merged.data.last_seq;
+          localStorage.removeItem(`exam_${examId}_log`);
+        } catch (error) {
+          // Still offline: keep the log and send it with the next flush
+          pendingRef.current = saved.entries;
+          seqRef.current = Math.max(seqRef.current, ...saved.entries.map((c) => c.seq));
+          offlineRef.current = true;
+        }
+      }
+      setAnswers(attemptAnswers);
       
       // Calculate time left
       if (isResume && attemptData.started_at) {
@@ -102,28 +215,57 @@ const ExamInterface = () => {
     }
   };
 
-  const saveCurrentAnswers = async () => {
-    if (!attempt || Object.keys(answers).length === 0 || saving) return;
+  const flushAnswers = async (viaHttp = false) => {
+    if (!attempt) return;
+    if (flushingRef.current) return flushingRef.current;
+    if (pendingRef.current.length === 0) return;
+    
+    const ws = wsRef.current;
+    if (!viaHttp && ws && ws.readyState === WebSocket.OPEN) {
+      // Acknowledged asynchronously by an 'ack' frame
+      ws.send(JSON.stringify({ type: 'answers', changes: pendingRef.current.slice() }));
+      return;
+    }
     
+    const batch = pendingRef.current.slice();
     setSaving(true);
-    try {
-      // Save each answer
-      for (const [questionId, selectedOption] of Object.entries(answers)) {
-        await axios.post(
-          `${API}/attempts/${attempt.id}/save`,
-          { question_id: questionId, selected_option: selectedOption },
-          { headers: { Authorization: `Bearer ${token}` } }
-        );
+    flushingRef.current = (async () => {
+      try {
+        if (offlineRef.current) {
+          // Back online: merge the whole buffered log in one request
+          const response = await axios.post(
+            `${API}/attempts/${attempt.id}/reconcile`,
+            { entries: batch },
+            { headers: { Authorization: `Bearer ${token}` } }
+          );
+          const sent = new Set(batch.map((c) => c.seq));
+          pendingRef.current = pendingRef.current.filter((c) => !sent.has(c.seq));
+          offlineRef.current = false;
+          // Reconciled answers may differ where a newer save came from elsewhere
+          setAnswers((prev) => ({ ...prev, ...response.data.answers }));
+        } else {
+          const response = await axios.post(
+            `${API}/attempts/${attempt.id}/save-batch`,
+            { changes: batch },
+            { headers: { Authorization: `Bearer ${token}` } }
+          );
+          // Drop everything the server has (also covers a replayed batch)
+          const { last_seq } = response.data;
+          pendingRef.current = pendingRef.current.filter((c) => c.seq > last_seq);
+        }
+      } catch (error) {
+        console.error('Failed to auto-save:', error);
+        if (!error.response) offlineRef.current = true;
+      } finally {
+        persistLog();
+        flushingRef.current = null;
+        setSaving(false);
       }
-      localStorage.setItem(`exam_${examId}_answers`, JSON.stringify(answers));
-    } catch (error) {
-      console.error('Failed to auto-save:', error);
-    } finally {
-      setSaving(false);
-    }
+    })();
+    return flushingRef.current;
   };
 
-  const handleAnswerSelect = async (questionId, option) => {
+  const handleAnswerSelect = (questionId, option) => {
     const newAnswers = {
       ...answers,
       [questionId]: option
@@ -131,15 +273,23 @@ const ExamInterface = () => {
     setAnswers(newAnswers);
     localStorage.setItem(`exam_${examId}_answers`, JSON.stringify(newAnswers));
     
-    // Save immediately on answer selection
-    try {
-      await axios.post(
-        `${API}/attempts/${attempt.id}/save`,
-        { question_id: questionId, selected_option: option },
-        { headers: { Authorization: `Bearer ${token}` } }
-      );
-    } catch (error) {
-      console.error('Failed to save answer:', error);
+    seqRef.current += 1;
+    pendingRef.current.push({
+      question_id: questionId,
+      selected_option: option,
+      seq: seqRef.current,
+      client_ts: Date.now()
+    });
+    persistLog();
+  };
+
+  // Unsaved changes survive a reload while offline
+  const persistLog = () => {
+    if (!attempt) return;
+    if (pendingRef.current.length === 0) {
+      localStorage.removeItem(`exam_${examId}_log`);
+    } else {
+      localStorage.setItem(`exam_${examId}_log`, JSON.stringify({ attemptId: attempt.id, entries: pendingRef.current }));
     }
   };
 
@@ -155,14 +305,43 @@ const ExamInterface = () => {
 
     setSubmitting(true);
     try {
-      const response = await axios.post(
-        `${API}/attempts/${attempt.id}/submit`,
-        {},
-        { headers: { Authorization: `Bearer ${token}` } }
-      );
+      // Make sure the last answers are saved before grading
+      if (saveTimerRef.current) clearTimeout(saveTimerRef.current);
+      // (over HTTP, so we know they landed)
+      await flushAnswers(true);
+      if (pendingRef.current.length > 0) await flushAnswers(true);
+      if (!submitKeyRef.current) {
+        submitKeyRef.current = window.crypto?.randomUUID?.() || `${attempt.id}-${Date.now()}`;
+      }
+      let response;
+      for (let tries = 1; ; tries++) {
+        try {
+          response = await axios.post(
+            `${API}/attempts/${attempt.id}/submit`,
+            {},
+            { headers: { Authorization: `Bearer ${token}`, 'Idempotency-Key': submitKeyRef.current } }
+          );
+          break;
+        } catch (error) {
+          // No response (dropped connection): safe to retry with the same key
+          if (error.response || tries >= 3) throw error;
+          await new Promise((resolve) => setTimeout(resolve, 1000 * tries));
+        }
+      }
+      // Queued grading: poll for the result
+      let delay = 500;
+      while (response.status === 202) {
+        await new Promise((resolve) => setTimeout(resolve, delay));
+        delay = Math.min(delay * 2, 4000);
+        response = await axios.get(
+          `${API}/attempts/${attempt.id}/result`,
+          { headers: { Authorization: `Bearer ${token}` } }
+        );
+      }
       setResult(response.data);
       localStorage.removeItem(`exam_${examId}_time`);
       localStorage.removeItem(`exam_${examId}_answers`);
+      localStorage.removeItem(`exam_${examId}_log`);
     } catch (error) {
       console.error('Failed to submit exam:', error);
       alert(t('common.error') + ': ' + (error.response?.data?.detail || error.message));
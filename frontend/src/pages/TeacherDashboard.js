@@ -2,9 +2,10 @@ import React, { useState, useEffect } from 'react';
 import { useTranslation } from 'react-i18next';
 import { useAuth, API } from '../AuthContext';
 import axios from 'axios';
-import { PlusCircle, FileText, Users, LogOut, Edit, CheckCircle, BookOpen } from 'lucide-react';
+import { PlusCircle, FileText, Users, LogOut, Edit, CheckCircle, BookOpen, BarChart2 } from 'lucide-react';
 import ExamCreator from '../components/ExamCreator';
 import Paper2Marking from '../components/Paper2Marking';
+import ItemAnalysis from '../components/ItemAnalysis';
 import LanguageSwitcher from '../components/LanguageSwitcher';
 
 const TeacherDashboard = () => {
@@ -14,6 +15,7 @@ const TeacherDashboard = () => {
   const [loading, setLoading] = useState(true);
   const [showCreateExam, setShowCreateExam] = useState(false);
   const [showPaper2Marking, setShowPaper2Marking] = useState(false);
+  const [analysisExam, setAnalysisExam] = useState(null);
 
   useEffect(() => {
     loadData();
@@ -231,6 +233,16 @@ const TeacherDashboard = () => {
                           Publish
                         </button>
                       )}
+                      {exam.status === 'published' && (
+                        <button
+                          onClick={() => setAnalysisExam(exam)}
+                          className="px-4 py-2 bg-purple-600 text-white font-semibold rounded-lg hover:bg-purple-700 text-sm"
+                          data-testid={`item-analysis-${exam.id}`}
+                        >
+                          <BarChart2 className="inline w-4 h-4 mr-1" />
+                          Item Analysis
+                        </button>
+                      )}
                       <button className="px-4 py-2 bg-blue-600 text-white font-semibold rounded-lg hover:bg-blue-700 text-sm">
                         <Edit className="inline w-4 h-4 mr-1" />
                         {t('common.view')}
@@ -258,6 +270,10 @@ const TeacherDashboard = () => {
       {showPaper2Marking && (
         <Paper2Marking onClose={() => setShowPaper2Marking(false)} />
       )}
+
+      {analysisExam && (
+        <ItemAnalysis exam={analysisExam} onClose={() => setAnalysisExam(null)} />
+      )}
     </div>
   );  
 };